@@ -0,0 +1,390 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import hashlib
+import threading
+import http.client
+import urllib.error
+
+from session import Response, Session
+from async_http import AsyncClient, AsyncResponse
+
+# Every record starts with this magic and the size of its compressed payload
+RECORD_MAGIC = b"MDAR"
+RECORD_HEADER = struct.Struct("<4sI")
+# Index entries: hash of the URL, offset and size of the record in the archive
+INDEX_ENTRY = struct.Struct("<QQI")
+INDEX_SUFFIX = ".idx"
+# The index entries sorted by hash then offset, after a header with the number
+# of entries of the append-only index they were sorted from
+LOOKUP_MAGIC = b"MDAL"
+LOOKUP_HEADER = struct.Struct("<4sQ")
+LOOKUP_SUFFIX = ".lookup"
+DEFAULT_LEVEL = 6
+
+def url_hash(url: str) -> int:
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+
+def sort_index(path: str) -> bytes:
+
+    """
+    * Write the lookup file of an archive, its index sorted by URL hash
+
+        Data Used:
+        - path (str)
+            DESCRIPTION: The archive file
+
+        Data Returned:
+        - lookup (bytes)
+            DESCRIPTION: The content of the lookup file (kept in memory by readers that can't write it)
+    """
+
+    with open(path + INDEX_SUFFIX, "rb") as file:
+        index = file.read()
+    # An interrupted recording can leave half an index entry at the end, or
+    # an entry whose record wasn't written in full
+    usable = len(index) - len(index) % INDEX_ENTRY.size
+    data_size = os.path.getsize(path)
+    entries = sorted(entry for entry in INDEX_ENTRY.iter_unpack(index[:usable]) if entry[1] + entry[2] <= data_size)
+
+    lookup = bytearray(LOOKUP_HEADER.pack(LOOKUP_MAGIC, usable // INDEX_ENTRY.size))
+    for entry in entries:
+        lookup += INDEX_ENTRY.pack(*entry)
+    try:
+        with open(path + LOOKUP_SUFFIX + ".tmp", "wb") as file:
+            file.write(lookup)
+        os.replace(path + LOOKUP_SUFFIX + ".tmp", path + LOOKUP_SUFFIX)
+    except OSError:
+        pass
+    return bytes(lookup)
+
+class ArchiveRecord:
+
+    url: str
+    status: int
+    reason: str
+    headers: list
+    body: bytes
+    timestamp: float
+    truncated: bool
+
+    def __init__(self, url: str, status: int, reason: str, headers: list, body: bytes, timestamp: float, truncated: bool = False):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.timestamp = timestamp
+        self.truncated = truncated
+
+    def __repr__(self) -> str:
+        return f"ArchiveRecord({self.url!r}, status={self.status}, {len(self.body)} bytes)"
+
+    def to_response(self) -> Response:
+
+        """
+        * Turn the record into the Response a Session would have returned
+        """
+
+        headers = http.client.HTTPMessage()
+        for name, value in self.headers:
+            headers[name] = value
+        return Response(self.url, self.status, self.reason, headers, self.body, self.truncated)
+
+    def to_async_response(self) -> AsyncResponse:
+
+        """
+        * Turn the record into the AsyncResponse an AsyncClient would have returned
+        """
+
+        headers = {}
+        for name, value in self.headers:
+            name = name.lower()
+            headers[name] = f"{headers[name]}, {value}" if name in headers else value
+        return AsyncResponse(self.url, self.status, self.reason, headers, self.body, self.truncated)
+
+class ArchiveWriter:
+
+    """
+    * Append-only archive of raw HTTP responses
+
+        Every response is compressed on its own and appended to the archive
+        file, and its URL hash, offset and size are appended to an index file
+        next to it (path + ".idx"), so single pages can be read back without
+        decompressing the rest. A record is written before its index entry:
+        an interrupted recording loses at most the response being written.
+        Closing the writer sorts the index into a lookup file (path + ".lookup")
+        for ArchiveReader. Opening an existing archive appends to it.
+
+        Data Used:
+        - path (str)
+            DESCRIPTION: The archive file
+        - level (int)
+            DESCRIPTION: The zlib compression level
+    """
+
+    def __init__(self, path: str, level: int = DEFAULT_LEVEL):
+        self.path = path
+        self.level = level
+        self.lock = threading.Lock()
+        self.data = open(path, "ab")
+        self.index = open(path + INDEX_SUFFIX, "ab")
+        self.records = 0
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def append(self, url: str, status: int, headers, body: bytes, reason: str = "", timestamp: float = None, truncated: bool = False) -> None:
+
+        """
+        * Append a response to the archive
+
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL the response answered
+            - status (int)
+                DESCRIPTION: The status code of the response
+            - headers (dict)
+                DESCRIPTION: The response headers (a dict, a list of pairs or an http.client.HTTPMessage)
+            - body (bytes)
+                DESCRIPTION: The decoded response body
+            - timestamp (float)
+                DESCRIPTION: When the response was received, defaults to now
+            - truncated (bool)
+                DESCRIPTION: Whether only the start of the body was downloaded
+        """
+
+        meta = {
+            "url": url,
+            "status": status,
+            "reason": reason,
+            "headers": list(headers.items()) if hasattr(headers, "items") else list(headers),
+            "time": time.time() if timestamp is None else timestamp,
+            "truncated": truncated,
+        }
+        payload = zlib.compress(json.dumps(meta).encode("utf-8") + b"\n" + body, self.level)
+        record = RECORD_HEADER.pack(RECORD_MAGIC, len(payload)) + payload
+
+        with self.lock:
+            offset = self.data.tell()
+            self.data.write(record)
+            self.data.flush()
+            self.index.write(INDEX_ENTRY.pack(url_hash(url), offset, len(record)))
+            self.index.flush()
+            self.records += 1
+
+    def close(self) -> None:
+        with self.lock:
+            if self.data.closed:
+                return
+            self.data.close()
+            self.index.close()
+            sort_index(self.path)
+
+class ArchiveReader:
+
+    """
+    * Random access to the responses of an archive written by ArchiveWriter
+
+        The archive and its lookup file (the index sorted by URL hash) are
+        memory-mapped and the lookup file is binary searched in place, so
+        opening an archive doesn't depend on its size and getting a page
+        decompresses that page alone. When a URL was recorded several times,
+        its last response is served. An archive whose writer wasn't closed
+        has its index sorted when it is opened.
+
+        Data Used:
+        - path (str)
+            DESCRIPTION: The archive file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lookup = self._map(path + LOOKUP_SUFFIX) if os.path.exists(path + LOOKUP_SUFFIX) else b""
+        if not self._current():
+            if isinstance(self.lookup, mmap.mmap):
+                self.lookup.close()
+            self.lookup = sort_index(path)
+        self.data = self._map(path)
+        self.entries = (len(self.lookup) - LOOKUP_HEADER.size) // INDEX_ENTRY.size
+
+    def _current(self) -> bool:
+        # The lookup file is stale when entries were appended after it was sorted
+        if len(self.lookup) < LOOKUP_HEADER.size:
+            return False
+        magic, sorted_entries = LOOKUP_HEADER.unpack_from(self.lookup)
+        return magic == LOOKUP_MAGIC and sorted_entries == os.path.getsize(self.path + INDEX_SUFFIX) // INDEX_ENTRY.size
+
+    def _entry(self, position: int) -> tuple:
+        return INDEX_ENTRY.unpack_from(self.lookup, LOOKUP_HEADER.size + position * INDEX_ENTRY.size)
+
+    @staticmethod
+    def _map(path: str):
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def __contains__(self, url: str) -> bool:
+        return self.get(url) is not None
+
+    def get(self, url: str) -> ArchiveRecord:
+
+        """
+        * Get the last response recorded for a URL
+
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL of the response
+
+            Data Returned:
+            - record (ArchiveRecord)
+                DESCRIPTION: The recorded response, None if the URL isn't in the archive
+        """
+
+        key = url_hash(url)
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] <= key:
+                low = middle + 1
+            else:
+                high = middle
+
+        # Entries sharing the hash are sorted by offset, so the last one
+        # recorded comes first. URLs that collide are told apart by the URL
+        # stored in their records
+        position = low - 1
+        while position >= 0:
+            entry_key, offset, size = self._entry(position)
+            if entry_key != key:
+                break
+            record = self._read(offset, size)
+            if record.url == url:
+                return record
+            position -= 1
+        return None
+
+    def _read(self, offset: int, size: int) -> ArchiveRecord:
+        magic, length = RECORD_HEADER.unpack_from(self.data, offset)
+        if magic != RECORD_MAGIC or RECORD_HEADER.size + length != size:
+            raise ValueError(f"Corrupt record at offset {offset} of {self.path}")
+        start = offset + RECORD_HEADER.size
+        meta, body = zlib.decompress(self.data[start:start + length]).split(b"\n", 1)
+        meta = json.loads(meta)
+        return ArchiveRecord(meta["url"], meta["status"], meta["reason"], meta["headers"], body, meta["time"], meta["truncated"])
+
+    def __iter__(self):
+
+        """
+        * Iterate over every record of the archive in the order they were written, e.g. to re-extract all of them
+        """
+
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(self.data):
+            _, length = RECORD_HEADER.unpack_from(self.data, offset)
+            size = RECORD_HEADER.size + length
+            if offset + size > len(self.data):
+                break
+            yield self._read(offset, size)
+            offset += size
+
+    def close(self) -> None:
+        for mapped in (self.data, self.lookup):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+class RecordingSession(Session):
+
+    """
+    * Session that appends every response it receives to an archive
+
+        Install it with session.set_session to record what Spotify and Deezer
+        download. 304 answers to conditional requests carry no page and are
+        not recorded.
+
+        Data Used:
+        - archive (ArchiveWriter)
+            DESCRIPTION: The archive responses are appended to
+        - options (dict)
+            DESCRIPTION: Extra arguments for Session
+    """
+
+    def __init__(self, archive: ArchiveWriter, **options):
+        super().__init__(**options)
+        self.archive = archive
+
+    def request(self, url: str, headers: dict = None, until=None) -> Response:
+        response = super().request(url, headers, until)
+        if response.status != 304:
+            self.archive.append(url, response.status, response.headers, response.body, response.reason, truncated=response.truncated)
+        return response
+
+class ReplaySession(Session):
+
+    """
+    * Session that serves responses from an archive instead of the network
+
+        Install it with session.set_session to re-extract recorded pages
+        offline. URLs that aren't in the archive fail like unreachable hosts.
+
+        Data Used:
+        - archive (ArchiveReader)
+            DESCRIPTION: The archive responses are read from
+    """
+
+    def __init__(self, archive: ArchiveReader, **options):
+        super().__init__(**options)
+        self.archive = archive
+
+    def request(self, url: str, headers: dict = None, until=None) -> Response:
+        record = self.archive.get(url)
+        if record is None:
+            raise urllib.error.URLError(f"{url} is not in the archive")
+        return record.to_response()
+
+class RecordingClient(AsyncClient):
+
+    """
+    * AsyncClient that appends every response it receives to an archive, see RecordingSession
+    """
+
+    def __init__(self, archive: ArchiveWriter, **options):
+        super().__init__(**options)
+        self.archive = archive
+
+    async def _attempt(self, url: str, until=None) -> AsyncResponse:
+        response = await super()._attempt(url, until)
+        self.archive.append(url, response.status, response.headers, response.body, response.reason, truncated=response.truncated)
+        return response
+
+class ReplayClient(AsyncClient):
+
+    """
+    * AsyncClient that serves responses from an archive instead of the network, see ReplaySession
+    """
+
+    def __init__(self, archive: ArchiveReader, **options):
+        super().__init__(**options)
+        self.archive = archive
+
+    async def _attempt(self, url: str, until=None) -> AsyncResponse:
+        record = self.archive.get(url)
+        if record is None:
+            raise urllib.error.URLError(f"{url} is not in the archive")
+        return record.to_async_response()
@@ -0,0 +1,346 @@
+import ssl
+import time
+import asyncio
+import weakref
+import contextlib
+import urllib.error
+import urllib.parse
+
+from session import DEFAULT_POOL_SIZE, STREAM_CHUNK_SIZE, USER_AGENT, BodyDecoder, decode_body
+from singleflight import AsyncSingleFlight
+from ratelimit import RateLimiter, RetryPolicy, get_limiter, parse_retry_after
+from hedge import HedgePolicy, hedged
+from metrics import increment, record_request, record_stage
+
+DEFAULT_CONCURRENCY = 64
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+
+# Errors that mean a kept-alive connection was closed by the server while idle
+STALE_ERRORS = (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError)
+
+_clients = weakref.WeakKeyDictionary()
+
+class AsyncResponse:
+
+    url: str
+    status: int
+    reason: str
+    headers: dict
+    body: bytes
+    truncated: bool
+
+    def __init__(self, url: str, status: int, reason: str, headers: dict, body: bytes, truncated: bool = False):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.truncated = truncated
+
+class AsyncClient:
+
+    """
+    * Minimal asyncio HTTP/1.1 client with per-host keep-alive connection pools
+
+        Every request runs on the event loop itself (no executor threads), and
+        a semaphore caps how many requests are in flight at once. Connections
+        are kept alive and reused like those of session.Session.
+
+        Data Used:
+        - max_concurrency (int)
+            DESCRIPTION: The maximum number of requests in flight
+        - pool_size (int)
+            DESCRIPTION: The maximum number of idle connections kept per host
+        - timeout (float)
+            DESCRIPTION: The timeout of a whole request in seconds
+        - connect_timeout (float)
+            DESCRIPTION: The connect timeout in seconds, defaults to timeout
+        - coalesce (bool)
+            DESCRIPTION: Whether concurrent GETs of the same URL share a single request
+        - limiter (RateLimiter)
+            DESCRIPTION: Throttles requests per host, None to send them unthrottled
+        - retry (RetryPolicy)
+            DESCRIPTION: Retries 429/5xx responses and connection errors, None to never retry
+        - hedge (HedgePolicy)
+            DESCRIPTION: Sends a duplicate of requests slower than usual, None to never hedge
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT, coalesce: bool = True,
+                 limiter: RateLimiter = None, retry: RetryPolicy = None, hedge: HedgePolicy = None,
+                 pool_size: int = DEFAULT_POOL_SIZE, connect_timeout: float = None):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout or timeout
+        self.ssl_context = ssl.create_default_context()
+        self.pools = {}
+        self.flights = AsyncSingleFlight() if coalesce else None
+        self.limiter = limiter
+        self.retry = retry
+        self.hedge = hedge
+
+    async def get(self, url: str, until=None) -> AsyncResponse:
+
+        """
+        * GET a URL, following redirects
+
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL to request
+            - until (callable)
+                DESCRIPTION: Streams the body and stops reading as soon as
+                until(body read so far, scan) is true, None to read the whole body,
+                see Session.get
+
+            Data Returned:
+            - response (AsyncResponse)
+                DESCRIPTION: The final response, raises urllib.error.HTTPError for non 2xx codes
+        """
+
+        if self.flights is not None:
+            return await self.flights.do(url if until is None else (url, until), self._get, url, until)
+        return await self._get(url, until)
+
+    async def _get(self, url: str, until=None) -> AsyncResponse:
+        async with self.semaphore:
+            for _ in range(MAX_REDIRECTS + 1):
+                response = await self._attempt(url, until)
+                location = response.headers.get("location")
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+                if response.status >= 400:
+                    increment("http_errors")
+                    raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+                return response
+        raise urllib.error.URLError(f"too many redirects for {url}")
+
+    async def _attempt(self, url: str, until=None) -> AsyncResponse:
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                await self.limiter.acquire_async(host)
+            start = time.monotonic()
+            try:
+                if self.hedge is not None and self.limiter is not None:
+                    # A hedge takes its own limiter slot, and is skipped when the host has none to spare
+                    response = await asyncio.wait_for(hedged(self.hedge, self._request, url, until,
+                                                             hedge_function=lambda *args: self._request_hedge(host, *args),
+                                                             admit=lambda: self.limiter.try_acquire(host) == 0), self.timeout)
+                elif self.hedge is not None:
+                    response = await asyncio.wait_for(hedged(self.hedge, self._request, url, until), self.timeout)
+                else:
+                    response = await asyncio.wait_for(self._request(url, until), self.timeout)
+            except (OSError, EOFError, asyncio.TimeoutError):
+                if self.limiter is not None:
+                    self.limiter.release(host, None, time.monotonic() - start)
+                if self.retry is None or not self.retry.should_retry(attempt):
+                    increment("request_errors")
+                    raise
+                increment("retries")
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+
+            retry_after = parse_retry_after(response.headers.get("retry-after")) if response.status in (429, 503) else None
+            if self.limiter is not None:
+                self.limiter.release(host, response.status, time.monotonic() - start, retry_after)
+            if self.retry is None or not self.retry.should_retry(attempt, response.status):
+                return response
+            increment("retries")
+            await asyncio.sleep(self.retry.delay(attempt, retry_after))
+            attempt += 1
+
+    async def _request_hedge(self, host: str, url: str, until=None) -> AsyncResponse:
+        start = time.monotonic()
+        try:
+            response = await self._request(url, until)
+        except asyncio.CancelledError:
+            # The primary request answered first
+            self.limiter.cancel(host)
+            raise
+        except Exception:
+            self.limiter.release(host, None, time.monotonic() - start)
+            raise
+        retry_after = parse_retry_after(response.headers.get("retry-after")) if response.status in (429, 503) else None
+        self.limiter.release(host, response.status, time.monotonic() - start, retry_after)
+        return response
+
+    async def _request(self, url: str, until=None) -> AsyncResponse:
+        parts = urllib.parse.urlsplit(url)
+        https = parts.scheme == "https"
+        key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            f"User-Agent: {USER_AGENT}\r\n"
+            "Accept-Encoding: gzip, deflate\r\n"
+            "Connection: keep-alive\r\n"
+            "\r\n"
+        ).encode("latin-1")
+
+        (reader, writer), reused = await self._acquire(key)
+        start = time.perf_counter()
+        reusable = False
+        try:
+            try:
+                version, status, reason, headers = await self._send(reader, writer, request, parts.netloc)
+            except STALE_ERRORS:
+                if not reused:
+                    raise
+                # The server dropped the idle connection, retry once on a new one
+                self._close(writer)
+                reader, writer = await self._connect(key)
+                version, status, reason, headers = await self._send(reader, writer, request, parts.netloc)
+
+            chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+            if until is not None:
+                body, truncated, received = await self._read_until(reader, headers, until)
+            else:
+                if chunked:
+                    body = await self._read_chunked(reader)
+                elif "content-length" in headers:
+                    body = await reader.readexactly(int(headers["content-length"]))
+                else:
+                    body = await reader.read()
+                truncated, received = False, len(body)
+            # A body that wasn't read to the end, or was delimited by the server closing, leaves the connection unusable
+            reusable = (not truncated and (chunked or "content-length" in headers) and version == "HTTP/1.1"
+                        and headers.get("connection", "").lower() != "close")
+        finally:
+            if reusable:
+                self._release(key, reader, writer)
+            else:
+                self._close(writer)
+
+        record_stage("download", start)
+        record_request(received)
+        if until is not None:
+            return AsyncResponse(url, int(status), reason, headers, body, truncated)
+        return AsyncResponse(url, int(status), reason, headers, decode_body(body, headers.get("content-encoding")))
+
+    @staticmethod
+    async def _send(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: bytes, netloc: str) -> tuple:
+        writer.write(request)
+        await writer.drain()
+
+        status_line = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+        if not status_line:
+            raise ConnectionResetError(f"connection closed without a response from {netloc}")
+        version, status, reason = (status_line.split(" ", 2) + [""])[:3]
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            key = key.strip().lower()
+            headers[key] = f"{headers[key]}, {value.strip()}" if key in headers else value.strip()
+        return version, status, reason, headers
+
+    def close(self) -> None:
+
+        """
+        * Close every idle connection of the client
+        """
+
+        pools, self.pools = self.pools, {}
+        for pool in pools.values():
+            for _, _, writer in pool:
+                self._close(writer)
+
+    async def _acquire(self, key: tuple) -> tuple:
+        loop = asyncio.get_running_loop()
+        pool = self.pools.get(key)
+        while pool:
+            connection_loop, reader, writer = pool.pop()
+            # Connections can't move to another event loop, and may have been closed by the server while idle
+            if connection_loop is loop and not writer.is_closing() and not reader.at_eof():
+                return (reader, writer), True
+            self._close(writer)
+        return await self._connect(key), False
+
+    def _release(self, key: tuple, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        pool = self.pools.setdefault(key, [])
+        if len(pool) < self.pool_size:
+            pool.append((asyncio.get_running_loop(), reader, writer))
+        else:
+            self._close(writer)
+
+    async def _connect(self, key: tuple) -> tuple:
+        scheme, host, port = key
+        start = time.perf_counter()
+        try:
+            connection = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=self.ssl_context if scheme == "https" else None),
+                                                self.connect_timeout)
+        except OSError as e:
+            raise urllib.error.URLError(e)
+        record_stage("connect", start)
+        return connection
+
+    @staticmethod
+    def _close(writer: asyncio.StreamWriter) -> None:
+        # The event loop of the connection may already be closed
+        with contextlib.suppress(Exception):
+            writer.close()
+
+    @staticmethod
+    async def _read_until(reader: asyncio.StreamReader, headers: dict, until) -> tuple:
+        # Streaming version of the body reading in _request, see session.read_until
+        decoder = BodyDecoder(headers.get("content-encoding"))
+        chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        remaining = int(headers["content-length"]) if not chunked and "content-length" in headers else None
+        body = bytearray()
+        scan = {}
+        received = 0
+        while True:
+            if chunked:
+                size = int((await reader.readline()).split(b";")[0].strip(), 16)
+                chunk = await reader.readexactly(size) if size else b""
+                await reader.readline()
+            elif remaining is not None:
+                chunk = await reader.read(min(remaining, STREAM_CHUNK_SIZE)) if remaining else b""
+                remaining -= len(chunk)
+            else:
+                chunk = await reader.read(STREAM_CHUNK_SIZE)
+            received += len(chunk)
+            if not chunk:
+                body += decoder.flush()
+                return bytes(body), False, received
+            body += decoder.feed(chunk)
+            if until(body, scan):
+                return bytes(body), chunked or remaining != 0, received
+
+    @staticmethod
+    async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip(), 16)
+            if size == 0:
+                # Discard trailers
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+
+def get_client() -> AsyncClient:
+
+    """
+    * Get the shared AsyncClient of the running event loop
+
+        Data Returned:
+        - client (AsyncClient)
+            DESCRIPTION: One client per event loop, created on first use
+    """
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncClient(limiter=get_limiter(), retry=RetryPolicy())
+    return client
@@ -0,0 +1,299 @@
+import asyncio
+import logging
+import collections
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from records import LazyAlbum
+from async_http import DEFAULT_CONCURRENCY
+from normalize import dedupe_key
+from cache import MISS, LRUCache
+
+DEFAULT_WORKERS = 8
+# Lookups the asyncio batch APIs start at once is twice this, as many as the default AsyncClient sends
+DEFAULT_ASYNC_WORKERS = DEFAULT_CONCURRENCY // 2
+# How many recent inputs the batch APIs remember to skip duplicates
+DEFAULT_DEDUPE_ENTRIES = 100_000
+
+class BatchResult:
+
+    url: str
+    data: object
+    error: str
+
+    def __init__(self, url: str, data: object = None, error: str = None):
+        self.url = url
+        self.data = data
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        if self.ok:
+            return f"BatchResult({self.url!r}, data={self.data!r})"
+        return f"BatchResult({self.url!r}, error={self.error!r})"
+
+def lookup(provider: type, method: str, url: str, logger: logging.Logger, options: dict, args: tuple = ()) -> BatchResult:
+
+    """
+    * Resolve a single URL or ID with a provider class
+
+        Data Used:
+        - provider (type)
+            DESCRIPTION: The provider class (Spotify or Deezer)
+        - method (str)
+            DESCRIPTION: The lookup method to call ("get_song" or "get_album")
+        - url (str)
+            DESCRIPTION: The URL or ID to resolve
+        - logger (logging.Logger)
+            DESCRIPTION: The logger handed to the provider
+        - options (dict)
+            DESCRIPTION: Extra keyword arguments for the provider constructor
+        - args (tuple)
+            DESCRIPTION: Arguments for the lookup method
+
+        Data Returned:
+        - result (BatchResult)
+            DESCRIPTION: The metadata, or the error that stopped the lookup
+    """
+
+    try:
+        instance = provider(url, logger, **options)
+        data = getattr(instance, method)(*args)
+    except Exception as e:
+        return BatchResult(url, error=f"{type(e).__name__}: {e}")
+
+    if data is False:
+        error = instance.error
+        return BatchResult(url, error=f"{type(error).__name__}: {error}" if error else "Lookup failed")
+    return BatchResult(url, data=data)
+
+async def async_lookup(provider: type, method: str, url: str, logger: logging.Logger, options: dict, args: tuple = ()) -> BatchResult:
+
+    """
+    * Resolve a single URL or ID with an asyncio provider class (AsyncSpotify or AsyncDeezer)
+    """
+
+    try:
+        instance = provider(url, logger, **options)
+        data = await getattr(instance, method)(*args)
+    except Exception as e:
+        return BatchResult(url, error=f"{type(e).__name__}: {e}")
+
+    if data is False:
+        error = instance.error
+        return BatchResult(url, error=f"{type(error).__name__}: {error}" if error else "Lookup failed")
+    return BatchResult(url, data=data)
+
+def fan_out(result: BatchResult, url: str) -> BatchResult:
+
+    """
+    * Get the result of a deduplicated lookup for one of its original inputs
+    """
+
+    if result.url == url:
+        return result
+    return BatchResult(url, result.data, result.error)
+
+def method_type(method: str) -> str:
+    return "album" if method == "get_album" else "track"
+
+def iter_batch(provider: type, method: str, urls, logger: logging.Logger, max_workers: int = DEFAULT_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options):
+
+    """
+    * Resolve many URLs or IDs on a bounded thread pool, yielding in input order
+
+        Data Used:
+        - provider (type)
+            DESCRIPTION: The provider class (Spotify or Deezer)
+        - method (str)
+            DESCRIPTION: The lookup method to call ("get_song" or "get_album")
+        - urls (iterable)
+            DESCRIPTION: The URLs or IDs to resolve, consumed lazily
+        - logger (logging.Logger)
+            DESCRIPTION: The logger handed to every provider instance
+        - max_workers (int)
+            DESCRIPTION: The number of lookups allowed in flight at once
+        - dedupe (int)
+            DESCRIPTION: How many recent inputs are remembered, so that inputs pointing
+            to the same entity (see normalize.normalize) are looked up once, 0 to look up every input
+
+        Data Returned:
+        - results (generator of BatchResult)
+            DESCRIPTION: One result per input, in the same order as the input
+    """
+
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+
+    # Only keep a small window of futures alive so that arbitrarily long
+    # inputs are resolved in constant memory
+    window = max_workers * 2
+    pending = collections.deque()
+    seen = LRUCache(dedupe)
+    default_type = method_type(method)
+
+    def output(url: str, key, entry) -> BatchResult:
+        result = entry.result() if isinstance(entry, Future) else entry
+        # Finished lookups are remembered by their result, a fraction of the size of their future
+        if dedupe:
+            seen.set(key, result)
+        return fan_out(result, url)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for url in urls:
+            key = dedupe_key(url, default_type) if dedupe else None
+            entry = seen.get(key) if dedupe else MISS
+            if entry is MISS:
+                entry = executor.submit(lookup, provider, method, url, logger, options)
+                seen.set(key, entry)
+            pending.append((url, key, entry))
+            if len(pending) >= window:
+                yield output(*pending.popleft())
+        while pending:
+            yield output(*pending.popleft())
+
+def run_batch(provider: type, method: str, urls, logger: logging.Logger, max_workers: int = DEFAULT_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+
+    """
+    * Resolve many URLs or IDs on a bounded thread pool
+
+        Data Used:
+        - urls (iterable)
+            DESCRIPTION: The URLs or IDs to resolve
+        - max_workers (int)
+            DESCRIPTION: The number of lookups allowed in flight at once
+        - dedupe (int)
+            DESCRIPTION: How many recent inputs are remembered to skip duplicates, see iter_batch
+
+        Data Returned:
+        - results (list of BatchResult)
+            DESCRIPTION: One result per input, in the same order as the input
+    """
+
+    return list(iter_batch(provider, method, urls, logger, max_workers, dedupe, **options))
+
+async def async_iter_batch(provider: type, method: str, urls, logger: logging.Logger, max_workers: int = DEFAULT_ASYNC_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options):
+
+    """
+    * Resolve many URLs or IDs concurrently with an asyncio provider class, yielding in input order
+
+        Works like iter_batch: at most max_workers * 2 lookups are started
+        ahead of the result being yielded, so long inputs take constant memory.
+
+        Data Used:
+        - urls (iterable)
+            DESCRIPTION: The URLs or IDs to resolve, consumed lazily
+        - max_workers (int)
+            DESCRIPTION: Half the number of lookups started ahead, the AsyncClient still caps the requests in flight
+        - dedupe (int)
+            DESCRIPTION: How many recent inputs are remembered to skip duplicates, see iter_batch
+
+        Data Returned:
+        - results (async generator of BatchResult)
+            DESCRIPTION: One result per input, in the same order as the input
+    """
+
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+
+    window = max_workers * 2
+    pending = collections.deque()
+    seen = LRUCache(dedupe)
+    default_type = method_type(method)
+
+    async def output(url: str, key, entry) -> BatchResult:
+        result = await entry if isinstance(entry, asyncio.Future) else entry
+        if dedupe:
+            seen.set(key, result)
+        return fan_out(result, url)
+
+    try:
+        for url in urls:
+            key = dedupe_key(url, default_type) if dedupe else None
+            entry = seen.get(key) if dedupe else MISS
+            if entry is MISS:
+                entry = asyncio.ensure_future(async_lookup(provider, method, url, logger, options))
+                seen.set(key, entry)
+            pending.append((url, key, entry))
+            if len(pending) >= window:
+                yield await output(*pending.popleft())
+        while pending:
+            yield await output(*pending.popleft())
+    finally:
+        # The lookups of a generator that was closed early are not awaited anymore
+        for _, _, entry in pending:
+            if isinstance(entry, asyncio.Future):
+                entry.cancel()
+
+async def async_run_batch(provider: type, method: str, urls, logger: logging.Logger, max_workers: int = DEFAULT_ASYNC_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+
+    """
+    * Resolve many URLs or IDs concurrently with an asyncio provider class, see async_iter_batch
+
+        Data Returned:
+        - results (list of BatchResult)
+            DESCRIPTION: One result per input, in the same order as the input
+    """
+
+    return [result async for result in async_iter_batch(provider, method, urls, logger, max_workers, dedupe, **options)]
+
+def run_lookups(provider: type, method: str, urls, logger: logging.Logger, max_workers: int = DEFAULT_WORKERS, options: dict = None, args: tuple = ()) -> list:
+
+    """
+    * Resolve many URLs or IDs on a bounded thread pool, passing the same arguments to every lookup
+
+        Data Used:
+        - urls (list)
+            DESCRIPTION: The URLs or IDs to resolve
+        - options (dict)
+            DESCRIPTION: Extra keyword arguments for the provider constructor
+        - args (tuple)
+            DESCRIPTION: Arguments for the lookup method
+
+        Data Returned:
+        - results (list of BatchResult)
+            DESCRIPTION: One result per input, in the same order as the input
+    """
+
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda url: lookup(provider, method, url, logger, options or {}, args), urls))
+
+def prefetch_albums(songs, max_workers: int = DEFAULT_WORKERS) -> int:
+
+    """
+    * Resolve the lazy albums of many songs on a bounded thread pool
+
+        Songs of the same album share a single fetch.
+
+        Data Used:
+        - songs (iterable)
+            DESCRIPTION: SongData (or BatchResults holding SongData) from get_song with lazy_album=True
+        - max_workers (int)
+            DESCRIPTION: The number of albums fetched at the same time
+
+        Data Returned:
+        - count (int)
+            DESCRIPTION: The number of albums fetched
+    """
+
+    handles = {}
+    for song in songs:
+        if isinstance(song, BatchResult):
+            song = song.data
+        album = getattr(song, "album", None)
+        if isinstance(album, LazyAlbum) and not album.resolved:
+            handles.setdefault(album.url, []).append(album)
+
+    def resolve(group: list) -> None:
+        album = group[0].get()
+        for handle in group[1:]:
+            handle.set(album)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(resolve, handles.values()))
+    return len(handles)
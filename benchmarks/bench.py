@@ -0,0 +1,378 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extractor
+from batch import iter_batch, run_batch
+from session import set_session
+from ratelimit import RateLimiter, RetryPolicy
+from spotify import AsyncSpotify, Spotify
+from deezer import BACKENDS, AsyncDeezer, Deezer
+from cache import album_cache, artist_cache
+from metrics import get_metrics
+from archive import ArchiveReader
+from fixtures import DEFAULT_PAGE_SIZE, FixtureClient, FixtureServer, FixtureSession, generated_page, track_urls
+
+PROVIDERS = {"spotify": (Spotify, AsyncSpotify), "deezer": (Deezer, AsyncDeezer)}
+BENCHMARKS = ("single", "batch", "parse", "memory")
+KINDS = {"track": "song", "album": "album", "artist": "artist"}
+# Retries are kept short, the server has no reason to be waited for
+RETRY = RetryPolicy(backoff=0.01, max_backoff=0.1)
+FORMAT_VERSION = 1
+
+logger = logging.getLogger("musicdata.bench")
+
+def summarize(samples: list) -> dict:
+
+    """
+    * Get the distribution of latency samples in seconds
+    """
+
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    def percentile(p: float) -> float:
+        return samples[min(int(p / 100 * len(samples)), len(samples) - 1)]
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples),
+        "min": samples[0],
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": samples[-1],
+    }
+
+def clear_caches() -> None:
+    album_cache.clear()
+    artist_cache.clear()
+
+def catalogue(provider: str, count: int, archive: ArchiveReader = None) -> list:
+
+    """
+    * Get the track URLs a benchmark looks up, from the archive if there is one
+    """
+
+    if archive is None:
+        return track_urls(provider, count)
+    prefix = "https://open.spotify.com/track/" if provider == "spotify" else "https://www.deezer.com/track/"
+    urls = []
+    for record in archive:
+        if record.url.startswith(prefix) and record.url not in urls:
+            urls.append(record.url)
+            if len(urls) == count:
+                break
+    return urls
+
+def get_limiter(args: argparse.Namespace) -> RateLimiter:
+
+    """
+    * Get a fresh limiter like the default one, so runs don't inherit each other's rates
+    """
+
+    return None if args.no_limiter else RateLimiter()
+
+def provider_options(provider: str, args: argparse.Namespace) -> dict:
+    if provider != "deezer":
+        return {}
+    return {"app_state": args.app_state, "backend": args.deezer_backend, "api_url": args.fixture.api_url()}
+
+def bench_single(provider: str, urls: list, args: argparse.Namespace) -> list:
+
+    """
+    * Latency of single get_song lookups, one after the other with cold album and artist caches
+    """
+
+    cls = PROVIDERS[provider][0]
+    metrics = get_metrics()
+    metrics.reset()
+    samples, failures = [], 0
+    for url in urls:
+        clear_caches()
+        start = time.perf_counter()
+        if cls(url, logger, **provider_options(provider, args)).get_song() is False:
+            failures += 1
+        samples.append(time.perf_counter() - start)
+
+    counters = metrics.snapshot()["counters"]
+    latency = summarize(samples)
+    return [{
+        "name": f"single/{provider}",
+        "value": latency.get("p50"),
+        "unit": "s",
+        "lookups": len(urls),
+        "failures": failures,
+        "latency": latency,
+        "requests_per_lookup": counters.get("requests", 0) / max(len(urls), 1),
+        "bytes_per_lookup": counters.get("bytes", 0) / max(len(urls), 1),
+    }]
+
+def bench_batch(provider: str, urls: list, args: argparse.Namespace) -> list:
+
+    """
+    * Throughput of batch lookups for every concurrency, on threads (run_batch) and on asyncio (get_songs)
+    """
+
+    cls, async_cls = PROVIDERS[provider]
+    options = provider_options(provider, args)
+    metrics = get_metrics()
+    results = []
+    for mode in args.modes:
+        for concurrency in args.concurrency:
+            clear_caches()
+            metrics.reset()
+            start = time.perf_counter()
+            if mode == "threads":
+                batch = run_batch(cls, "get_song", urls, logger, concurrency, **options)
+            else:
+                client = FixtureClient(args.fixture, max_concurrency=concurrency, limiter=get_limiter(args), retry=RETRY)
+                batch = asyncio.run(async_cls.get_songs(urls, logger, client=client, **options))
+            elapsed = time.perf_counter() - start
+
+            counters = metrics.snapshot()["counters"]
+            results.append({
+                "name": f"batch/{provider}/{mode}/{concurrency}",
+                "value": len(urls) / elapsed,
+                "unit": "lookups/s",
+                "lookups": len(urls),
+                "failures": sum(not result.ok for result in batch),
+                "seconds": elapsed,
+                "requests": counters.get("requests", 0),
+                "retries": counters.get("retries", 0),
+                "bytes": counters.get("bytes", 0),
+            })
+    return results
+
+def bench_parse(provider: str, args: argparse.Namespace) -> list:
+
+    """
+    * Cost of parsing (meta tag scan) and extracting (get_metadata) a page, without any I/O
+    """
+
+    cls = PROVIDERS[provider][0]
+    engines = ["fast"] + (["bs4"] if extractor.BeautifulSoup is not None else [])
+    get_artist = lambda artist_url: "Artist"
+    results = []
+    for kind, metadata_type in KINDS.items():
+        document = page_document(provider, kind, args)
+        if document is None:
+            continue
+        app_state = provider == "deezer" and kind != "artist" and args.app_state
+        for engine in engines:
+            start = time.perf_counter()
+            for _ in range(args.parse_iterations):
+                page = extractor.parse_page(document, app_state, engine)
+            parse = (time.perf_counter() - start) / args.parse_iterations
+
+            start = time.perf_counter()
+            for _ in range(args.parse_iterations):
+                if kind == "artist":
+                    cls.get_artist_name(page.metatags)
+                elif app_state:
+                    cls.get_state_metadata(page.app_state, page.metatags, metadata_type)
+                else:
+                    cls.get_metadata(page.metatags, metadata_type, get_artist=get_artist)
+            extract = (time.perf_counter() - start) / args.parse_iterations
+
+            results.append({
+                "name": f"parse/{provider}/{kind}/{engine}" + ("/app_state" if app_state else ""),
+                "value": (parse + extract) * 1e6,
+                "unit": "us/page",
+                "page_bytes": len(document),
+                "parse_us": parse * 1e6,
+                "extract_us": extract * 1e6,
+            })
+
+    if provider == "deezer" and args.deezer_backend == "api" and args.archive is None:
+        for kind, metadata_type in (("track", "song"), ("album", "album")):
+            document = generated_page(f"/deezer-api/{kind}/1")
+            start = time.perf_counter()
+            for _ in range(args.parse_iterations):
+                data, _ = cls.read_api_data(document, kind)
+            parse = (time.perf_counter() - start) / args.parse_iterations
+
+            start = time.perf_counter()
+            for _ in range(args.parse_iterations):
+                cls.get_api_metadata(data, metadata_type)
+            extract = (time.perf_counter() - start) / args.parse_iterations
+
+            results.append({
+                "name": f"parse/{provider}/{kind}/api",
+                "value": (parse + extract) * 1e6,
+                "unit": "us/page",
+                "page_bytes": len(document),
+                "parse_us": parse * 1e6,
+                "extract_us": extract * 1e6,
+            })
+    return results
+
+def page_document(provider: str, kind: str, args: argparse.Namespace) -> bytes:
+    if args.archive is None:
+        return generated_page(f"/{provider}/{kind}/1", args.page_size)
+    root = "https://open.spotify.com/" if provider == "spotify" else "https://www.deezer.com/"
+    for record in args.archive:
+        if record.url.startswith(f"{root}{kind}/") and record.status == 200:
+            return record.body
+    return None
+
+def bench_memory(provider: str, urls: list, args: argparse.Namespace) -> list:
+
+    """
+    * Peak memory of a streamed batch (iter_batch) with the results thrown away as they come
+    """
+
+    cls = PROVIDERS[provider][0]
+    workers = max(args.concurrency)
+    clear_caches()
+    tracemalloc.start()
+    try:
+        for _ in iter_batch(cls, "get_song", urls, logger, workers, **provider_options(provider, args)):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return [{
+        "name": f"memory/{provider}",
+        "value": peak / 1024,
+        "unit": "KiB",
+        "lookups": len(urls),
+        "workers": workers,
+        "bytes_per_lookup": peak / max(len(urls), 1),
+        # Includes everything the process did so far
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }]
+
+def compare(previous: dict, current: dict) -> list:
+
+    """
+    * Match the results of two runs by name
+
+        Data Returned:
+        - rows (list)
+            DESCRIPTION: (name, unit, previous value, current value, relative change) for every shared result
+    """
+
+    before = {result["name"]: result for result in previous["results"]}
+    rows = []
+    for result in current["results"]:
+        old = before.get(result["name"])
+        if old is None or not old.get("value") or result.get("value") is None:
+            continue
+        rows.append((result["name"], result["unit"], old["value"], result["value"], result["value"] / old["value"] - 1))
+    return rows
+
+def parse_list(value: str, cast=str) -> list:
+    return [cast(item) for item in value.split(",") if item]
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark Spotify/Deezer lookups against a local fixture server, offline.")
+    parser.add_argument("--only", type=parse_list, default=list(BENCHMARKS), help=f"benchmarks to run (default: {','.join(BENCHMARKS)})")
+    parser.add_argument("--providers", type=parse_list, default=list(PROVIDERS), help="providers to benchmark (default: spotify,deezer)")
+    parser.add_argument("--lookups", type=int, default=200, help="lookups of the batch and memory benchmarks (default: 200)")
+    parser.add_argument("--single-lookups", type=int, default=50, help="lookups of the single lookup benchmark (default: 50)")
+    parser.add_argument("--concurrency", type=lambda value: parse_list(value, int), default=[1, 4, 16, 64], help="batch concurrencies (default: 1,4,16,64)")
+    parser.add_argument("--modes", type=parse_list, default=["threads", "asyncio"], help="batch modes (default: threads,asyncio)")
+    parser.add_argument("--parse-iterations", type=int, default=200, help="parses per page of the parse benchmark (default: 200)")
+    parser.add_argument("--latency", type=float, default=0.02, help="server latency per response in seconds (default: 0.02)")
+    parser.add_argument("--bandwidth", type=float, default=0, help="server bandwidth per response in bytes/s, 0 for unlimited (default)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with an error (default: 0)")
+    parser.add_argument("--error-status", type=int, default=503, help="status of injected errors, 0 to reset the connection (default: 503)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help=f"size of generated pages in bytes (default: {DEFAULT_PAGE_SIZE})")
+    parser.add_argument("--archive", default=None, help="serve the pages of an archive (see archive.py) instead of generated ones")
+    parser.add_argument("--app-state", action="store_true", help="read Deezer metadata from the app state")
+    parser.add_argument("--deezer-backend", choices=BACKENDS, default="html", help="where Deezer metadata is read from (default: html)")
+    parser.add_argument("--streaming", action="store_true", help="stop downloading pages once their meta tags were read")
+    parser.add_argument("--no-limiter", action="store_true", help="send requests without the per-host rate limiter")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the error injection (default: 0)")
+    parser.add_argument("-o", "--output", default="-", help="where the JSON results are written, - for stdout (default)")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run to compare with, printed to stderr")
+    args = parser.parse_args(argv)
+    for name in args.only:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r}, expected some of {','.join(BENCHMARKS)}")
+    for name in args.providers:
+        if name not in PROVIDERS:
+            parser.error(f"unknown provider {name!r}")
+    if not args.concurrency or min(args.concurrency) < 1:
+        parser.error("--concurrency must be positive numbers")
+    return args
+
+def main(argv: list = None) -> int:
+
+    """
+    * Run the benchmarks and write their results as JSON
+
+        Data Used:
+        - argv (list)
+            DESCRIPTION: The command line arguments, defaults to sys.argv
+
+        Data Returned:
+        - status (int)
+            DESCRIPTION: 0, or 1 when some lookups failed without any error being injected
+    """
+
+    args = parse_args(argv)
+    logger.setLevel(logging.CRITICAL)
+    extractor.set_streaming(args.streaming)
+    args.archive = ArchiveReader(args.archive) if args.archive else None
+
+    fixture = FixtureServer(args.latency, args.bandwidth, args.error_rate, args.error_status, args.page_size, args.archive, args.seed)
+    args.fixture = fixture
+    results = []
+    with fixture:
+        set_session(FixtureSession(fixture, pool_size=max(args.concurrency), limiter=get_limiter(args), retry=RETRY))
+        try:
+            for provider in args.providers:
+                if "single" in args.only:
+                    results += bench_single(provider, catalogue(provider, args.single_lookups, args.archive), args)
+                if "batch" in args.only:
+                    results += bench_batch(provider, catalogue(provider, args.lookups, args.archive), args)
+                if "parse" in args.only:
+                    results += bench_parse(provider, args)
+                if "memory" in args.only:
+                    results += bench_memory(provider, catalogue(provider, args.lookups, args.archive), args)
+        finally:
+            set_session(None)
+        server = fixture.stats()
+
+    config = {name: value for name, value in vars(args).items() if name not in ("fixture", "archive", "output", "compare")}
+    config["archive"] = args.archive.path if args.archive is not None else None
+    report = {
+        "version": FORMAT_VERSION,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "server": server,
+        "results": results,
+    }
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        json.dump(report, output, indent=2)
+        output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            previous = json.load(file)
+        for name, unit, before, after, change in compare(previous, report):
+            print(f"{name:<40} {before:>12.4g} -> {after:>12.4g} {unit:<10} {change:+.1%}", file=sys.stderr)
+
+    failed = any(result.get("failures") for result in results)
+    return 1 if failed and not args.error_rate else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
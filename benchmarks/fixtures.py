@@ -0,0 +1,373 @@
+import os
+import sys
+import gzip
+import json
+import time
+import zlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session import Session
+from async_http import AsyncClient
+
+SPOTIFY_ROOT = "https://open.spotify.com/"
+DEEZER_ROOT = "https://www.deezer.com/"
+# Tracks per album and albums per artist of the generated catalogue
+TRACKS_PER_ALBUM = 10
+ALBUMS_PER_ARTIST = 10
+# Real pages are mostly scripts and markup after the meta tags
+DEFAULT_PAGE_SIZE = 200 * 1024
+WRITE_CHUNK_SIZE = 16 * 1024
+
+def spotify_id(number: int) -> str:
+    return f"{number:022d}"
+
+def track_urls(provider: str, count: int, start: int = 0) -> list:
+
+    """
+    * Get the URLs of count distinct tracks of the generated catalogue
+    """
+
+    if provider == "spotify":
+        return [f"{SPOTIFY_ROOT}track/{spotify_id(number)}" for number in range(start, start + count)]
+    return [f"{DEEZER_ROOT}track/{number}" for number in range(start, start + count)]
+
+def filler(size: int) -> str:
+    line = "<script>window.__bench = window.__bench || []; window.__bench.push('" + "x" * 64 + "');</script>\n"
+    return line * max(size // len(line), 0)
+
+def spotify_page(kind: str, number: int, size: int = DEFAULT_PAGE_SIZE) -> str:
+
+    """
+    * Build a Spotify page with the meta tags Spotify.get_metadata reads
+    """
+
+    if kind == "track":
+        album, artist = number // TRACKS_PER_ALBUM, number // TRACKS_PER_ALBUM // ALBUMS_PER_ARTIST
+        tags = (
+            f'<meta property="og:title" content="Track {number} &amp; Friends"/>'
+            f'<meta property="og:image" content="https://i.scdn.co/image/{spotify_id(album)}"/>'
+            f'<meta name="music:duration" content="{180 + number % 120}"/>'
+            f'<meta name="music:album" content="{SPOTIFY_ROOT}album/{spotify_id(album)}"/>'
+            f'<meta name="music:musician" content="{SPOTIFY_ROOT}artist/{spotify_id(artist)}"/>'
+            f'<meta name="music:musician_description" content="Artist {artist}"/>'
+            f'<meta name="music:release_date" content="2020-01-01"/>'
+            f'<meta name="music:album:track" content="{number % TRACKS_PER_ALBUM + 1}"/>'
+        )
+    elif kind == "album":
+        artist = number // ALBUMS_PER_ARTIST
+        first = number * TRACKS_PER_ALBUM
+        tags = (
+            f'<meta property="og:title" content="Album {number}"/>'
+            f'<meta property="og:image" content="https://i.scdn.co/image/{spotify_id(number)}"/>'
+            f'<meta property="og:description" content="Album {number} by Artist {artist}"/>'
+            f'<meta name="music:musician" content="{SPOTIFY_ROOT}artist/{spotify_id(artist)}"/>'
+            f'<meta name="music:release_date" content="2020-01-01"/>'
+        ) + "".join(f'<meta name="music:song" content="{SPOTIFY_ROOT}track/{spotify_id(track)}"/>' for track in range(first, first + TRACKS_PER_ALBUM))
+    else:
+        tags = f'<meta property="og:title" content="Artist {number}"/>'
+    return f"<!DOCTYPE html><html><head><title>Spotify</title>{tags}</head><body>{filler(size)}</body></html>"
+
+def deezer_state(kind: str, number: int) -> dict:
+    if kind == "track":
+        album = number // TRACKS_PER_ALBUM
+        artist = album // ALBUMS_PER_ARTIST
+        return {"DATA": deezer_song(number, album, artist)}
+    artist = number // ALBUMS_PER_ARTIST
+    first = number * TRACKS_PER_ALBUM
+    return {
+        "DATA": {
+            "ALB_ID": str(number), "ALB_TITLE": f"Album {number}", "ART_ID": str(artist), "ART_NAME": f"Artist {artist}",
+            "ALB_PICTURE": f"{number:032x}", "PHYSICAL_RELEASE_DATE": "2020-01-01", "ORIGINAL_RELEASE_DATE": "2019-12-01",
+        },
+        "SONGS": {"data": [deezer_song(track, number, artist) for track in range(first, first + TRACKS_PER_ALBUM)]},
+    }
+
+def deezer_song(number: int, album: int, artist: int) -> dict:
+    return {
+        "SNG_ID": str(number), "SNG_TITLE": f"Track {number}", "ART_ID": str(artist), "ART_NAME": f"Artist {artist}",
+        "ALB_ID": str(album), "ALB_TITLE": f"Album {album}", "ALB_PICTURE": f"{album:032x}", "DURATION": str(180 + number % 120),
+        "ISRC": f"BENCH{number:07d}", "PHYSICAL_RELEASE_DATE": "2020-01-01", "TRACK_NUMBER": str(number % TRACKS_PER_ALBUM + 1),
+        "DISK_NUMBER": "1", "ARTISTS": [{"ART_ID": str(artist), "ART_NAME": f"Artist {artist}"}],
+    }
+
+def deezer_page(kind: str, number: int, size: int = DEFAULT_PAGE_SIZE) -> str:
+
+    """
+    * Build a Deezer page with the meta tags Deezer.get_metadata reads and the app state script
+    """
+
+    if kind == "track":
+        album = number // TRACKS_PER_ALBUM
+        tags = (
+            f'<meta property="og:title" content="Track {number}"/>'
+            f'<meta property="og:image" content="https://e-cdns-images.dzcdn.net/images/cover/{album:032x}/500x500.jpg"/>'
+            f'<meta property="music:duration" content="{180 + number % 120}"/>'
+            f'<meta property="music:album:url" content="{DEEZER_ROOT}album/{album}"/>'
+            f'<meta property="music:musician" content="{DEEZER_ROOT}artist/{album // ALBUMS_PER_ARTIST}"/>'
+        )
+    elif kind == "album":
+        first = number * TRACKS_PER_ALBUM
+        tags = (
+            f'<meta property="og:title" content="Album {number}"/>'
+            f'<meta property="og:image" content="https://e-cdns-images.dzcdn.net/images/cover/{number:032x}/500x500.jpg"/>'
+            f'<meta property="og:description" content="Listen to Album {number} on Deezer"/>'
+            f'<meta property="music:musician" content="{DEEZER_ROOT}artist/{number // ALBUMS_PER_ARTIST}"/>'
+        ) + "".join(f'<meta property="music:song" content="{DEEZER_ROOT}track/{track}"/>' for track in range(first, first + TRACKS_PER_ALBUM))
+    else:
+        return f'<!DOCTYPE html><html><head><meta property="og:title" content="Artist {number}"/></head><body>{filler(size)}</body></html>'
+    # The app state comes after most of the page, like on deezer.com
+    state = json.dumps(deezer_state(kind, number))
+    return f"<!DOCTYPE html><html><head>{tags}</head><body>{filler(size)}<script>window.__DZR_APP_STATE__ = {state}</script></body></html>"
+
+def deezer_api_resource(kind: str, number: int) -> dict:
+
+    """
+    * Build a track or album resource of the Deezer API, for the api backend of Deezer
+    """
+
+    album = number // TRACKS_PER_ALBUM if kind == "track" else number
+    artist = {"id": album // ALBUMS_PER_ARTIST, "name": f"Artist {album // ALBUMS_PER_ARTIST}", "type": "artist"}
+    if kind == "album":
+        first = number * TRACKS_PER_ALBUM
+        return {
+            "id": number, "title": f"Album {number}", "md5_image": f"{number:032x}", "release_date": "2020-01-01",
+            "artist": artist, "type": "album",
+            "tracks": {"data": [{"id": track, "title": f"Track {track}", "duration": 180 + track % 120, "artist": artist, "type": "track"}
+                                for track in range(first, first + TRACKS_PER_ALBUM)]},
+        }
+    return {
+        "id": number, "title": f"Track {number}", "isrc": f"BENCH{number:07d}", "duration": 180 + number % 120,
+        "track_position": number % TRACKS_PER_ALBUM + 1, "disk_number": 1, "release_date": "2020-01-01",
+        "artist": artist, "type": "track",
+        "album": {"id": album, "title": f"Album {album}", "md5_image": f"{album:032x}", "release_date": "2020-01-01", "type": "album"},
+    }
+
+def generated_page(path: str, size: int = DEFAULT_PAGE_SIZE) -> bytes:
+
+    """
+    * Get the generated page of a fixture server path (/spotify/track/<id>, /deezer/album/<id>, /deezer-api/track/<id>, ...)
+
+        Data Returned:
+        - page (bytes)
+            DESCRIPTION: The HTML of the page, None for paths outside of the catalogue
+    """
+
+    parts = path.split("?")[0].strip("/").split("/")
+    if len(parts) == 4 and parts[0] == "deezer":
+        # Deezer URLs carry a language ("/en/track/...")
+        del parts[1]
+    if len(parts) != 3 or parts[1] not in ("track", "album", "artist"):
+        return None
+    provider, kind, found_id = parts
+    try:
+        number = int(found_id)
+    except ValueError:
+        return None
+    if provider == "spotify":
+        return spotify_page(kind, number, size).encode("utf-8")
+    if provider == "deezer":
+        return deezer_page(kind, number, size).encode("utf-8")
+    if provider == "deezer-api" and kind != "artist":
+        return json.dumps(deezer_api_resource(kind, number)).encode("utf-8")
+    return None
+
+class FixtureHTTPServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    # The default backlog of 5 drops connections under concurrent lookups,
+    # which then wait a whole SYN retransmission (1s) to connect
+    request_queue_size = 1024
+
+class FixtureServer:
+
+    """
+    * Local HTTP server for the generated catalogue (or the pages of an archive)
+
+        Data Used:
+        - latency (float)
+            DESCRIPTION: Seconds waited before every response
+        - bandwidth (float)
+            DESCRIPTION: Bytes per second each response is sent at, 0 for no limit
+        - error_rate (float)
+            DESCRIPTION: The fraction of requests answered with error_status
+        - error_status (int)
+            DESCRIPTION: The status of injected errors, 0 to reset the connection instead
+        - retry_after (str)
+            DESCRIPTION: The Retry-After header of injected errors, None to leave it out
+        - page_size (int)
+            DESCRIPTION: The approximate size of generated pages in bytes
+        - archive (archive.ArchiveReader)
+            DESCRIPTION: Serves recorded pages instead of generated ones
+        - seed (int)
+            DESCRIPTION: Seeds the error injection, so runs inject the same errors
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0, error_rate: float = 0.0, error_status: int = 503,
+                 page_size: int = DEFAULT_PAGE_SIZE, archive=None, seed: int = 0, retry_after: str = "0"):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.archive = archive
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.pages = {}
+
+        fixture = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, Nagle would hold the body back
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                fixture.handle(self)
+
+        self.server = FixtureHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def __enter__(self) -> "FixtureServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def local_url(self, url: str) -> str:
+
+        """
+        * Rewrite a Spotify/Deezer URL to the same page on this server
+        """
+
+        if url.startswith(SPOTIFY_ROOT):
+            return f"http://127.0.0.1:{self.port}/spotify/{url[len(SPOTIFY_ROOT):]}"
+        if url.startswith(DEEZER_ROOT):
+            return f"http://127.0.0.1:{self.port}/deezer/{url[len(DEEZER_ROOT):]}"
+        return url
+
+    def api_url(self) -> str:
+
+        """
+        * Get the base URL of the Deezer API stand-in, for the api_url of Deezer
+        """
+
+        return f"http://127.0.0.1:{self.port}/deezer-api/"
+
+    def remote_url(self, path: str) -> str:
+        provider, _, rest = path.lstrip("/").partition("/")
+        return (SPOTIFY_ROOT if provider == "spotify" else DEEZER_ROOT) + rest
+
+    def page(self, path: str) -> tuple:
+        if self.archive is not None:
+            record = self.archive.get(self.remote_url(path))
+            return (record.status, record.body) if record is not None else (404, b"")
+        # Pages are generated once, serving them shouldn't cost more than on a real server
+        page = self.pages.get(path)
+        if page is None:
+            page = self.pages[path] = generated_page(path, self.page_size)
+        return (200, page) if page is not None else (404, b"")
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        with self.lock:
+            self.requests += 1
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if failed and not self.error_status:
+            request.close_connection = True
+            request.connection.close()
+            return
+        status, body = (self.error_status, b"") if failed else self.page(request.path)
+        # Pages never change, so conditional requests are answered 304
+        etag = f'"{zlib.crc32(body):08x}"' if status == 200 else None
+        if etag is not None and request.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        encoded = "gzip" in request.headers.get("Accept-Encoding", "")
+        if encoded and body:
+            body = gzip.compress(body, 1)
+
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json" if request.path.startswith("/deezer-api/") else "text/html; charset=utf-8")
+        request.send_header("Content-Length", str(len(body)))
+        if encoded and body:
+            request.send_header("Content-Encoding", "gzip")
+        if etag is not None:
+            request.send_header("ETag", etag)
+        if failed and self.retry_after is not None:
+            request.send_header("Retry-After", self.retry_after)
+        request.end_headers()
+        self.send_body(request, body)
+        with self.lock:
+            self.bytes_sent += len(body)
+
+    def send_body(self, request: BaseHTTPRequestHandler, body: bytes) -> None:
+        try:
+            if not self.bandwidth:
+                request.wfile.write(body)
+                return
+            for start in range(0, len(body), WRITE_CHUNK_SIZE):
+                chunk = body[start:start + WRITE_CHUNK_SIZE]
+                request.wfile.write(chunk)
+                time.sleep(len(chunk) / self.bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            # Streaming clients hang up once they have the part of the page they need
+            request.close_connection = True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "errors": self.errors, "bytes_sent": self.bytes_sent}
+
+class FixtureSession(Session):
+
+    """
+    * Session sending the requests for Spotify/Deezer pages to a FixtureServer
+
+        URLs are rewritten when they are sent, so rate limiting, retries and
+        coalescing still see the real hosts.
+    """
+
+    def __init__(self, fixture: FixtureServer, **options):
+        super().__init__(**options)
+        self.fixture = fixture
+
+    def send(self, url: str, headers: dict = None, until=None):
+        return super().send(self.fixture.local_url(url), headers, until)
+
+class FixtureClient(AsyncClient):
+
+    """
+    * AsyncClient sending the requests for Spotify/Deezer pages to a FixtureServer, see FixtureSession
+    """
+
+    def __init__(self, fixture: FixtureServer, **options):
+        super().__init__(**options)
+        self.fixture = fixture
+
+    async def _request(self, url: str, until=None):
+        return await super()._request(self.fixture.local_url(url), until)
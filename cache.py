@@ -0,0 +1,383 @@
+import time
+import pickle
+import sqlite3
+import threading
+import collections
+
+from metrics import increment
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_NEGATIVE_TTL = 5 * 60
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_ARTIST_ENTRIES = 10_000
+DEFAULT_ALBUM_ENTRIES = 2_000
+
+MISS = object()
+
+class CachedFailure(ConnectionError):
+
+    """
+    * A lookup that failed recently and is remembered by the negative cache
+    """
+
+class MetadataCache:
+
+    """
+    * Persistent SQLite cache of SongData/AlbumData (and artist names)
+
+        Entries are keyed by provider, type and ID, and expire after their TTL.
+        Failed lookups are remembered for a shorter TTL so dead links are not
+        fetched over and over. When the cache grows past max_entries, the
+        entries closest to expiring are evicted first.
+
+        Entries can keep the ETag/Last-Modified validators of the page they
+        were parsed from. Once such an entry expires, the page is requested
+        again with If-None-Match/If-Modified-Since, and a 304 answer keeps the
+        entry for another TTL without downloading or parsing the page.
+
+        Data Used:
+        - path (str)
+            DESCRIPTION: The SQLite database file, ":memory:" for a cache that doesn't persist
+        - ttl (float)
+            DESCRIPTION: The default time to live of an entry in seconds
+        - negative_ttl (float)
+            DESCRIPTION: The time to live of a failed lookup in seconds
+        - max_entries (int)
+            DESCRIPTION: The maximum number of entries kept
+    """
+
+    def __init__(self, path: str = ":memory:", ttl: float = DEFAULT_TTL, negative_ttl: float = DEFAULT_NEGATIVE_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB, error TEXT, expires REAL NOT NULL, "
+                "etag TEXT, last_modified TEXT, size INTEGER)"
+            )
+            # Databases made before validators were stored are upgraded in place
+            columns = {row[1] for row in self.db.execute("PRAGMA table_info(entries)")}
+            for column, column_type in (("etag", "TEXT"), ("last_modified", "TEXT"), ("size", "INTEGER")):
+                if column not in columns:
+                    self.db.execute(f"ALTER TABLE entries ADD COLUMN {column} {column_type}")
+            self.db.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)")
+            self.size = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def make_key(provider: str, metadata_type: str, found_id: str) -> str:
+        return f"{provider}:{metadata_type}:{found_id}"
+
+    def get(self, provider: str, metadata_type: str, found_id: str):
+
+        """
+        * Get a cached entry
+
+            Data Used:
+            - provider (str)
+                DESCRIPTION: The provider name ("spotify" or "deezer")
+            - metadata_type (str)
+                DESCRIPTION: The type of metadata ("song", "album" or "artist")
+            - found_id (str)
+                DESCRIPTION: The ID of the song, album or artist
+
+            Data Returned:
+            - value (SongData, AlbumData, str, CachedFailure or MISS)
+                DESCRIPTION: The cached data, a CachedFailure for a remembered failure, or MISS
+        """
+
+        key = self.make_key(provider, metadata_type, found_id)
+        with self.lock:
+            row = self.db.execute("SELECT value, error, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or row[2] <= time.time():
+                self.misses += 1
+                increment("cache_misses")
+                return MISS
+            if row[1] is not None:
+                self.negative_hits += 1
+                increment("cache_negative_hits")
+                return CachedFailure(row[1])
+            self.hits += 1
+        increment("cache_hits")
+        return pickle.loads(row[0])
+
+    def set(self, provider: str, metadata_type: str, found_id: str, value, ttl: float = None, validators: dict = None, size: int = 0) -> None:
+
+        """
+        * Store the data of a successful lookup
+
+            Data Used:
+            - value (SongData, AlbumData or str)
+                DESCRIPTION: The data to store, an artist name for "artist" entries
+            - ttl (float)
+                DESCRIPTION: The time to live of this entry, defaults to the cache TTL
+            - validators (dict)
+                DESCRIPTION: The validators of the page the data was parsed from, see get_validators
+            - size (int)
+                DESCRIPTION: The size of that page in bytes, counted as saved when it is revalidated
+        """
+
+        ttl = self.ttl if ttl is None else ttl
+        self._store(self.make_key(provider, metadata_type, found_id), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), None, ttl, validators, size)
+
+    def get_stale(self, provider: str, metadata_type: str, found_id: str):
+
+        """
+        * Get an entry that can be revalidated, whether it expired or not
+
+            Data Returned:
+            - stale (tuple or MISS)
+                DESCRIPTION: The cached data and the validators of its page, MISS if there is
+                no entry or it was stored without validators
+        """
+
+        key = self.make_key(provider, metadata_type, found_id)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value, etag, last_modified FROM entries WHERE key = ? AND error IS NULL "
+                "AND (etag IS NOT NULL OR last_modified IS NOT NULL)",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return MISS
+        return pickle.loads(row[0]), {"etag": row[1], "last_modified": row[2]}
+
+    def count_revalidation(self) -> None:
+
+        """
+        * Count a conditional request, sent with the validators of get_stale, that got an answer
+        """
+
+        with self.lock:
+            self.revalidations += 1
+        increment("cache_revalidations")
+
+    def refresh(self, provider: str, metadata_type: str, found_id: str, ttl: float = None) -> None:
+
+        """
+        * Keep an entry for another TTL after its page answered 304 Not Modified
+        """
+
+        ttl = self.ttl if ttl is None else ttl
+        key = self.make_key(provider, metadata_type, found_id)
+        with self.lock:
+            row = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            self.db.execute("UPDATE entries SET expires = ? WHERE key = ?", (time.time() + ttl, key))
+            self.not_modified += 1
+            self.bytes_saved += row[0] or 0
+        increment("cache_not_modified")
+
+    def set_failure(self, provider: str, metadata_type: str, found_id: str, error: Exception) -> None:
+
+        """
+        * Remember a failed lookup for the negative TTL
+        """
+
+        self._store(self.make_key(provider, metadata_type, found_id), None, str(error) or type(error).__name__, self.negative_ttl)
+
+    def _store(self, key: str, value: bytes, error: str, ttl: float, validators: dict = None, size: int = 0) -> None:
+        validators = validators or {}
+        row = (value, error, time.time() + ttl, validators.get("etag"), validators.get("last_modified"), size)
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO entries (value, error, expires, etag, last_modified, size, key) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row + (key,),
+            )
+            if cursor.rowcount:
+                self.size += 1
+            else:
+                self.db.execute(
+                    "UPDATE entries SET value = ?, error = ?, expires = ?, etag = ?, last_modified = ?, size = ? WHERE key = ?",
+                    row + (key,),
+                )
+            if self.size > self.max_entries:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Drop expired entries first, then the ones closest to expiring,
+        # leaving some headroom so eviction doesn't run on every insert
+        target = max(int(self.max_entries * 0.9), 0)
+        removed = self.db.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),)).rowcount
+        self.size -= removed
+        if self.size > target:
+            removed_oldest = self.db.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires LIMIT ?)",
+                (self.size - target,),
+            ).rowcount
+            self.size -= removed_oldest
+            removed += removed_oldest
+        self.evictions += removed
+
+    def clear(self) -> None:
+        with self.lock:
+            self.db.execute("DELETE FROM entries")
+            self.size = 0
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+    def stats(self) -> dict:
+
+        """
+        * Get the hit/miss counters of the cache
+
+            Data Returned:
+            - stats (dict)
+                DESCRIPTION: hits, misses, negative_hits, evictions, the current size, and the
+                conditional requests sent (revalidations), the 304 answers among them
+                (not_modified), and the page bytes and parses those answers skipped
+                (bytes_saved, parses_saved)
+        """
+
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "evictions": self.evictions,
+                "size": self.size,
+                "revalidations": self.revalidations,
+                "not_modified": self.not_modified,
+                "parses_saved": self.not_modified,
+                "bytes_saved": self.bytes_saved,
+            }
+
+def get_validators(headers) -> dict:
+
+    """
+    * Get the validators of a response, used to revalidate what was parsed from it
+
+        Data Used:
+        - headers (dict)
+            DESCRIPTION: The response headers
+
+        Data Returned:
+        - validators (dict)
+            DESCRIPTION: The ETag and Last-Modified headers ("etag", "last_modified"), empty if it has none
+    """
+
+    validators = {}
+    if headers.get("etag"):
+        validators["etag"] = headers.get("etag")
+    if headers.get("last-modified"):
+        validators["last_modified"] = headers.get("last-modified")
+    return validators
+
+def conditional_headers(validators: dict) -> dict:
+
+    """
+    * Get the headers of a conditional request from validators
+    """
+
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+class LRUCache:
+
+    """
+    * Thread-safe, size-bounded in-process LRU cache
+
+        Data Used:
+        - max_entries (int)
+            DESCRIPTION: The maximum number of entries kept, 0 disables the cache
+        - name (str)
+            DESCRIPTION: Reports hits and misses to metrics as <name>_hits and <name>_misses, None to not report them
+    """
+
+    def __init__(self, max_entries: int, name: str = None):
+        self.max_entries = max_entries
+        self.name = name
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+
+        """
+        * Get an entry and mark it as recently used
+
+            Data Returned:
+            - value
+                DESCRIPTION: The cached value, or MISS
+        """
+
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                if self.name is not None:
+                    increment(f"{self.name}_misses")
+                return MISS
+            self.entries.move_to_end(key)
+            self.hits += 1
+        if self.name is not None:
+            increment(f"{self.name}_hits")
+        return value
+
+    def set(self, key: str, value) -> None:
+        with self.lock:
+            if self.max_entries <= 0:
+                return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def resize(self, max_entries: int) -> None:
+        with self.lock:
+            self.max_entries = max_entries
+            while len(self.entries) > max(max_entries, 0):
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+
+        """
+        * Get the hit/miss counters of the cache
+
+            Data Returned:
+            - stats (dict)
+                DESCRIPTION: hits, misses, hit_rate, evictions and the current size
+        """
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+            }
+
+# Resolved artist names and album metadata, keyed by page URL and shared by
+# every Spotify/Deezer instance of the process
+artist_cache = LRUCache(DEFAULT_ARTIST_ENTRIES, "artist_cache")
+album_cache = LRUCache(DEFAULT_ALBUM_ENTRIES, "album_cache")
@@ -0,0 +1,452 @@
+import os
+import sys
+import csv
+import json
+import logging
+import argparse
+import collections
+import concurrent.futures
+
+import extractor
+from batch import DEFAULT_DEDUPE_ENTRIES, DEFAULT_WORKERS, BatchResult, fan_out, lookup
+from spotify import SP_URL_REGEX, Spotify
+from deezer import BACKENDS, DZ_API_URL, DZ_URL_REGEX, Deezer
+from records import ALBUM_FIELDS, SONG_COLUMNS, AlbumData, flatten
+from normalize import dedupe_key, normalize
+from cache import MISS, LRUCache, MetadataCache
+from session import set_session
+from ratelimit import RetryPolicy, get_limiter
+from archive import ArchiveReader, ArchiveWriter, RecordingSession, ReplaySession
+from metrics import get_metrics
+
+PROVIDERS = {"spotify": Spotify, "deezer": Deezer}
+METHODS = {"track": "get_song", "album": "get_album"}
+
+CSV_COLUMNS = ("line", "input", "provider", "type") + SONG_COLUMNS + ("description",)
+DEFAULT_CHECKPOINT_EVERY = 1000
+
+def detect(value: str, default_type: str = "track") -> tuple:
+
+    """
+    * Find the provider and the type of a URL or ID
+
+        Data Used:
+        - value (str)
+            DESCRIPTION: A Spotify/Deezer URL or a bare ID
+        - default_type (str)
+            DESCRIPTION: The type of bare IDs ("track" or "album")
+
+        Data Returned:
+        - provider (str)
+            DESCRIPTION: "spotify" or "deezer", None if the value isn't recognised
+        - type (str)
+            DESCRIPTION: "track", "album", or the unsupported type found in the URL
+    """
+
+    key = normalize(value, default_type)
+    if key is not None:
+        return key[0], key[1]
+
+    # URLs of types normalize doesn't know (episodes, shows, ...)
+    for provider, regex in (("spotify", SP_URL_REGEX), ("deezer", DZ_URL_REGEX)):
+        match = regex.search(value.split("?")[0])
+        if match:
+            found_type, found_id = match.group("type"), match.group("id")
+            # Localised URLs (/intl-es/track/..., /en/track/...) have the type after the locale
+            if found_id.find("/") != -1:
+                found_type = found_id.split("/")[0]
+            return provider, found_type
+    return None, None
+
+def read_inputs(file, skip: int = 0):
+
+    """
+    * Read URLs or IDs from a file, one per line, lazily
+
+        Data Used:
+        - file (file object)
+            DESCRIPTION: A text file opened for reading
+        - skip (int)
+            DESCRIPTION: The number of lines already handled (from a checkpoint)
+
+        Data Returned:
+        - inputs (generator of tuple)
+            DESCRIPTION: The line number and the stripped line, blank lines and # comments left out
+    """
+
+    for number, line in enumerate(file, 1):
+        if number <= skip:
+            continue
+        value = line.strip()
+        if value and not value.startswith("#"):
+            yield number, value
+
+def resolve(number: int, value: str, logger: logging.Logger, options: dict, default_type: str) -> tuple:
+
+    """
+    * Resolve one input line
+
+        Data Returned:
+        - number (int)
+            DESCRIPTION: The line number of the input
+        - provider (str)
+            DESCRIPTION: The provider name, None if it wasn't recognised
+        - type (str)
+            DESCRIPTION: The type of the input
+        - result (BatchResult)
+            DESCRIPTION: The metadata or the error
+    """
+
+    provider, found_type = detect(value, default_type)
+    if provider is None:
+        return number, None, None, BatchResult(value, error="Not a Spotify or Deezer URL or ID")
+    if found_type not in METHODS:
+        return number, provider, found_type, BatchResult(value, error=f"Unsupported type: {found_type}")
+    return number, provider, found_type, lookup(PROVIDERS[provider], METHODS[found_type], value, logger, options[provider])
+
+def iter_resolved(inputs, logger: logging.Logger, options: dict, workers: int = DEFAULT_WORKERS, ordered: bool = True, default_type: str = "track", dedupe: int = DEFAULT_DEDUPE_ENTRIES):
+
+    """
+    * Resolve input lines on a bounded thread pool, in constant memory
+
+        Data Used:
+        - inputs (iterable)
+            DESCRIPTION: Line numbers and values, see read_inputs
+        - options (dict)
+            DESCRIPTION: Provider name to the extra arguments of its instances
+        - workers (int)
+            DESCRIPTION: The number of lookups in flight at once
+        - ordered (bool)
+            DESCRIPTION: Whether to yield in input order, or as lookups complete
+        - dedupe (int)
+            DESCRIPTION: How many recent inputs are remembered so duplicates are looked up once, 0 to look up every input
+
+        Data Returned:
+        - results (generator of tuple)
+            DESCRIPTION: See resolve
+    """
+
+    window = workers * 2
+    seen = LRUCache(dedupe)
+
+    def output(entry, number: int, value: str, key=None) -> tuple:
+        resolved = entry.result() if isinstance(entry, concurrent.futures.Future) else entry
+        # Finished lookups are remembered by their result, a fraction of the size of their future
+        if dedupe and key is not None:
+            seen.set(key, resolved)
+        _, provider, found_type, result = resolved
+        return number, provider, found_type, fan_out(result, value)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit(number: int, value: str) -> tuple:
+            key = dedupe_key(value, default_type) if dedupe else None
+            entry = seen.get(key) if dedupe else MISS
+            if entry is MISS:
+                entry = executor.submit(resolve, number, value, logger, options, default_type)
+                seen.set(key, entry)
+                return entry, key, True
+            return entry, key, False
+
+        if ordered:
+            pending = collections.deque()
+            for number, value in inputs:
+                entry, key, _ = submit(number, value)
+                pending.append((entry, number, value, key))
+                if len(pending) >= window:
+                    yield output(*pending.popleft())
+            while pending:
+                yield output(*pending.popleft())
+            return
+
+        # Every running lookup with its key and the inputs waiting for it
+        waiting = {}
+        for number, value in inputs:
+            entry, key, new = submit(number, value)
+            if not new and entry not in waiting:
+                yield output(entry, number, value, key)
+                continue
+            waiting.setdefault(entry, (key, []))[1].append((number, value))
+            if len(waiting) >= window:
+                done, _ = concurrent.futures.wait(waiting, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    key, inputs_waiting = waiting.pop(future)
+                    for number, value in inputs_waiting:
+                        yield output(future, number, value, key)
+        for future in concurrent.futures.as_completed(list(waiting)):
+            key, inputs_waiting = waiting.pop(future)
+            for number, value in inputs_waiting:
+                yield output(future, number, value, key)
+
+class Checkpoint:
+
+    """
+    * Remembers how many input lines were fully handled, to resume after a crash
+
+        The checkpoint only moves past a line once it and every line before
+        it were written. The lines written ahead of it (with --unordered) and
+        the sizes of the output files are saved along with it, every `every`
+        results. Resuming truncates the files to those sizes, dropping what
+        was written after the save, and skips the lines written ahead, so
+        the run continues exactly where the save left it.
+
+        Data Used:
+        - path (str)
+            DESCRIPTION: The checkpoint file, None to disable checkpoints
+        - every (int)
+            DESCRIPTION: How many results are written between two saves
+    """
+
+    def __init__(self, path: str = None, every: int = DEFAULT_CHECKPOINT_EVERY):
+        self.path = path
+        self.every = every
+        self.line = 0
+        self.last_read = 0
+        self.pending = set()
+        # Lines past self.line that were already written
+        self.ahead = set()
+        self.offsets = {}
+        self.unsaved = 0
+        self.resumed = bool(path) and os.path.exists(path)
+        if self.resumed:
+            with open(path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+            self.line = self.last_read = state.get("line", 0)
+            self.ahead = set(state.get("ahead", ()))
+            self.offsets = state.get("offsets", {})
+
+    def track(self, inputs):
+
+        """
+        * Pass inputs through, recording which lines were read but not written yet
+
+            Lines that were written ahead of the checkpoint before it was saved are left out.
+        """
+
+        for number, value in inputs:
+            self.last_read = number
+            if number in self.ahead:
+                continue
+            self.pending.add(number)
+            yield number, value
+
+    def mark(self, number: int) -> None:
+
+        """
+        * Record that a line was written
+        """
+
+        self.pending.discard(number)
+        line = min(self.pending) - 1 if self.pending else self.last_read
+        if number > line:
+            self.ahead.add(number)
+        if line != self.line:
+            self.line = line
+            self.ahead = {ahead for ahead in self.ahead if ahead > line}
+        self.unsaved += 1
+
+    def truncate(self, name: str, path: str) -> None:
+
+        """
+        * Cut an output file of a resumed run back to its size at the last save
+
+            Data Used:
+            - name (str)
+                DESCRIPTION: The name of the file in the checkpoint ("output" or "failures")
+            - path (str)
+                DESCRIPTION: The file
+        """
+
+        offset = self.offsets.get(name)
+        if offset is not None and os.path.exists(path) and os.path.getsize(path) > offset:
+            os.truncate(path, offset)
+
+    @property
+    def due(self) -> bool:
+        return self.unsaved >= self.every
+
+    def save(self, offsets: dict = None) -> None:
+
+        """
+        * Save the checkpoint, with the sizes of the output files once everything before it was flushed
+
+            Data Used:
+            - offsets (dict)
+                DESCRIPTION: File name ("output" or "failures") to its size in bytes, see Writer.offsets
+        """
+
+        self.unsaved = 0
+        if not self.path:
+            return
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump({"line": self.line, "ahead": sorted(self.ahead), "offsets": offsets or {}}, file)
+        os.replace(temporary, self.path)
+
+class Writer:
+
+    """
+    * Writes results as JSON Lines or CSV, and failures as JSON Lines
+
+        Data Used:
+        - output (file object)
+            DESCRIPTION: Where results go
+        - failures (file object)
+            DESCRIPTION: Where failed lookups go
+        - output_format (str)
+            DESCRIPTION: "jsonl" or "csv"
+        - header (bool)
+            DESCRIPTION: Whether to write the CSV header
+    """
+
+    def __init__(self, output, failures, output_format: str = "jsonl", header: bool = True):
+        self.output = output
+        self.failures = failures
+        self.output_format = output_format
+        self.written = 0
+        self.failed = 0
+        if output_format == "csv":
+            self.csv = csv.DictWriter(output, CSV_COLUMNS, restval="", extrasaction="ignore")
+            if header:
+                self.csv.writeheader()
+
+    def write(self, number: int, provider: str, found_type: str, result: BatchResult) -> None:
+        if not result.ok:
+            self.failed += 1
+            self.failures.write(json.dumps({"line": number, "input": result.url, "provider": provider, "type": found_type, "error": result.error}, ensure_ascii=False) + "\n")
+            return
+
+        self.written += 1
+        if self.output_format == "csv":
+            row = flatten(result.data)
+            if isinstance(result.data, AlbumData):
+                row = {name: row[name] for name in ALBUM_FIELDS}
+            row.update(line=number, input=result.url, provider=provider, type=found_type)
+            self.csv.writerow(row)
+        else:
+            self.output.write(json.dumps({"line": number, "input": result.url, "provider": provider, "type": found_type, "data": result.data.to_dict()}, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        self.output.flush()
+        self.failures.flush()
+
+    def offsets(self) -> dict:
+
+        """
+        * Get the sizes of the output files written so far, once flushed (the standard streams are left out)
+        """
+
+        return {
+            name: file.tell()
+            for name, file in (("output", self.output), ("failures", self.failures))
+            if file not in (sys.stdout, sys.stderr)
+        }
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Resolve Spotify and Deezer URLs or IDs to metadata, one per line.")
+    parser.add_argument("input", nargs="?", default="-", help="file with one URL or ID per line, - for stdin (default)")
+    parser.add_argument("-o", "--output", default="-", help="where results are written, - for stdout (default)")
+    parser.add_argument("-f", "--format", choices=("jsonl", "csv"), default="jsonl", help="output format (default: jsonl)")
+    parser.add_argument("--failures", default=None, help="where failed lookups are written as JSON Lines (default: stderr)")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help=f"lookups in flight at once (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--unordered", action="store_true", help="write results as they complete instead of in input order")
+    parser.add_argument("--type", choices=tuple(METHODS), default="track", help="type of bare IDs (default: track)")
+    parser.add_argument("--checkpoint", default=None, help="file recording the progress, to resume an interrupted run")
+    parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CHECKPOINT_EVERY, help=f"results between two checkpoint saves (default: {DEFAULT_CHECKPOINT_EVERY})")
+    parser.add_argument("--cache", default=None, help="SQLite metadata cache file")
+    parser.add_argument("--app-state", action="store_true", help="read Deezer metadata from the app state of each page")
+    parser.add_argument("--experimental", action="store_true", help="backfill Deezer metadata from the app state")
+    parser.add_argument("--deezer-backend", choices=BACKENDS, default="html", help="read Deezer metadata from the webpages (html, default) or the JSON API (api)")
+    parser.add_argument("--deezer-api-url", default=DZ_API_URL, help=f"base URL of the Deezer API (default: {DZ_API_URL})")
+    parser.add_argument("--streaming", action="store_true", help="stop downloading pages once their meta tags were read")
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument("--record", default=None, help="archive file every downloaded page is appended to")
+    archive.add_argument("--replay", default=None, help="archive file pages are read from instead of the network")
+    parser.add_argument("--metrics", default=None, help="file the timings and counters of the run are written to as JSON")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="log more (-v for info, -vv for debug)")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
+
+def main(argv: list = None) -> int:
+
+    """
+    * Run the command line tool
+
+        Data Used:
+        - argv (list)
+            DESCRIPTION: The command line arguments, defaults to sys.argv
+
+        Data Returned:
+        - status (int)
+            DESCRIPTION: 0 when every lookup succeeded, 1 when some failed
+    """
+
+    args = parse_args(argv)
+
+    logger = logging.getLogger("musicdata")
+    logger.setLevel((logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)])
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+
+    if args.streaming:
+        extractor.set_streaming(True)
+    cache = MetadataCache(args.cache) if args.cache else None
+    archive = None
+    if args.replay:
+        archive = ArchiveReader(args.replay)
+        set_session(ReplaySession(archive))
+    elif args.record:
+        archive = ArchiveWriter(args.record)
+        set_session(RecordingSession(archive, limiter=get_limiter(), retry=RetryPolicy()))
+    options = {
+        "spotify": {"cache": cache},
+        "deezer": {"cache": cache, "app_state": args.app_state, "experimental": args.experimental, "backend": args.deezer_backend, "api_url": args.deezer_api_url},
+    }
+
+    checkpoint = Checkpoint(args.checkpoint, args.checkpoint_every)
+    resuming = checkpoint.resumed
+    if resuming:
+        logger.info(f"Resuming after line {checkpoint.line}")
+        # What was written after the last save is written again
+        if args.output != "-":
+            checkpoint.truncate("output", args.output)
+        if args.failures is not None:
+            checkpoint.truncate("failures", args.failures)
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    # A resumed run appends to the files of the interrupted one
+    mode = "a" if resuming else "w"
+    output = sys.stdout if args.output == "-" else open(args.output, mode, encoding="utf-8", newline="")
+    failures = sys.stderr if args.failures is None else open(args.failures, mode, encoding="utf-8")
+    writer = Writer(output, failures, args.format, header=not (resuming and args.output != "-"))
+
+    try:
+        inputs = checkpoint.track(read_inputs(source, checkpoint.line))
+        for number, provider, found_type, result in iter_resolved(inputs, logger, options, args.workers, not args.unordered, args.type):
+            writer.write(number, provider, found_type, result)
+            checkpoint.mark(number)
+            # Results are flushed before the checkpoint moves past them
+            if checkpoint.due:
+                writer.flush()
+                checkpoint.save(writer.offsets())
+        writer.flush()
+        checkpoint.save(writer.offsets())
+    finally:
+        for file in (source, output, failures):
+            if file not in (sys.stdin, sys.stdout, sys.stderr):
+                file.close()
+        if cache is not None:
+            cache.close()
+        if archive is not None:
+            set_session(None)
+            archive.close()
+
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as file:
+            json.dump(get_metrics().snapshot(), file, indent=2)
+    logger.info(f"{writer.written} resolved, {writer.failed} failed")
+    return 1 if writer.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,100 @@
 import re
 import json
+import asyncio
+import time
 import logging
+import functools
 import datetime
-import urllib.request
+import threading
+import urllib.error
 
-from bs4 import BeautifulSoup
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+from batch import DEFAULT_ASYNC_WORKERS, DEFAULT_DEDUPE_ENTRIES, DEFAULT_WORKERS, BatchResult, async_lookup, async_run_batch, run_batch, run_lookups
+from async_http import AsyncClient, get_client
+from session import get_session
+from extractor import Page, parse_page, stop_condition
+from records import UNKNOWN, AlbumData, LazyAlbum, SongData
+from normalize import normalize_for
+from metrics import stage, timed, traced
+from cache import MISS, CachedFailure, MetadataCache, album_cache, artist_cache, conditional_headers, get_validators
 
 DZ_URL_REGEX = re.compile('https://www\.deezer\.com/(?P<type>[^/]*)/(?P<id>[^?]*)')
+DZ_COVER_URL = "https://e-cdns-images.dzcdn.net/images/cover/{}/500x500-000000-80-0-0.jpg"
+DZ_API_URL = "https://api.deezer.com/"
+# "html" scrapes the track, album and artist pages, "api" reads one JSON resource per lookup
+BACKENDS = ("html", "api")
+API_RESOURCES = {"song": "track", "album": "album"}
+# Once the API fails, every instance scrapes the webpages for this long before asking it again
+API_COOLDOWN = 60.0
+DZ_ALBUM_URL = "https://www.deezer.com/en/album/{}"
+# Why an API request failed: the API can't answer any lookup for now (unreachable,
+# 5xx, 429, quota exceeded), or it has no such track or album
+API_DOWN = "down"
+API_NOT_FOUND = "not_found"
+# Codes of the API error object that mean the quota is exceeded, see read_api_data
+API_QUOTA_ERRORS = (4,)
+
+_api_down_until = {}
+_api_lock = threading.Lock()
+
+def api_available(api_url: str) -> bool:
+
+    """
+    * Check whether lookups may ask the Deezer API at api_url, False while it cools down after a failure
+    """
+
+    with _api_lock:
+        return _api_down_until.get(api_url, 0.0) <= time.monotonic()
+
+def set_api_failed(api_url: str, cooldown: float = API_COOLDOWN) -> None:
+
+    """
+    * Send the lookups of every instance using the API at api_url to the webpages for cooldown seconds
+    """
+
+    with _api_lock:
+        _api_down_until[api_url] = time.monotonic() + cooldown
 
 class Deezer:
     
-    def __init__(self, url: str, logger: logging.Logger, experimental: bool = False):
+    PROVIDER = "deezer"
+    
+    def __init__(self, url: str, logger: logging.Logger, experimental: bool = False, cache: MetadataCache = None, app_state: bool = False, lazy_album: bool = False,
+                 backend: str = "html", api_url: str = DZ_API_URL):
+        
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
         
         self.logger = logger
+        self.error = None
+        self.cache = cache
+        self.validators = {}
+        self.lazy_album = lazy_album
         self.experimental = experimental
+        self.app_state = app_state
+        self.album_state = None
+        self.backend = backend
+        self.api_url = api_url
+        
+        # An input that can't be read is kept as the ID, the lookups then fail with input_error
+        key = normalize_for(url, self.PROVIDER)
+        self.input_error = None if key is not None else ValueError(f"Not a Deezer URL, URI or ID: {url!r}")
+        logger.debug("Deezer ID detected!" if key is None or key[2] == url.strip() else "Deezer URL detected!")
+        self.found_id = key[2] if key is not None else url.strip()
         
-        if url.find("deezer.com") != -1:
-            logger.debug("Deezer URL detected!")
-            self.found_id = DZ_URL_REGEX.search(url.split("?")[0]).group("id")
-            if self.found_id.find("/") != -1:
-                self.found_id = self.found_id.split("/")[1]
-        else:
-            logger.debug("Deezer ID detected!")
-            self.found_id = url
-            
         self.song_url = f"https://www.deezer.com/en/track/{self.found_id}"
-        self.album_url = f"https://www.deezer.com/en/album/{self.found_id}"
+        self.album_url = DZ_ALBUM_URL.format(self.found_id)
         
         logger.debug(f"Song ID: {self.found_id}")
         logger.debug(f"Song URL: {self.song_url}")
         logger.debug(f"Album URL: {self.album_url}")
         
-    def get_song(self) -> dict:
+    @traced
+    def get_song(self) -> SongData:
         
         """
         * Get the metadata of a Deezer song
@@ -49,29 +112,55 @@ class Deezer:
                 DESCRIPTION: The date the song was released
         """
         
+        cached = self.get_cached("song", self.found_id)
+        if cached is not MISS:
+            return cached
+        
         try:
-            soup = self.get_webpage(self.song_url)
-            self.metatags = soup.findAll("meta")
-            metadata = self.get_metadata(self.metatags, "song")
+            self.check_input()
+            # The API resource of a song embeds its album and artist
+            metadata = self.get_api_lookup("song", self.found_id) if self.backend == "api" else None
+            if metadata is not None:
+                self.set_cached("song", self.found_id, metadata)
+                return metadata
             
-            if self.experimental:
-                script_tag = soup.find('script', string=re.compile('window.__DZR_APP_STATE__'))
-                if script_tag:
-                    script_tag = script_tag.string.replace('window.__DZR_APP_STATE__ = {', '').replace('};', '')
-                    script_tag = "{" + script_tag 
-                    json_data = json.loads(script_tag)
+            page, cached = self.get_revalidated_page("song", self.found_id, self.song_url, self.experimental or self.app_state)
+            if cached is not MISS:
+                return cached
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.song_url}")
+            self.metatags = page.metatags
+            
+            # In app state mode the album and the artist come with the song
+            metadata = self.get_state_metadata(page.app_state, self.metatags, "song") if self.app_state else None
+            if metadata is not None:
+                self.album_url = self.get_state_album_url(page.app_state)
+                self.use_state_album(metadata.album)
+            else:
+                metadata = self.get_metadata(self.metatags, "song", get_artist=self.get_cached_artist)
                 
-                if metadata.release_date == "Unknown":
-                    metadata.release_date = json_data['DATA']['PHYSICAL_RELEASE_DATE']
+                if self.experimental:
+                    metadata = self.apply_app_state(page, metadata)
+                
+                self.album_url = self.get_album_page_url(metadata.album)
+                if self.lazy_album:
+                    # The song is cached once its album is fetched
+                    metadata = metadata.replace(album=LazyAlbum(self.album_url, self.get_album, functools.partial(self.set_cached_song, metadata)))
+                else:
+                    metadata = metadata.replace(album=self.get_album())
             
-            self.album_url = f"{metadata.album}"
-            metadata.album = self.get_album()
+            # Songs are only cached once their album is known
+            if isinstance(metadata.album, AlbumData) and not isinstance(metadata.album, LazyAlbum):
+                self.set_cached("song", self.found_id, metadata)
             return metadata
         except Exception as e:
+            self.error = e
+            self.set_cached_failure("song", self.found_id, e)
             self.logger.error(f"Failed to get song: {e}")
             return False
         
-    def get_album(self) -> dict:
+    @traced
+    def get_album(self) -> AlbumData:
         
         """
         * Get the metadata of a Deezer album
@@ -87,28 +176,531 @@ class Deezer:
                 DESCRIPTION: The date the album was released
         """
         
+        album_id = self.get_album_id()
+        cached = self.get_cached("album", album_id)
+        if cached is not MISS:
+            return cached
+        
+        # Albums are shared by every song on them, most lookups hit this
+        album = album_cache.get(self.album_url)
+        if album is not MISS:
+            return album
+        
         try:
-            soup = self.get_webpage(self.album_url)
-            self.metatags = soup.findAll("meta")
-            metadata = self.get_metadata(self.metatags, "album")
+            self.check_input()
+            metadata = self.get_api_lookup("album", album_id) if self.backend == "api" else None
+            if metadata is not None:
+                album_cache.set(self.album_url, metadata)
+                self.set_cached("album", album_id, metadata)
+                return metadata
             
-            if self.experimental:
-                script_tag = soup.find('script', string=re.compile('window.__DZR_APP_STATE__'))
-                if script_tag:
-                    script_tag = script_tag.string.replace('window.__DZR_APP_STATE__ = {', '').replace('};', '')
-                    script_tag = "{" + script_tag 
-                    json_data = json.loads(script_tag)
-                    
-                if metadata.release_date == "Unknown":
-                    metadata.release_date = json_data['DATA']['PHYSICAL_RELEASE_DATE']
+            page, cached = self.get_revalidated_page("album", album_id, self.album_url, self.experimental or self.app_state)
+            if cached is not MISS:
+                return cached
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.album_url}")
+            self.metatags = page.metatags
+            
+            metadata = self.get_state_metadata(page.app_state, self.metatags, "album") if self.app_state else None
+            if metadata is None:
+                metadata = self.get_metadata(self.metatags, "album", get_artist=self.get_cached_artist)
+                
+                if self.experimental:
+                    metadata = self.apply_app_state(page, metadata)
             
+            album_cache.set(self.album_url, metadata)
+            self.set_cached("album", album_id, metadata)
             return metadata
         except Exception as e:
+            self.error = e
+            self.set_cached_failure("album", album_id, e)
             self.logger.error(f"Failed to get webpage: {e}")
             return False
         
+    @traced
+    def get_track(self, album: AlbumData) -> SongData:
+        
+        """
+        * Get the metadata of a Deezer song whose album is already known
+        
+            Data Used:
+            - album (AlbumData)
+                DESCRIPTION: The album of the song, used instead of fetching the album page
+                
+            Data Returned:
+            - song_data (SongData)
+                DESCRIPTION: The metadata of the song
+        """
+        
+        cached = self.get_cached("song", self.found_id)
+        if cached is not MISS:
+            return cached
+        
+        try:
+            metadata = self.get_api_lookup("song", self.found_id) if self.backend == "api" else None
+            if metadata is not None:
+                metadata = metadata.replace(album=album)
+                self.set_cached("song", self.found_id, metadata)
+                return metadata
+            
+            page, cached = self.get_revalidated_page("song", self.found_id, self.song_url, self.experimental or self.app_state)
+            if cached is not MISS:
+                return cached.replace(album=album)
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.song_url}")
+            self.metatags = page.metatags
+            
+            metadata = self.get_state_metadata(page.app_state, self.metatags, "song") if self.app_state else None
+            if metadata is None:
+                metadata = self.get_metadata(self.metatags, "song", get_artist=self.get_cached_artist)
+                if self.experimental:
+                    metadata = self.apply_app_state(page, metadata)
+            
+            metadata = metadata.replace(album=album)
+            self.set_cached("song", self.found_id, metadata)
+            return metadata
+        except Exception as e:
+            self.error = e
+            self.set_cached_failure("song", self.found_id, e)
+            self.logger.error(f"Failed to get song: {e}")
+            return False
+    
+    def get_track_list(self) -> tuple:
+        
+        """
+        * Get the metadata and the track URLs of the Deezer album this instance points to
+        
+            Data Returned:
+            - album_data (AlbumData)
+                DESCRIPTION: The metadata of the album
+            - track_urls (list)
+                DESCRIPTION: The URLs of the album's tracks, in album order
+        """
+        
+        self.check_input()
+        data = self.get_api_resource("album", self.get_album_id()) if self.backend == "api" else None
+        if data is not None:
+            return self.use_api_album(data), self.get_api_track_urls(data)
+        
+        page = self.get_page(self.album_url, self.experimental or self.app_state)
+        if not page:
+            raise ConnectionError(f"Could not fetch {self.album_url}")
+        self.metatags = page.metatags
+        self.album_state = page.app_state
+        
+        album_id = self.get_album_id()
+        album = self.get_cached("album", album_id)
+        if album is MISS or album is False:
+            album = album_cache.get(self.album_url)
+        if album is MISS:
+            album = self.get_state_metadata(page.app_state, self.metatags, "album") if self.app_state else None
+            if album is None:
+                album = self.get_metadata(self.metatags, "album", get_artist=self.get_cached_artist)
+                if self.experimental:
+                    album = self.apply_app_state(page, album)
+            album_cache.set(self.album_url, album)
+            self.set_cached("album", album_id, album)
+        return album, self.get_track_urls(self.metatags)
+    
+    def get_state_tracks(self, album: AlbumData) -> list:
+        
+        """
+        * Get the songs listed in the app state of the album page read by get_track_list
+        
+            The app state of an album page holds the metadata of all its songs,
+            so no track page has to be fetched.
+        
+            Data Used:
+            - album (AlbumData)
+                DESCRIPTION: The album of the songs
+                
+            Data Returned:
+            - tracks (list of tuple)
+                DESCRIPTION: The URL and SongData of every song in album order, None without a usable app state
+        """
+        
+        songs = self.album_state.get("SONGS") if isinstance(self.album_state, dict) else None
+        entries = songs.get("data") if isinstance(songs, dict) else None
+        if not entries or not isinstance(entries, list):
+            return None
+        
+        tracks = []
+        for entry in entries:
+            song = self.get_state_metadata({"DATA": entry}, [], "song")
+            if song is None or not entry.get("SNG_ID"):
+                continue
+            song = song.replace(album=album, release_date=first_known(song.release_date, album.release_date))
+            self.set_cached("song", str(entry["SNG_ID"]), song)
+            tracks.append((f"https://www.deezer.com/track/{entry['SNG_ID']}", song))
+        return tracks
+    
+    def check_input(self) -> None:
+        
+        """
+        * Raise the error of an input the constructor couldn't read, so the lookups fail (and log it) like any other
+        """
+        
+        if self.input_error is not None:
+            raise self.input_error
+    
+    def get_album_id(self) -> str:
+        
+        """
+        * Get the ID of the album page this instance points to
+        """
+        
+        return self.album_url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+    
+    def get_cached(self, metadata_type: str, found_id: str):
+        
+        """
+        * Get a lookup from the cache, if this instance has one
+        
+            Data Used:
+            - metadata_type (str)
+                DESCRIPTION: The type of metadata ("song" or "album")
+            - found_id (str)
+                DESCRIPTION: The ID of the song or album
+                
+            Data Returned:
+            - metadata (SongData or AlbumData)
+                DESCRIPTION: The cached metadata, False for a remembered failure, or MISS
+        """
+        
+        if self.cache is None:
+            return MISS
+        cached = self.cache.get(self.PROVIDER, metadata_type, found_id)
+        if isinstance(cached, CachedFailure):
+            self.error = cached
+            self.logger.debug(f"Cached failure for {metadata_type} {found_id}: {cached}")
+            return False
+        return cached
+    
+    def set_cached(self, metadata_type: str, found_id: str, metadata) -> None:
+        
+        """
+        * Store a successful lookup in the cache, if this instance has one
+        """
+        
+        if self.cache is not None:
+            validators, size = self.validators.get((metadata_type, found_id), (None, 0))
+            self.cache.set(self.PROVIDER, metadata_type, found_id, metadata, validators=validators, size=size)
+    
+    def set_cached_song(self, metadata: SongData, album) -> None:
+        
+        """
+        * Store a song looked up with lazy_album=True once its album is known, if this instance has a cache
+        
+            Data Used:
+            - metadata (SongData)
+                DESCRIPTION: The song, without its album
+            - album (AlbumData)
+                DESCRIPTION: The album the LazyAlbum of the song resolved to, False if it couldn't be fetched
+        """
+        
+        if isinstance(album, AlbumData):
+            self.set_cached("song", self.found_id, metadata.replace(album=album))
+    
+    def set_cached_failure(self, metadata_type: str, found_id: str, error: Exception) -> None:
+        
+        """
+        * Remember a lookup whose webpage couldn't be fetched, if this instance has a cache
+        """
+        
+        if self.cache is not None and isinstance(error, ConnectionError) and not isinstance(error, CachedFailure):
+            self.cache.set_failure(self.PROVIDER, metadata_type, found_id, error)
+    
+    def get_cached_artist(self, artist_url: str) -> str:
+        
+        """
+        * Get the name of an artist like get_artist, keeping it in the cache of this instance
+        
+            The name is stored with the validators of the artist page, so once
+            it expires the page is revalidated like songs and albums are.
+        
+            Data Used:
+            - artist_url (str)
+                DESCRIPTION: The URL of the artist page
+                
+            Data Returned:
+            - artist (str)
+                DESCRIPTION: The name of the artist
+        """
+        
+        if self.cache is None:
+            return Deezer.get_artist(artist_url)
+        artist = artist_cache.get(artist_url)
+        if artist is not MISS:
+            return artist
+        
+        with stage("artist"):
+            artist_id = artist_url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+            artist = self.get_cached("artist", artist_id)
+            if artist is MISS or artist is False:
+                page, artist = self.get_revalidated_page("artist", artist_id, artist_url)
+                if artist is MISS:
+                    if not page:
+                        raise ConnectionError(f"Could not fetch {artist_url}")
+                    artist = self.get_artist_name(page.metatags)
+                    self.set_cached("artist", artist_id, artist)
+            artist_cache.set(artist_url, artist)
+            return artist
+    
+    def get_revalidated_page(self, metadata_type: str, found_id: str, url: str, app_state: bool = False) -> tuple:
+        
+        """
+        * Get the webpage of a lookup, revalidating its expired cache entry instead of downloading it again
+        
+            When the cache holds the lookup with the validators of its webpage,
+            the webpage is requested with If-None-Match/If-Modified-Since, and
+            a 304 answer keeps the cached metadata for another TTL.
+        
+            Data Used:
+            - metadata_type (str)
+                DESCRIPTION: The type of metadata ("song", "album" or "artist")
+            - found_id (str)
+                DESCRIPTION: The ID of the song, album or artist
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - app_state (bool)
+                DESCRIPTION: Whether to also decode the Deezer app state script
+                
+            Data Returned:
+            - page (Page)
+                DESCRIPTION: The meta tags (and app state) of the webpage, None if it is unchanged, False if the request failed
+            - cached (SongData, AlbumData or str)
+                DESCRIPTION: The cached metadata if the webpage is unchanged, else MISS
+        """
+        
+        stale = self.cache.get_stale(self.PROVIDER, metadata_type, found_id) if self.cache is not None else MISS
+        resp = self.get_response(url, stop_condition(app_state), conditional_headers(stale[1]) if stale is not MISS else None)
+        if resp is False:
+            return False, MISS
+        if stale is not MISS:
+            self.cache.count_revalidation()
+        if resp.status == 304:
+            self.logger.debug(f"{url} not modified, keeping the cached {metadata_type}")
+            self.cache.refresh(self.PROVIDER, metadata_type, found_id)
+            return None, stale[0]
+        
+        validators = get_validators(resp.headers)
+        if validators:
+            self.validators[(metadata_type, found_id)] = (validators, len(resp.body))
+        return parse_page(resp.body, app_state), MISS
+    
+    def get_api_lookup(self, metadata_type: str, found_id: str):
+        
+        """
+        * Get a song or album from the Deezer API (api backend)
+        
+            Once the API fails, the lookups of every instance using it fall
+            back to scraping the webpages for API_COOLDOWN seconds, without
+            asking the API again.
+        
+            Data Used:
+            - metadata_type (str)
+                DESCRIPTION: The type of metadata ("song" or "album")
+            - found_id (str)
+                DESCRIPTION: The ID of the song or album
+                
+            Data Returned:
+            - metadata (SongData or AlbumData)
+                DESCRIPTION: The metadata, None if the webpage has to be scraped instead
+        """
+        
+        return self.use_api_data(self.get_api_resource(API_RESOURCES[metadata_type], found_id), metadata_type)
+    
+    def get_api_resource(self, resource: str, found_id: str) -> dict:
+        
+        """
+        * Get a resource of the Deezer API unless it is cooling down, see get_api_lookup
+        
+            A lookup that finds no resource falls back to its webpage. When
+            the API itself failed, every lookup of every instance using it
+            falls back for API_COOLDOWN seconds.
+        
+            Data Used:
+            - resource (str)
+                DESCRIPTION: The type of resource ("track" or "album")
+            - found_id (str)
+                DESCRIPTION: The ID of the track or album
+                
+            Data Returned:
+            - data (dict)
+                DESCRIPTION: The decoded resource, None if the webpage has to be scraped instead
+        """
+        
+        if not api_available(self.api_url):
+            return None
+        return self.check_api_data(*self.get_api_data(resource, found_id), resource, found_id)
+    
+    def check_api_data(self, data: dict, error: str, resource: str, found_id: str) -> dict:
+        
+        """
+        * Start the cooldown of the API if it failed, see get_api_resource
+        """
+        
+        if error == API_DOWN:
+            set_api_failed(self.api_url)
+            self.logger.info(f"Deezer API failed on {resource} {found_id}, using the webpages for {API_COOLDOWN:g}s")
+        elif error is not None:
+            self.logger.info(f"Deezer API has no {resource} {found_id}, falling back to the webpage")
+        return data
+    
+    def use_api_data(self, data: dict, metadata_type: str):
+        
+        """
+        * Turn an API resource into metadata, see get_api_lookup
+        """
+        
+        if data is None:
+            return None
+        album = data.get("album") if metadata_type == "song" else None
+        if isinstance(album, dict) and album.get("id"):
+            self.album_url = self.get_album_page_url(album["id"])
+        return self.get_api_metadata(data, metadata_type)
+    
+    def use_api_album(self, data: dict) -> AlbumData:
+        
+        """
+        * Get the metadata of the album resource read by get_track_list and cache it
+        """
+        
+        album = self.get_api_metadata(data, "album")
+        album_cache.set(self.album_url, album)
+        self.set_cached("album", self.get_album_id(), album)
+        return album
+    
+    def use_state_album(self, album: AlbumData) -> None:
+        
+        """
+        * Cache the album read along with a song from the app state, like use_api_album
+        
+            An album that is already cached is kept, it may come from the album's own page.
+        """
+        
+        if not self.get_album_id().isdigit() or album_cache.get(self.album_url) is not MISS:
+            return
+        album_cache.set(self.album_url, album)
+        self.set_cached("album", self.get_album_id(), album)
+    
+    def get_api_resource_url(self, resource: str, found_id: str) -> str:
+        return f"{self.api_url.rstrip('/')}/{resource}/{found_id}"
+    
+    def get_api_data(self, resource: str, found_id: str) -> tuple:
+        
+        """
+        * Get a resource of the Deezer API
+        
+            Data Used:
+            - resource (str)
+                DESCRIPTION: The type of resource ("track" or "album")
+            - found_id (str)
+                DESCRIPTION: The ID of the track or album
+                
+            Data Returned:
+            - data (dict)
+                DESCRIPTION: The decoded resource, None if the request failed or the API answered with an error
+            - error (str)
+                DESCRIPTION: None, API_DOWN or API_NOT_FOUND, see read_api_data
+        """
+        
+        url = self.get_api_resource_url(resource, found_id)
+        try:
+            resp = get_session().get(url)
+        except urllib.error.HTTPError as e:
+            logging.error(f"got HTTP error {e.code} with {url}")
+            return None, self.get_api_http_error(e.code)
+        except urllib.error.URLError:
+            logging.error("got error urllib.error.URLError with " + url)
+            return None, API_DOWN
+        return self.read_api_data(resp.body, url)
+    
+    @classmethod
+    def get_songs(cls, urls, logger: logging.Logger, max_workers: int = DEFAULT_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+        
+        """
+        * Get the metadata of many Deezer songs on a bounded thread pool
+        
+            Data Used:
+            - urls (iterable)
+                DESCRIPTION: The Deezer URLs or IDs of the songs
+            - max_workers (int)
+                DESCRIPTION: The number of songs fetched at the same time
+            - dedupe (int)
+                DESCRIPTION: How many recent inputs are remembered so duplicates are fetched once, 0 to fetch every input
+            - options (dict)
+                DESCRIPTION: Extra arguments for every Deezer instance (e.g. experimental, cache, app_state)
+                
+            Data Returned:
+            - results (list of BatchResult)
+                DESCRIPTION: One result per URL in input order, holding either the data or the error
+        """
+        
+        return run_batch(cls, "get_song", urls, logger, max_workers, dedupe, **options)
+    
+    @classmethod
+    def get_albums(cls, urls, logger: logging.Logger, max_workers: int = DEFAULT_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+        
+        """
+        * Get the metadata of many Deezer albums on a bounded thread pool
+        
+            Data Used:
+            - urls (iterable)
+                DESCRIPTION: The Deezer URLs or IDs of the albums
+            - max_workers (int)
+                DESCRIPTION: The number of albums fetched at the same time
+            - dedupe (int)
+                DESCRIPTION: How many recent inputs are remembered so duplicates are fetched once, 0 to fetch every input
+            - options (dict)
+                DESCRIPTION: Extra arguments for every Deezer instance (e.g. experimental, cache, app_state)
+                
+            Data Returned:
+            - results (list of BatchResult)
+                DESCRIPTION: One result per URL in input order, holding either the data or the error
+        """
+        
+        return run_batch(cls, "get_album", urls, logger, max_workers, dedupe, **options)
+    
+    @classmethod
+    def get_album_tracks(cls, album_url: str, logger: logging.Logger, max_workers: int = DEFAULT_WORKERS, **options) -> list:
+        
+        """
+        * Get the metadata of every song of a Deezer album
+        
+            The album page (and its artist page) is fetched once and shared by
+            every track. In app state mode the songs are read from the album
+            page itself, otherwise only the track pages are fetched on top of
+            it, on a bounded thread pool.
+        
+            Data Used:
+            - album_url (str)
+                DESCRIPTION: The Deezer URL or ID of the album
+            - max_workers (int)
+                DESCRIPTION: The number of track pages fetched at the same time
+            - options (dict)
+                DESCRIPTION: Extra arguments for every Deezer instance (e.g. experimental, cache, app_state)
+                
+            Data Returned:
+            - results (list of BatchResult)
+                DESCRIPTION: One result per track in album order, or False if the album page couldn't be fetched
+        """
+        
+        instance = cls(album_url, logger, **options)
+        try:
+            album, track_urls = instance.get_track_list()
+        except Exception as e:
+            instance.error = e
+            logger.error(f"Failed to get album tracks: {e}")
+            return False
+        
+        tracks = instance.get_state_tracks(album) if instance.app_state else None
+        if tracks:
+            return [BatchResult(url, data=song) for url, song in tracks]
+        return run_lookups(cls, "get_track", track_urls, logger, max_workers, options, (album,))
+    
     @staticmethod
-    def get_webpage(song_url) -> BeautifulSoup:
+    def get_webpage(song_url) -> "BeautifulSoup":
         
         """
         * Get the HTML of a webpage
@@ -122,8 +714,79 @@ class Deezer:
                 DESCRIPTION: The HTML of the webpage
         """
         
+        if BeautifulSoup is None:
+            raise ImportError("get_webpage needs beautifulsoup4, install it with: pip install beautifulsoup4")
+        
+        document = Deezer.get_html(song_url)
+        if document is False:
+            return False
+        return BeautifulSoup(document, "html.parser")
+    
+    @staticmethod
+    def get_page(url: str, app_state: bool = False) -> Page:
+        
+        """
+        * Get the meta tags of a webpage without building a full HTML tree
+        
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - app_state (bool)
+                DESCRIPTION: Whether to also decode the Deezer app state script
+                
+            Data Returned:
+            - page (Page)
+                DESCRIPTION: The meta tags (and app state) of the webpage
+        """
+        
+        document = Deezer.get_html(url, stop_condition(app_state))
+        if document is False:
+            return False
+        return parse_page(document, app_state)
+    
+    @staticmethod
+    def get_html(song_url: str, until=None) -> bytes:
+        
+        """
+        * Download the raw HTML of a webpage
+        
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - until (callable)
+                DESCRIPTION: Stops the download once until(html read so far) is true, see Session.get
+                
+            Data Returned:
+            - html (bytes)
+                DESCRIPTION: The decoded response body, or False if the request failed
+        """
+        
+        resp = Deezer.get_response(song_url, until)
+        if resp is False:
+            return False
+        return resp.body
+    
+    @staticmethod
+    def get_response(song_url: str, until=None, headers: dict = None):
+        
+        """
+        * Send a GET request for a webpage
+        
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - until (callable)
+                DESCRIPTION: Stops the download once until(html read so far) is true, see Session.get
+            - headers (dict)
+                DESCRIPTION: Extra headers, e.g. the conditional headers of a revalidation
+                
+            Data Returned:
+            - response (Response)
+                DESCRIPTION: The 200 response (or the 304 answer to a conditional request), or False if the request failed
+        """
+        
         try:
-            resp = urllib.request.urlopen(song_url)
+            resp = get_session().get(song_url, headers, until)
         except urllib.error.HTTPError:
             logging.error("got error urllib.error.HTTPError with " + song_url)
             return False
@@ -131,14 +794,308 @@ class Deezer:
             logging.error("got error urllib.error.URLError with " + song_url)
             return False
 
-        if resp.code != 200:
+        if resp.status == 304 and headers:
+            return resp
+        if resp.status != 200:
             logging.error("got httperror 200 with " + song_url)
             return False
         else:
-            return BeautifulSoup(resp.read(), "html.parser")
+            return resp
             
     @staticmethod
-    def get_metadata(found_tags: list, metadata_type: str = "song") -> dict:
+    def apply_app_state(page: Page, metadata):
+        
+        """
+        * Backfill metadata from the app state of a Deezer page (experimental)
+        """
+        
+        json_data = page.app_state
+        if json_data and metadata.release_date is UNKNOWN:
+            metadata = metadata.replace(release_date=json_data['DATA']['PHYSICAL_RELEASE_DATE'])
+        return metadata
+    
+    @staticmethod
+    @timed("extract")
+    def get_state_metadata(app_state: dict, found_tags: list, metadata_type: str = "song"):
+        
+        """
+        * Get the metadata of a Deezer song or album from the app state of its page
+        
+            Everything is read from the app state, the meta tags only fill
+            what it lacks. Unlike get_metadata, no artist or album page is
+            ever fetched.
+        
+            Data Used:
+            - app_state (dict)
+                DESCRIPTION: The decoded window.__DZR_APP_STATE__ of the page
+            - found_tags (list)
+                DESCRIPTION: The metadata tags found on the webpage
+            - metadata_type (str)
+                DESCRIPTION: The type of metadata to get
+                
+            Data Returned:
+            - song_data (SongData)
+                DESCRIPTION: The metadata of the song, with its album
+            - album_data (AlbumData)
+                DESCRIPTION: The metadata of the album
+            - None
+                DESCRIPTION: When the page has no usable app state
+        """
+        
+        data = app_state.get("DATA") if isinstance(app_state, dict) else None
+        if not isinstance(data, dict):
+            return None
+        
+        fallback = Deezer.get_metadata(found_tags, metadata_type, get_artist=lambda artist_url: None)
+        artwork_url = first_known(DZ_COVER_URL.format(data["ALB_PICTURE"]) if data.get("ALB_PICTURE") else None, fallback.artwork_url)
+        release_date = first_known(data.get("PHYSICAL_RELEASE_DATE"), data.get("DIGITAL_RELEASE_DATE"), data.get("ORIGINAL_RELEASE_DATE"), fallback.release_date)
+        artist = first_known(data.get("ART_NAME"), fallback.artist)
+        
+        if metadata_type == "album":
+            return AlbumData(
+                artwork_url=artwork_url,
+                title=first_known(data.get("ALB_TITLE"), fallback.title),
+                artist=artist,
+                description=fallback.description,
+                release_date=release_date,
+            )
+        
+        title = data.get("SNG_TITLE")
+        if title and data.get("VERSION"):
+            title = f"{title} {data['VERSION']}"
+        duration = data.get("DURATION")
+        
+        return SongData(
+            artwork_url=artwork_url,
+            duration=int(duration) if duration else fallback.duration,
+            genre=fallback.genre,
+            album=AlbumData(
+                artwork_url=artwork_url,
+                title=first_known(data.get("ALB_TITLE")),
+                artist=artist,
+                release_date=release_date,
+            ),
+            title=first_known(title, fallback.title),
+            artist=artist,
+            release_date=release_date,
+            isrc=first_known(data.get("ISRC")),
+        )
+    
+    @staticmethod
+    def read_api_data(document: bytes, url: str) -> dict:
+        
+        """
+        * Decode a response of the Deezer API
+        
+            The API answers most errors (unknown ID, quota exceeded) with a
+            200 and an "error" object instead of the resource.
+        
+            Data Returned:
+            - data (dict)
+                DESCRIPTION: The resource, None if the response is not one
+            - error (str)
+                DESCRIPTION: None for a resource, API_DOWN when the API can't answer at
+                all (invalid JSON, quota exceeded), API_NOT_FOUND for other errors
+                (no such track or album)
+        """
+        
+        try:
+            with stage("parse"):
+                data = json.loads(document)
+        except ValueError:
+            logging.error("got invalid JSON with " + url)
+            return None, API_DOWN
+        if not isinstance(data, dict) or "error" in data:
+            error = data.get("error") if isinstance(data, dict) else None
+            logging.error(f"got API error {error} with {url}")
+            code = error.get("code") if isinstance(error, dict) else None
+            return None, API_DOWN if code in API_QUOTA_ERRORS else API_NOT_FOUND
+        return data, None
+    
+    @staticmethod
+    def get_api_http_error(status: int) -> str:
+        
+        """
+        * Tell whether an HTTP error of the API means it is down (5xx, 429) or the resource is missing
+        """
+        
+        return API_DOWN if status == 429 or status >= 500 else API_NOT_FOUND
+    
+    @staticmethod
+    @timed("extract")
+    def get_api_metadata(data: dict, metadata_type: str = "song"):
+        
+        """
+        * Get the metadata of a Deezer song or album from its API resource
+        
+            A track resource embeds its album and artist, so a song needs no
+            other request. Albums have no description in the API.
+        
+            Data Used:
+            - data (dict)
+                DESCRIPTION: The decoded track or album resource
+            - metadata_type (str)
+                DESCRIPTION: The type of metadata to get
+                
+            Data Returned:
+            - song_data (SongData)
+                DESCRIPTION: The metadata of the song, with its album
+            - album_data (AlbumData)
+                DESCRIPTION: The metadata of the album
+        """
+        
+        album = data.get("album") if metadata_type == "song" else data
+        album = album if isinstance(album, dict) else {}
+        artist = data.get("artist") if isinstance(data.get("artist"), dict) else {}
+        artwork_url = first_known(DZ_COVER_URL.format(album["md5_image"]) if album.get("md5_image") else None, album.get("cover_big"))
+        release_date = first_known(data.get("release_date"), album.get("release_date"))
+        
+        if metadata_type == "album":
+            return AlbumData(
+                artwork_url=artwork_url,
+                title=first_known(data.get("title")),
+                artist=first_known(artist.get("name")),
+                release_date=release_date,
+            )
+        
+        duration = data.get("duration")
+        return SongData(
+            artwork_url=artwork_url,
+            duration=int(duration) if duration else UNKNOWN,
+            album=AlbumData(
+                artwork_url=artwork_url,
+                title=first_known(album.get("title")),
+                artist=first_known(artist.get("name")),
+                release_date=first_known(album.get("release_date"), release_date),
+            ),
+            title=first_known(data.get("title")),
+            artist=first_known(artist.get("name")),
+            release_date=release_date,
+            isrc=first_known(data.get("isrc")),
+        )
+    
+    @staticmethod
+    def get_api_track_urls(data: dict) -> list:
+        
+        """
+        * Get the URLs of the tracks listed in an album resource of the API
+        """
+        
+        tracks = data.get("tracks")
+        entries = tracks.get("data") if isinstance(tracks, dict) else None
+        return [f"https://www.deezer.com/track/{entry['id']}" for entry in entries or () if isinstance(entry, dict) and entry.get("id")]
+    
+    @staticmethod
+    def get_state_album_url(app_state: dict) -> str:
+        
+        """
+        * Get the URL of the album of a song from the app state of its page
+        """
+        
+        return Deezer.get_album_page_url(app_state['DATA'].get('ALB_ID'))
+    
+    @staticmethod
+    def get_album_page_url(album) -> str:
+        
+        """
+        * Get the URL of an album page from any URL or ID of the album
+        
+            Every backend builds album URLs with it, so they share album_cache entries.
+        
+            Data Used:
+            - album (str or int)
+                DESCRIPTION: A Deezer album URL or ID
+                
+            Data Returned:
+            - album_url (str)
+                DESCRIPTION: The album URL, album itself if it isn't a Deezer album
+        """
+        
+        key = normalize_for(str(album), Deezer.PROVIDER, "album")
+        if key is None or key[1] != "album":
+            return str(album)
+        return DZ_ALBUM_URL.format(key[2])
+    
+    @staticmethod
+    @timed("artist")
+    def get_artist(artist_url: str) -> str:
+        
+        """
+        * Get the name of a Deezer artist from the artist page
+        
+            Data Used:
+            - artist_url (str)
+                DESCRIPTION: The URL of the artist page
+                
+            Data Returned:
+            - artist (str)
+                DESCRIPTION: The name of the artist
+        """
+        
+        artist = artist_cache.get(artist_url)
+        if artist is not MISS:
+            return artist
+        
+        page = Deezer.get_page(artist_url)
+        if not page:
+            raise ConnectionError(f"Could not fetch {artist_url}")
+        artist = Deezer.get_artist_name(page.metatags)
+        artist_cache.set(artist_url, artist)
+        return artist
+    
+    @staticmethod
+    def get_artist_name(found_tags: list) -> str:
+        
+        """
+        * Get the name of an artist from the tags of the artist page
+        """
+        
+        artist = None
+        for tag in found_tags:
+            if tag.get("property") == "og:title":
+                artist = tag.get("content")
+        return artist
+    
+    @staticmethod
+    def get_artist_url(found_tags: list) -> str:
+        
+        """
+        * Get the URL of the artist page linked from a song or album page
+        """
+        
+        for tag in found_tags:
+            if tag.get("property") == "music:musician":
+                return tag.get("content")
+        return None
+    
+    @staticmethod
+    def get_album_url(found_tags: list) -> str:
+        
+        """
+        * Get the URL of the album page linked from a song page
+        """
+        
+        for tag in found_tags:
+            if tag.get("property") == "music:album:url":
+                return tag.get("content")
+        return None
+    
+    @staticmethod
+    def get_track_urls(found_tags: list) -> list:
+        
+        """
+        * Get the URLs of the tracks listed on an album page
+        """
+        
+        track_urls = []
+        for tag in found_tags:
+            if tag.get("property") == "music:song" and tag.get("content") and tag.get("content") not in track_urls:
+                track_urls.append(tag.get("content"))
+        return track_urls
+    
+    @staticmethod
+    @timed("extract")
+    def get_metadata(found_tags: list, metadata_type: str = "song", get_artist=None) -> SongData:
         
         """
         * Get the metadata of a Spotify song
@@ -148,16 +1105,20 @@ class Deezer:
                 DESCRIPTION: The metadata tags found on the webpage
             - metadata_type (str)
                 DESCRIPTION: The type of metadata to get
+            - get_artist (callable)
+                DESCRIPTION: Resolves an artist URL to its name, defaults to fetching the artist page
                 
             Data Returned:
-            - song_data (dict)
+            - song_data (SongData)
                 DESCRIPTION: The metadata of the song
-            - album_data (dict)
+            - album_data (AlbumData)
                 DESCRIPTION: The metadata of the album
         """
         
+        get_artist = get_artist or Deezer.get_artist
+        
         if metadata_type == "song":
-            found_data = SongData()
+            found_data = {}
             
             """
             * SongMetadata Tags:
@@ -174,32 +1135,28 @@ class Deezer:
             for tag in found_tags:
                 # artwork_url
                 if tag.get("property") == "og:image":
-                    found_data.artwork_url = tag.get("content")
+                    found_data["artwork_url"] = tag.get("content")
                 # duration
                 elif tag.get("property") == "music:duration":
-                    found_data.duration = int(tag.get("content"))
+                    found_data["duration"] = int(tag.get("content"))
                 # genre
                 elif tag.get("name") == "music:genre":
-                    found_data.genre = tag.get("content")
+                    found_data["genre"] = tag.get("content")
                 # album
                 elif tag.get("property") == "music:album:url":
-                    found_data.album = tag.get("content")
+                    found_data["album"] = tag.get("content")
                 # artist
                 elif tag.get("property") == "music:musician":
-                    soup = Deezer.get_webpage(tag.get("content"))
-                    tags = soup.findAll("meta")
-                    for tag in tags:
-                        if tag.get("property") == "og:title":
-                            found_data.artist = tag.get("content")
+                    found_data["artist"] = get_artist(tag.get("content"))
                 # release_date
                 elif tag.get("name") == "music:release_date":
-                    found_data.release_date = tag.get("content")
+                    found_data["release_date"] = tag.get("content")
                 # title
                 elif tag.get("property") == "og:title":
-                    found_data.title = tag.get("content")
+                    found_data["title"] = tag.get("content")
             
         elif metadata_type == "album":
-            found_data = AlbumData()
+            found_data = {}
             
             """
             * AlbumMetadata Tags:
@@ -214,66 +1171,402 @@ class Deezer:
             for tag in found_tags:
                 # artwork_url
                 if tag.get("property") == "og:image":
-                    found_data.artwork_url = tag.get("content")
+                    found_data["artwork_url"] = tag.get("content")
                 # title
                 elif tag.get("property") == "og:title":
-                    found_data.title = tag.get("content")
+                    found_data["title"] = tag.get("content")
                 # artist
                 elif tag.get("property") == "music:musician":
-                    soup = Deezer.get_webpage(tag.get("content"))
-                    tags = soup.findAll("meta")
-                    for tag in tags:
-                        if tag.get("property") == "og:title":
-                            found_data.artist = tag.get("content")
+                    found_data["artist"] = get_artist(tag.get("content"))
                 # description
                 elif tag.get("property") == "og:description":
-                    found_data.description = tag.get("content")
+                    found_data["description"] = tag.get("content")
                 # release_date
                 elif tag.get("name") == "music:release_date":
-                    found_data.release_date = tag.get("content")
+                    found_data["release_date"] = tag.get("content")
                     
-        # Refill NoneType values with "Unknown"
-        for key, value in found_data.__dict__.items():
-            if value == None:
-                found_data.__dict__[key] = "Unknown"
+        # Leave NoneType values out, they are filled with UNKNOWN
+        found_data = {key: value for key, value in found_data.items() if value is not None}
+        
+        if metadata_type == "song":
+            return SongData(**found_data)
+        return AlbumData(**found_data)
+    
+    
+class AsyncDeezer(Deezer):
+    
+    """
+    * asyncio version of Deezer
+    
+        get_song, get_album, get_songs and get_albums are awaitable. Requests
+        go through an AsyncClient, whose semaphore limits how many of them are
+        in flight across every instance sharing it. Expired cache entries
+        are downloaded again, not revalidated: AsyncClient sends no
+        conditional headers.
+    """
+    
+    def __init__(self, url: str, logger: logging.Logger, experimental: bool = False, client: AsyncClient = None, cache: MetadataCache = None, app_state: bool = False,
+                 backend: str = "html", api_url: str = DZ_API_URL):
+        
+        super().__init__(url, logger, experimental, cache, app_state, backend=backend, api_url=api_url)
+        self.client = client
+        
+    @traced
+    async def get_song(self) -> SongData:
+        
+        """
+        * Get the metadata of a Deezer song without blocking the event loop
+        """
+        
+        cached = self.get_cached("song", self.found_id)
+        if cached is not MISS:
+            return cached
+        
+        try:
+            self.check_input()
+            metadata = await self.get_api_lookup("song", self.found_id) if self.backend == "api" else None
+            if metadata is not None:
+                self.set_cached("song", self.found_id, metadata)
+                return metadata
+            
+            page = await self.get_page(self.song_url, self.experimental or self.app_state)
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.song_url}")
+            song_tags = page.metatags
+            
+            metadata = self.get_state_metadata(page.app_state, song_tags, "song") if self.app_state else None
+            if metadata is not None:
+                self.album_url = self.get_state_album_url(page.app_state)
+                self.use_state_album(metadata.album)
+                self.set_cached("song", self.found_id, metadata)
+                return metadata
+            
+            self.album_url = self.get_album_page_url(self.get_album_url(song_tags))
+            
+            # Resolving the album also resolves the artist of the song,
+            # unless the album came from the cache
+            artists = {}
+            artist_url = self.get_artist_url(song_tags)
+            album = await self._get_cached_album(artists, artist_url)
+            if artist_url and artist_url not in artists:
+                artists[artist_url] = await self.get_artist(artist_url)
+            metadata = self.get_metadata(song_tags, "song", get_artist=artists.get)
+            
+            if self.experimental:
+                metadata = self.apply_app_state(page, metadata)
+            
+            metadata = metadata.replace(album=album)
+            self.set_cached("song", self.found_id, metadata)
+            return metadata
+        except Exception as e:
+            self.error = e
+            self.set_cached_failure("song", self.found_id, e)
+            self.logger.error(f"Failed to get song: {e}")
+            return False
+    
+    @traced
+    async def get_album(self) -> AlbumData:
+        
+        """
+        * Get the metadata of a Deezer album without blocking the event loop
+        """
+        
+        album_id = self.get_album_id()
+        cached = self.get_cached("album", album_id)
+        if cached is not MISS:
+            return cached
+        
+        try:
+            self.check_input()
+            metadata = await self._get_album({})
+            self.set_cached("album", album_id, metadata)
+            return metadata
+        except Exception as e:
+            self.error = e
+            self.set_cached_failure("album", album_id, e)
+            self.logger.error(f"Failed to get webpage: {e}")
+            return False
+    
+    @traced
+    async def get_track(self, album: AlbumData) -> SongData:
+        
+        """
+        * Get the metadata of a Deezer song whose album is already known without blocking the event loop
+        """
+        
+        cached = self.get_cached("song", self.found_id)
+        if cached is not MISS:
+            return cached
+        
+        try:
+            metadata = await self.get_api_lookup("song", self.found_id) if self.backend == "api" else None
+            if metadata is not None:
+                metadata = metadata.replace(album=album)
+                self.set_cached("song", self.found_id, metadata)
+                return metadata
+            
+            page = await self.get_page(self.song_url, self.experimental or self.app_state)
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.song_url}")
+            song_tags = page.metatags
+            
+            metadata = self.get_state_metadata(page.app_state, song_tags, "song") if self.app_state else None
+            if metadata is None:
+                artists = {}
+                artist_url = self.get_artist_url(song_tags)
+                if artist_url:
+                    artists[artist_url] = await self.get_artist(artist_url)
+                metadata = self.get_metadata(song_tags, "song", get_artist=artists.get)
+                if self.experimental:
+                    metadata = self.apply_app_state(page, metadata)
+            
+            metadata = metadata.replace(album=album)
+            self.set_cached("song", self.found_id, metadata)
+            return metadata
+        except Exception as e:
+            self.error = e
+            self.set_cached_failure("song", self.found_id, e)
+            self.logger.error(f"Failed to get song: {e}")
+            return False
+    
+    async def get_track_list(self) -> tuple:
+        
+        """
+        * Get the metadata and the track URLs of the Deezer album this instance points to without blocking the event loop
+        """
+        
+        self.check_input()
+        data = await self.get_api_resource("album", self.get_album_id()) if self.backend == "api" else None
+        if data is not None:
+            return self.use_api_album(data), self.get_api_track_urls(data)
+        
+        page = await self.get_page(self.album_url, self.experimental or self.app_state)
+        if not page:
+            raise ConnectionError(f"Could not fetch {self.album_url}")
+        self.metatags = page.metatags
+        self.album_state = page.app_state
+        
+        album_id = self.get_album_id()
+        album = self.get_cached("album", album_id)
+        if album is MISS or album is False:
+            album = album_cache.get(self.album_url)
+        if album is MISS:
+            album = self.get_state_metadata(page.app_state, self.metatags, "album") if self.app_state else None
+            if album is None:
+                artists = {}
+                artist_url = self.get_artist_url(self.metatags)
+                if artist_url:
+                    artists[artist_url] = await self.get_artist(artist_url)
+                album = self.get_metadata(self.metatags, "album", get_artist=artists.get)
+                if self.experimental:
+                    album = self.apply_app_state(page, album)
+            album_cache.set(self.album_url, album)
+            self.set_cached("album", album_id, album)
+        return album, self.get_track_urls(self.metatags)
+    
+    async def _get_cached_album(self, artists: dict, artist_url: str = None) -> AlbumData:
+        
+        album_id = self.get_album_id()
+        album = self.get_cached("album", album_id)
+        if album is False:
+            raise self.error
+        if album is MISS:
+            album = await self._get_album(artists, artist_url)
+            self.set_cached("album", album_id, album)
+        return album
+    
+    async def _get_album(self, artists: dict, artist_url: str = None) -> AlbumData:
+        
+        album = album_cache.get(self.album_url)
+        if album is not MISS:
+            return album
+        
+        album = await self.get_api_lookup("album", self.get_album_id()) if self.backend == "api" else None
+        if album is not None:
+            album_cache.set(self.album_url, album)
+            return album
+        
+        if artist_url and artist_url not in artists:
+            artist = artist_cache.get(artist_url)
+            if artist is not MISS:
+                artists[artist_url] = artist
+        
+        # The artist page of the song is fetched alongside the album page,
+        # it is usually the same artist as the album one
+        pages = [self.get_page(self.album_url, self.experimental or self.app_state)]
+        if artist_url and artist_url not in artists:
+            pages.append(self.get_page(artist_url))
+        page, *artist_page = await asyncio.gather(*pages)
+        if not page:
+            raise ConnectionError(f"Could not fetch {self.album_url}")
+        if artist_page:
+            if not artist_page[0]:
+                raise ConnectionError(f"Could not fetch {artist_url}")
+            artists[artist_url] = self.get_artist_name(artist_page[0].metatags)
+            artist_cache.set(artist_url, artists[artist_url])
+        
+        self.metatags = page.metatags
+        metadata = self.get_state_metadata(page.app_state, self.metatags, "album") if self.app_state else None
+        if metadata is not None:
+            album_cache.set(self.album_url, metadata)
+            return metadata
+        
+        album_artist_url = self.get_artist_url(self.metatags)
+        if album_artist_url and album_artist_url not in artists:
+            artists[album_artist_url] = await self.get_artist(album_artist_url)
+        metadata = self.get_metadata(self.metatags, "album", get_artist=artists.get)
+        
+        if self.experimental:
+            metadata = self.apply_app_state(page, metadata)
+        album_cache.set(self.album_url, metadata)
+        return metadata
+    
+    async def get_api_lookup(self, metadata_type: str, found_id: str):
+        
+        """
+        * Get a song or album from the Deezer API without blocking the event loop, see Deezer.get_api_lookup
+        """
+        
+        return self.use_api_data(await self.get_api_resource(API_RESOURCES[metadata_type], found_id), metadata_type)
+    
+    async def get_api_resource(self, resource: str, found_id: str) -> dict:
+        
+        """
+        * Get a resource of the Deezer API unless it is cooling down without blocking the event loop, see Deezer.get_api_resource
+        """
+        
+        if not api_available(self.api_url):
+            return None
+        return self.check_api_data(*await self.get_api_data(resource, found_id), resource, found_id)
+    
+    async def get_api_data(self, resource: str, found_id: str) -> tuple:
+        
+        """
+        * Get a resource of the Deezer API through the asyncio client, see Deezer.get_api_data
+        """
+        
+        url = self.get_api_resource_url(resource, found_id)
+        client = self.client or get_client()
+        try:
+            response = await client.get(url)
+        except urllib.error.HTTPError as e:
+            logging.error(f"got HTTP error {e.code} with {url}")
+            return None, self.get_api_http_error(e.code)
+        except (urllib.error.URLError, OSError, asyncio.TimeoutError):
+            logging.error("got error urllib.error.URLError with " + url)
+            return None, API_DOWN
+        
+        return self.read_api_data(response.body, url)
+    
+    @timed("artist")
+    async def get_artist(self, artist_url: str) -> str:
+        
+        """
+        * Get the name of a Deezer artist from the artist page without blocking the event loop
+        """
+        
+        artist = artist_cache.get(artist_url)
+        if artist is not MISS:
+            return artist
+        
+        page = await self.get_page(artist_url)
+        if not page:
+            raise ConnectionError(f"Could not fetch {artist_url}")
+        artist = self.get_artist_name(page.metatags)
+        artist_cache.set(artist_url, artist)
+        return artist
+    
+    async def get_page(self, url: str, app_state: bool = False) -> Page:
+        
+        """
+        * Get the meta tags of a webpage through the asyncio client
+        
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - app_state (bool)
+                DESCRIPTION: Whether to also decode the Deezer app state script
                 
-        return found_data
-    
-    
-class SongData:
-    
-    artwork_url: str
-    duration: int
-    genre: str
-    album: str
-    title: str
-    artist: str
-    release_date: str
-    
-    def __init__(self):
-        self.artwork_url = None
-        self.duration = None
-        self.genre = None
-        self.album = None
-        self.title = None
-        self.artist = None
-        self.release_date = None
-    
-class AlbumData:
-    
-    artwork_url: str
-    title: str
-    artist: str
-    description: str
-    release_date: str
-    
-    def __init__(self):
-        self.artwork_url = None
-        self.title = None
-        self.artist = None
-        self.description = None
-        self.release_date = None
+            Data Returned:
+            - page (Page)
+                DESCRIPTION: The meta tags (and app state) of the webpage
+        """
         
+        client = self.client or get_client()
+        try:
+            response = await client.get(url, stop_condition(app_state))
+        except urllib.error.HTTPError:
+            logging.error("got error urllib.error.HTTPError with " + url)
+            return False
+        except (urllib.error.URLError, OSError, asyncio.TimeoutError):
+            logging.error("got error urllib.error.URLError with " + url)
+            return False
+        
+        return parse_page(response.body, app_state)
+    
+    @classmethod
+    async def get_songs(cls, urls, logger: logging.Logger, max_workers: int = DEFAULT_ASYNC_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+        
+        """
+        * Get the metadata of many Deezer songs concurrently
+        
+            Data Used:
+            - urls (iterable)
+                DESCRIPTION: The Deezer URLs or IDs of the songs
+            - max_workers (int)
+                DESCRIPTION: Half the number of songs started ahead of the one awaited, see batch.async_iter_batch
+            - dedupe (int)
+                DESCRIPTION: How many recent inputs are remembered so duplicates are fetched once, 0 to fetch every input
+            - options (dict)
+                DESCRIPTION: Extra arguments for every instance (e.g. client, experimental, cache, app_state)
+                
+            Data Returned:
+            - results (list of BatchResult)
+                DESCRIPTION: One result per URL in input order, holding either the data or the error
+        """
+        
+        return await async_run_batch(cls, "get_song", urls, logger, max_workers, dedupe, **options)
+    
+    @classmethod
+    async def get_albums(cls, urls, logger: logging.Logger, max_workers: int = DEFAULT_ASYNC_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+        
+        """
+        * Get the metadata of many Deezer albums concurrently
+        """
+        
+        return await async_run_batch(cls, "get_album", urls, logger, max_workers, dedupe, **options)
+    
+    @classmethod
+    async def get_album_tracks(cls, album_url: str, logger: logging.Logger, **options) -> list:
+        
+        """
+        * Get the metadata of every song of a Deezer album concurrently, see Deezer.get_album_tracks
+        """
+        
+        instance = cls(album_url, logger, **options)
+        try:
+            album, track_urls = await instance.get_track_list()
+        except Exception as e:
+            instance.error = e
+            logger.error(f"Failed to get album tracks: {e}")
+            return False
+        
+        tracks = instance.get_state_tracks(album) if instance.app_state else None
+        if tracks:
+            return [BatchResult(url, data=song) for url, song in tracks]
+        return await asyncio.gather(*(async_lookup(cls, "get_track", url, logger, options, (album,)) for url in track_urls))
+
+def first_known(*values):
+    
+    """
+    * Get the first value that is neither None, empty nor UNKNOWN
+    """
+    
+    for value in values:
+        if value:
+            return value
+    return UNKNOWN
+
 if __name__ == "__main__":
         
     logger = logging.getLogger("Deezer")
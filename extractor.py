@@ -0,0 +1,237 @@
+import re
+import json
+import html
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+from metrics import timed
+
+ENGINES = ("fast", "bs4")
+APP_STATE_MARKER = b"window.__DZR_APP_STATE__"
+
+HEAD_END_REGEX = re.compile(rb"</head\s*>", re.IGNORECASE)
+META_REGEX = re.compile(rb"""<meta\b((?:[^>"']|"[^"]*"|'[^']*')*)>""", re.IGNORECASE)
+ATTR_REGEX = re.compile(rb"""([^\s"'>/=]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+
+# Only these attributes are ever read from a meta tag
+META_ATTRS = frozenset(("property", "name", "content"))
+
+_engine = "fast"
+_streaming = False
+
+class Page:
+
+    metatags: list
+    app_state: dict
+
+    def __init__(self, metatags: list, app_state: dict = None):
+        self.metatags = metatags
+        self.app_state = app_state
+
+def set_engine(engine: str) -> None:
+
+    """
+    * Choose the engine used by parse_page
+
+        Data Used:
+        - engine (str)
+            DESCRIPTION: "fast" for the built-in meta tag scanner, "bs4" for BeautifulSoup
+    """
+
+    global _engine
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if engine == "bs4" and BeautifulSoup is None:
+        raise ImportError("The bs4 engine needs beautifulsoup4, install it with: pip install beautifulsoup4")
+    _engine = engine
+
+def get_engine() -> str:
+    return _engine
+
+def set_streaming(enabled: bool) -> None:
+
+    """
+    * Choose whether get_page stops downloading pages once their meta tags were read
+
+        When enabled, pages are read in chunks and the connection is closed
+        right after </head> (or, when the Deezer app state is needed, after
+        its script), instead of downloading the whole document. This saves
+        bandwidth and memory per request, but the closed connection can't be
+        kept alive for the next request.
+
+        Data Used:
+        - enabled (bool)
+            DESCRIPTION: Whether to stream pages and stop early
+    """
+
+    global _streaming
+    _streaming = bool(enabled)
+
+def get_streaming() -> bool:
+    return _streaming
+
+def stop_condition(app_state: bool = False):
+
+    """
+    * Get the function telling when enough of a page was downloaded for parse_page
+
+        Data Used:
+        - app_state (bool)
+            DESCRIPTION: Whether the Deezer app state script is needed too
+
+        Data Returned:
+        - until (callable)
+            DESCRIPTION: head_complete or app_state_complete, None when streaming is disabled
+    """
+
+    if not _streaming:
+        return None
+    return app_state_complete if app_state else head_complete
+
+def head_complete(document: bytes, scan: dict = None) -> bool:
+
+    """
+    * Whether a (partial) document contains the whole <head>
+
+        Data Used:
+        - document (bytes)
+            DESCRIPTION: The document read so far
+        - scan (dict)
+            DESCRIPTION: Where the previous calls for the same document stopped
+            scanning, so each call only scans what was read since. None to scan
+            the whole document
+    """
+
+    scan = {} if scan is None else scan
+    if "head_end" not in scan:
+        start = scan.get("head", 0)
+        if HEAD_END_REGEX.search(document, start) is None:
+            # A </head> cut off by the end of the document starts at its last "<"
+            last = document.rfind(b"<", start)
+            scan["head"] = last if last != -1 else len(document)
+            return False
+        scan["head_end"] = True
+    return True
+
+def app_state_complete(document: bytes, scan: dict = None) -> bool:
+
+    """
+    * Whether a (partial) document contains the whole <head> and the Deezer app state script, see head_complete
+    """
+
+    scan = {} if scan is None else scan
+    if "marker" not in scan:
+        start = scan.get("marker_scan", 0)
+        marker = document.find(APP_STATE_MARKER, start)
+        if marker == -1:
+            scan["marker_scan"] = max(start, len(document) - len(APP_STATE_MARKER) + 1)
+            return False
+        scan["marker"] = scan["script_scan"] = marker
+    end = document.find(b"</script", scan["script_scan"])
+    if end == -1:
+        scan["script_scan"] = max(scan["script_scan"], len(document) - len(b"</script") + 1)
+        return False
+    scan["script_scan"] = end
+    return head_complete(document, scan)
+
+@timed("parse")
+def parse_page(document: bytes, app_state: bool = False, engine: str = None) -> Page:
+
+    """
+    * Extract the meta tags (and optionally the Deezer app state) of a webpage
+
+        Data Used:
+        - document (bytes)
+            DESCRIPTION: The HTML of the webpage
+        - app_state (bool)
+            DESCRIPTION: Whether to also decode the window.__DZR_APP_STATE__ script
+        - engine (str)
+            DESCRIPTION: The engine to use, defaults to the one chosen with set_engine
+
+        Data Returned:
+        - page (Page)
+            DESCRIPTION: The meta tags as attribute dicts, and the app state if requested
+    """
+
+    if isinstance(document, str):
+        document = document.encode("utf-8")
+    if (engine or _engine) == "bs4":
+        return parse_page_bs4(document, app_state)
+
+    head_end = HEAD_END_REGEX.search(document)
+    head = document[:head_end.start()] if head_end else document
+    return Page(get_metatags(head), get_app_state(document) if app_state else None)
+
+def get_metatags(document: bytes) -> list:
+
+    """
+    * Scan a document for meta tags, keeping only their property, name and content
+
+        Data Used:
+        - document (bytes)
+            DESCRIPTION: The HTML to scan, usually only the <head> of a page
+
+        Data Returned:
+        - metatags (list of dict)
+            DESCRIPTION: One dict of attributes per meta tag, in document order
+    """
+
+    metatags = []
+    for match in META_REGEX.finditer(document):
+        attrs = {}
+        for name, double, single, bare in ATTR_REGEX.findall(match.group(1)):
+            name = name.lower().decode("ascii", "replace")
+            if name in META_ATTRS and name not in attrs:
+                value = double or single or bare
+                attrs[name] = html.unescape(value.decode("utf-8", "replace"))
+        metatags.append(attrs)
+    return metatags
+
+def get_app_state(document: bytes) -> dict:
+
+    """
+    * Decode the window.__DZR_APP_STATE__ JSON embedded in a Deezer page
+
+        Data Used:
+        - document (bytes)
+            DESCRIPTION: The HTML of the webpage
+
+        Data Returned:
+        - app_state (dict)
+            DESCRIPTION: The decoded app state, or None if the page has none
+    """
+
+    start = document.find(APP_STATE_MARKER)
+    if start == -1:
+        return None
+    start = document.find(b"{", start)
+    if start == -1:
+        return None
+    end = document.find(b"</script", start)
+    payload = document[start:end if end != -1 else len(document)].decode("utf-8", "replace")
+    try:
+        return json.JSONDecoder().raw_decode(payload)[0]
+    except ValueError:
+        return None
+
+def parse_page_bs4(document: bytes, app_state: bool = False) -> Page:
+
+    """
+    * Extract the meta tags and app state of a webpage with BeautifulSoup (fallback engine)
+    """
+
+    if BeautifulSoup is None:
+        raise ImportError("The bs4 engine needs beautifulsoup4, install it with: pip install beautifulsoup4")
+
+    soup = BeautifulSoup(document, "html.parser")
+    json_data = None
+    if app_state:
+        script_tag = soup.find('script', string=re.compile('window.__DZR_APP_STATE__'))
+        if script_tag:
+            script_tag = script_tag.string.replace('window.__DZR_APP_STATE__ = {', '').replace('};', '')
+            script_tag = "{" + script_tag
+            json_data = json.loads(script_tag)
+    return Page(soup.findAll("meta"), json_data)
@@ -0,0 +1,233 @@
+import time
+import asyncio
+import threading
+import contextvars
+import concurrent.futures
+import collections
+
+DEFAULT_PERCENTILE = 95
+DEFAULT_WINDOW = 1000
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_MAX_OUTSTANDING = 8
+
+# The hedge delay is recomputed after this many new samples
+RECOMPUTE_EVERY = 16
+
+class HedgePolicy:
+
+    """
+    * When to send a duplicate (hedge) of a slow request
+
+        The latencies of recent requests are tracked in a sliding window.
+        A request that hasn't answered after the given percentile of them
+        gets a hedge, and whichever answers first is used. Hedges are only
+        sent once enough samples were seen, and at most max_outstanding of
+        them are in flight at once.
+
+        Data Used:
+        - percentile (float)
+            DESCRIPTION: The latency percentile after which a hedge is sent
+        - window (int)
+            DESCRIPTION: The number of recent latencies kept
+        - min_samples (int)
+            DESCRIPTION: The number of latencies needed before hedging starts
+        - max_outstanding (int)
+            DESCRIPTION: The maximum number of hedges in flight
+    """
+
+    def __init__(self, percentile: float = DEFAULT_PERCENTILE, window: int = DEFAULT_WINDOW, min_samples: int = DEFAULT_MIN_SAMPLES, max_outstanding: int = DEFAULT_MAX_OUTSTANDING):
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_outstanding = max_outstanding
+        self.latencies = collections.deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.threshold = None
+        self.new_samples = 0
+        self.outstanding = 0
+        self.sent = 0
+        self.won = 0
+        self.skipped = 0
+
+    def record(self, latency: float) -> None:
+
+        """
+        * Add the latency of a completed request to the window
+        """
+
+        with self.lock:
+            self.latencies.append(latency)
+            self.new_samples += 1
+            if self.new_samples >= RECOMPUTE_EVERY or self.threshold is None:
+                self.new_samples = 0
+                if len(self.latencies) >= self.min_samples:
+                    ordered = sorted(self.latencies)
+                    self.threshold = ordered[min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)]
+
+    def delay(self) -> float:
+
+        """
+        * Get how long to wait before hedging a request
+
+            Data Returned:
+            - delay (float)
+                DESCRIPTION: The delay in seconds, None while there are too few samples
+        """
+
+        return self.threshold
+
+    def acquire(self) -> bool:
+
+        """
+        * Reserve a hedge, False when max_outstanding hedges are already in flight
+        """
+
+        with self.lock:
+            if self.outstanding >= self.max_outstanding:
+                return False
+            self.outstanding += 1
+            self.sent += 1
+            return True
+
+    def cancel(self) -> None:
+
+        """
+        * Give back a hedge reserved with acquire that wasn't sent after all
+        """
+
+        with self.lock:
+            self.outstanding -= 1
+            self.sent -= 1
+            self.skipped += 1
+
+    def release(self, won: bool = False) -> None:
+        with self.lock:
+            self.outstanding -= 1
+            if won:
+                self.won += 1
+
+    def stats(self) -> dict:
+
+        """
+        * Get the hedging counters
+
+            Data Returned:
+            - stats (dict)
+                DESCRIPTION: hedges sent, won and skipped (no rate limiter slot), hedges in flight and the current delay
+        """
+
+        with self.lock:
+            return {"sent": self.sent, "won": self.won, "skipped": self.skipped, "outstanding": self.outstanding, "delay": self.threshold}
+
+def _recorded(policy: HedgePolicy, function, *args):
+    # Timed from when the request starts, not from when it was queued
+    start = time.monotonic()
+    result = function(*args)
+    policy.record(time.monotonic() - start)
+    return result
+
+async def _async_recorded(policy: HedgePolicy, function, *args):
+    start = time.monotonic()
+    result = await function(*args)
+    policy.record(time.monotonic() - start)
+    return result
+
+def _reserve(policy: HedgePolicy, admit) -> bool:
+    if not policy.acquire():
+        return False
+    if admit is not None and not admit():
+        policy.cancel()
+        return False
+    return True
+
+def hedged_call(policy: HedgePolicy, executor: concurrent.futures.Executor, function, *args, hedge_function=None, admit=None):
+
+    """
+    * Call function(*args), hedging it with a second call when it is slow (threads)
+
+        Both calls run on executor, in the context of the caller (so the
+        lookup being traced sees them). The slower one is left to finish in
+        the background, so its connection goes back to the pool.
+
+        Data Used:
+        - policy (HedgePolicy)
+            DESCRIPTION: Decides when a hedge is sent
+        - executor (concurrent.futures.Executor)
+            DESCRIPTION: Runs the calls
+        - function (callable)
+            DESCRIPTION: The request to run
+        - hedge_function (callable)
+            DESCRIPTION: Sends the hedge, defaults to function
+        - admit (callable)
+            DESCRIPTION: Called before sending a hedge, which is skipped when it returns False
+
+        Data Returned:
+        - result
+            DESCRIPTION: The result of the first call that succeeds
+    """
+
+    primary = executor.submit(contextvars.copy_context().run, _recorded, policy, function, *args)
+    futures = {primary}
+
+    delay = policy.delay()
+    if delay is not None:
+        done, _ = concurrent.futures.wait(futures, timeout=delay)
+        if not done and _reserve(policy, admit):
+            hedge = executor.submit(contextvars.copy_context().run, hedge_function or function, *args)
+            hedge.add_done_callback(lambda future: policy.release(won=future.exception() is None and not primary.done()))
+            futures.add(hedge)
+
+    error = None
+    while futures:
+        done, futures = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+async def hedged(policy: HedgePolicy, function, *args, hedge_function=None, admit=None):
+
+    """
+    * Await function(*args), hedging it with a second call when it is slow (asyncio)
+
+        Data Used:
+        - policy (HedgePolicy)
+            DESCRIPTION: Decides when a hedge is sent
+        - function (coroutine function)
+            DESCRIPTION: The request to run
+        - hedge_function (coroutine function)
+            DESCRIPTION: Sends the hedge, defaults to function
+        - admit (callable)
+            DESCRIPTION: Called before sending a hedge, which is skipped when it returns False
+
+        Data Returned:
+        - result
+            DESCRIPTION: The result of the first call that succeeds
+    """
+
+    primary = asyncio.ensure_future(_async_recorded(policy, function, *args))
+    tasks = {primary}
+
+    delay = policy.delay()
+    if delay is not None:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and _reserve(policy, admit):
+            hedge = asyncio.ensure_future((hedge_function or function)(*args))
+            hedge.add_done_callback(lambda task: policy.release(won=not task.cancelled() and task.exception() is None and not primary.done()))
+            tasks.add(hedge)
+
+    error = None
+    try:
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # The slower call is no longer needed
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,342 @@
+import time
+import bisect
+import inspect
+import functools
+import threading
+import contextlib
+import contextvars
+
+# Upper bounds of the latency buckets in seconds: 50us doubling up to ~100s
+LATENCY_BUCKETS = tuple(0.00005 * 2 ** i for i in range(22))
+# Upper bounds of the requests per lookup buckets
+COUNT_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64)
+STAGES = ("connect", "download", "parse", "extract", "artist", "lookup")
+
+_trace = contextvars.ContextVar("trace", default=None)
+
+class Histogram:
+
+    """
+    * Fixed-bucket histogram, cheap enough to update on every request
+
+        Data Used:
+        - bounds (tuple)
+            DESCRIPTION: The sorted upper bounds of the buckets, larger values go to an overflow bucket
+    """
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    def percentile(self, percentile: float) -> float:
+
+        """
+        * Estimate a percentile, as the upper bound of the bucket it falls in
+
+            Data Returned:
+            - value (float)
+                DESCRIPTION: The estimated percentile, None if nothing was observed
+        """
+
+        if not self.count:
+            return None
+        rank = percentile / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+class Trace:
+
+    """
+    * What a single lookup did: its stages, requests and bytes
+
+        Data Used:
+        - kind (str)
+            DESCRIPTION: The lookup method ("get_song", "get_album", ...)
+        - provider (str)
+            DESCRIPTION: The provider name ("spotify" or "deezer")
+        - found_id (str)
+            DESCRIPTION: The ID that was looked up
+    """
+
+    def __init__(self, kind: str, provider: str, found_id: str):
+        self.kind = kind
+        self.provider = provider
+        self.found_id = found_id
+        self.start = time.perf_counter()
+        self.duration = None
+        self.requests = 0
+        self.bytes = 0
+        self.error = None
+        self.spans = []
+
+    def __repr__(self) -> str:
+        return f"Trace({self.kind} {self.provider}:{self.found_id}, {self.requests} requests, {self.duration}s)"
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "provider": self.provider,
+            "id": self.found_id,
+            "duration": self.duration,
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "error": self.error,
+            "spans": [{"stage": stage, "start": start, "duration": duration} for stage, start, duration in self.spans],
+        }
+
+class Metrics:
+
+    """
+    * Process-wide latency histograms and event counters
+
+        Stages are timed inclusively: "extract" includes the artist sub-fetch
+        done inside get_metadata, which is also timed on its own as "artist".
+        Hooks get every event as it happens, to export them elsewhere.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = True
+        self.hooks = []
+        self.trace_hooks = []
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms = {stage: Histogram() for stage in STAGES}
+            self.histograms["requests_per_lookup"] = Histogram(COUNT_BUCKETS)
+            self.counters = {}
+
+    def observe(self, name: str, value: float) -> None:
+
+        """
+        * Add a value to a histogram (a stage latency in seconds, or requests_per_lookup)
+        """
+
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+        for hook in self.hooks:
+            hook("histogram", name, value)
+
+    def increment(self, name: str, value: int = 1) -> None:
+
+        """
+        * Add to a counter (requests, bytes, cache_hits, retries, ...)
+        """
+
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook("counter", name, value)
+
+    def add_hook(self, hook) -> None:
+
+        """
+        * Call hook(kind, name, value) for every event, kind being "histogram" or "counter"
+        """
+
+        self.hooks.append(hook)
+
+    def add_trace_hook(self, hook) -> None:
+
+        """
+        * Call hook(trace) with the Trace of every lookup once it is done
+        """
+
+        self.trace_hooks.append(hook)
+
+    def remove_hook(self, hook) -> None:
+        for hooks in (self.hooks, self.trace_hooks):
+            if hook in hooks:
+                hooks.remove(hook)
+
+    def snapshot(self) -> dict:
+
+        """
+        * Get the current value of every counter and histogram
+
+            Data Returned:
+            - snapshot (dict)
+                DESCRIPTION: "counters" (name to value) and "histograms" (name to count, sum,
+                mean, min, max, p50, p90 and p99)
+        """
+
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items() if histogram.count},
+            }
+
+metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    return metrics
+
+def increment(name: str, value: int = 1) -> None:
+    metrics.increment(name, value)
+
+def current_trace() -> Trace:
+
+    """
+    * Get the Trace of the lookup running in this thread or task, None outside of lookups
+    """
+
+    return _trace.get()
+
+def record_request(size: int) -> None:
+
+    """
+    * Count a request and the bytes it downloaded, globally and for the current lookup
+    """
+
+    metrics.increment("requests")
+    metrics.increment("bytes", size)
+    trace = _trace.get()
+    if trace is not None:
+        trace.requests += 1
+        trace.bytes += size
+
+def record_stage(name: str, start: float) -> None:
+
+    """
+    * Time a stage that started at start (a time.perf_counter value)
+    """
+
+    duration = time.perf_counter() - start
+    metrics.observe(name, duration)
+    trace = _trace.get()
+    if trace is not None:
+        trace.spans.append((name, start - trace.start, duration))
+
+@contextlib.contextmanager
+def stage(name: str):
+
+    """
+    * Time the code of a with block as a stage
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, start)
+
+def timed(name: str):
+
+    """
+    * Decorator timing every call of a function (or coroutine) as a stage
+    """
+
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    record_stage(name, start)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record_stage(name, start)
+        return wrapper
+    return decorator
+
+def _start_trace(kind: str, instance) -> tuple:
+    trace = Trace(kind, getattr(instance, "PROVIDER", type(instance).__name__.lower()), getattr(instance, "found_id", None))
+    return trace, _trace.set(trace)
+
+def _finish_trace(trace: Trace, token, instance, result) -> None:
+    _trace.reset(token)
+    trace.duration = time.perf_counter() - trace.start
+    if result is False:
+        error = getattr(instance, "error", None)
+        trace.error = f"{type(error).__name__}: {error}" if error else "Lookup failed"
+    metrics.observe("lookup", trace.duration)
+    metrics.observe("requests_per_lookup", trace.requests)
+    metrics.increment("lookups")
+    if trace.error is not None:
+        metrics.increment("lookup_errors")
+    for hook in metrics.trace_hooks:
+        hook(trace)
+
+def traced(function):
+
+    """
+    * Decorator turning a provider method into a traced lookup
+
+        The outermost call starts a Trace, which collects the stages and
+        requests of everything it calls, including get_album inside get_song.
+        Nested calls are only timed as part of it. Works on coroutines too.
+    """
+
+    kind = function.__name__
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(self, *args, **kwargs):
+            if not metrics.enabled or _trace.get() is not None:
+                return await function(self, *args, **kwargs)
+            trace, token = _start_trace(kind, self)
+            result = False
+            try:
+                result = await function(self, *args, **kwargs)
+                return result
+            finally:
+                _finish_trace(trace, token, self, result)
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        if not metrics.enabled or _trace.get() is not None:
+            return function(self, *args, **kwargs)
+        trace, token = _start_trace(kind, self)
+        result = False
+        try:
+            result = function(self, *args, **kwargs)
+            return result
+        finally:
+            _finish_trace(trace, token, self, result)
+    return wrapper
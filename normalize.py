@@ -0,0 +1,109 @@
+import re
+import functools
+
+TYPES = ("track", "album", "artist", "playlist")
+
+SP_KEY_REGEX = re.compile(
+    r"(?:https?://)?open\.spotify\.com/(?:intl-[A-Za-z]{2}(?:-[A-Za-z]{2})?/|embed/)?"
+    r"(?P<type>track|album|artist|playlist)/(?P<id>[0-9A-Za-z]+)"
+)
+SP_URI_REGEX = re.compile(r"spotify:(?P<type>track|album|artist|playlist):(?P<id>[0-9A-Za-z]+)")
+DZ_KEY_REGEX = re.compile(
+    r"(?:https?://)?(?:www\.)?deezer\.com/(?:[A-Za-z]{2}(?:-[A-Za-z]{2})?/)?"
+    r"(?P<type>track|album|artist|playlist)/(?P<id>[0-9]+)"
+)
+
+# Bare IDs: Spotify IDs are 22 base62 characters, Deezer IDs are numbers
+SP_ID_REGEX = re.compile(r"[0-9A-Za-z]{22}")
+DZ_ID_REGEX = re.compile(r"[0-9]+")
+
+CANONICAL_URLS = {
+    "spotify": "https://open.spotify.com/{}/{}",
+    "deezer": "https://www.deezer.com/{}/{}",
+}
+
+NORMALIZE_CACHE_SIZE = 65536
+
+@functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize(value: str, default_type: str = "track") -> tuple:
+
+    """
+    * Get the canonical key of a Spotify/Deezer URL, URI or ID
+
+        Locale prefixes (/intl-es/, /es/), query strings, fragments and
+        trailing slashes are ignored, so every spelling of an entity gets the
+        same key.
+
+        Data Used:
+        - value (str)
+            DESCRIPTION: A Spotify/Deezer URL, a spotify: URI or a bare ID
+        - default_type (str)
+            DESCRIPTION: The type of bare IDs
+
+        Data Returned:
+        - key (tuple)
+            DESCRIPTION: (provider, type, id), None if the value isn't recognised
+    """
+
+    value = value.strip()
+    for provider, regex in (("spotify", SP_KEY_REGEX), ("deezer", DZ_KEY_REGEX), ("spotify", SP_URI_REGEX)):
+        match = regex.match(value)
+        if match:
+            return provider, match.group("type"), match.group("id")
+
+    if SP_ID_REGEX.fullmatch(value):
+        return "spotify", default_type, value
+    if DZ_ID_REGEX.fullmatch(value):
+        return "deezer", default_type, value
+    return None
+
+def normalize_for(value: str, provider: str, default_type: str = "track") -> tuple:
+
+    """
+    * Get the canonical key of a URL, URI or ID given to one provider
+
+        Unlike normalize, a bare ID is read as an ID of provider even when it
+        would also fit the other one, and the URLs and URIs of the other
+        provider are rejected.
+
+        Data Used:
+        - value (str)
+            DESCRIPTION: A URL, a spotify: URI or a bare ID
+        - provider (str)
+            DESCRIPTION: The provider the value is for ("spotify" or "deezer")
+        - default_type (str)
+            DESCRIPTION: The type of bare IDs
+
+        Data Returned:
+        - key (tuple)
+            DESCRIPTION: (provider, type, id), None if the value isn't one of provider
+    """
+
+    value = value.strip()
+    key = normalize(value, default_type)
+    if key is not None and key[0] == provider:
+        return key
+    if (SP_ID_REGEX if provider == "spotify" else DZ_ID_REGEX).fullmatch(value):
+        return provider, default_type, value
+    return None
+
+def canonical_url(key: tuple) -> str:
+
+    """
+    * Build the canonical URL of a key returned by normalize
+    """
+
+    provider, found_type, found_id = key
+    return CANONICAL_URLS[provider].format(found_type, found_id)
+
+def dedupe_key(value: str, default_type: str = "track"):
+
+    """
+    * Get what identifies duplicate inputs in the batch APIs
+
+        Data Returned:
+        - key (tuple or str)
+            DESCRIPTION: The normalized key, or the stripped value itself if it isn't recognised
+    """
+
+    return normalize(value, default_type) or value.strip()
@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import collections
+import urllib.error
+import concurrent.futures
+
+from batch import DEFAULT_DEDUPE_ENTRIES, BatchResult, fan_out, method_type
+from normalize import dedupe_key
+from async_http import AsyncClient, get_client
+from extractor import get_engine, parse_page, stop_condition
+from records import UNKNOWN
+from singleflight import AsyncSingleFlight
+from cache import MISS, LRUCache, album_cache, artist_cache
+
+DEFAULT_LOOKUPS = 64
+
+def parse(provider: type, kind: str, document: bytes, engine: str, app_state: bool = False, experimental: bool = False) -> tuple:
+
+    """
+    * Turn a downloaded page into metadata (runs in the parse processes)
+
+        Artists are not fetched here: the artist field is left holding the
+        URL of the artist page, which is returned so the I/O stage can fetch it.
+
+        Data Used:
+        - provider (type)
+            DESCRIPTION: The provider class (Spotify or Deezer)
+        - kind (str)
+            DESCRIPTION: "song", "album" or "artist"
+        - document (bytes)
+            DESCRIPTION: The HTML of the page
+        - engine (str)
+            DESCRIPTION: The extractor engine to use
+        - app_state (bool)
+            DESCRIPTION: Whether to read the metadata from the Deezer app state
+        - experimental (bool)
+            DESCRIPTION: Whether to backfill the metadata from the Deezer app state
+
+        Data Returned:
+        - metadata (SongData, AlbumData or str)
+            DESCRIPTION: The metadata of the page, the name of the artist for "artist"
+        - album_url (str)
+            DESCRIPTION: The album page a song still needs, None when its album is complete
+        - artist_url (str)
+            DESCRIPTION: The artist page whose name goes in the artist field, None if there is none
+    """
+
+    page = parse_page(document, app_state or experimental, engine)
+    if kind == "artist":
+        return provider.get_artist_name(page.metatags), None, None
+
+    if app_state:
+        metadata = provider.get_state_metadata(page.app_state, page.metatags, kind)
+        if metadata is not None:
+            return metadata, None, None
+
+    artist_urls = []
+    def get_artist(artist_url: str) -> str:
+        artist_urls.append(artist_url)
+        return artist_url
+
+    metadata = provider.get_metadata(page.metatags, kind, get_artist=get_artist)
+    if experimental:
+        metadata = provider.apply_app_state(page, metadata)
+    return metadata, f"{metadata.album}" if kind == "song" else None, artist_urls[-1] if artist_urls else None
+
+class Pipeline:
+
+    """
+    * Lookups with downloading and parsing split into two stages
+
+        Pages are downloaded on the event loop by an AsyncClient, and parsed
+        into SongData/AlbumData by a pool of processes, so parsing isn't held
+        back by the GIL and uses every core. The album and artist pages found
+        while parsing are fed back to the download stage. Albums and artists
+        shared by several lookups are fetched and parsed once. Expired cache
+        entries are downloaded again, not revalidated: AsyncClient sends no
+        conditional headers.
+
+        Data Used:
+        - provider (type)
+            DESCRIPTION: The provider class (Spotify or Deezer)
+        - logger (logging.Logger)
+            DESCRIPTION: The logger handed to every provider instance
+        - parse_workers (int)
+            DESCRIPTION: The number of parse processes, defaults to the number of CPUs, 0 parses on the event loop
+        - client (AsyncClient)
+            DESCRIPTION: The client pages are downloaded with, defaults to the shared one of the event loop
+        - options (dict)
+            DESCRIPTION: Extra arguments for every provider instance (e.g. cache, experimental, app_state)
+    """
+
+    def __init__(self, provider: type, logger: logging.Logger, parse_workers: int = None, client: AsyncClient = None, **options):
+        self.provider = provider
+        self.logger = logger
+        self.client = client
+        self.options = options
+        self.engine = get_engine()
+        self.flights = AsyncSingleFlight()
+        self.executor = concurrent.futures.ProcessPoolExecutor(parse_workers) if parse_workers != 0 else None
+
+    def __enter__(self) -> "Pipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    async def fetch(self, url: str, app_state: bool = False) -> bytes:
+
+        """
+        * Download a page (I/O stage)
+        """
+
+        client = self.client or get_client()
+        try:
+            response = await client.get(url, stop_condition(app_state))
+        except urllib.error.HTTPError:
+            logging.error("got error urllib.error.HTTPError with " + url)
+            raise ConnectionError(f"Could not fetch {url}")
+        except (urllib.error.URLError, OSError, asyncio.TimeoutError):
+            logging.error("got error urllib.error.URLError with " + url)
+            raise ConnectionError(f"Could not fetch {url}")
+        return response.body
+
+    async def parse(self, kind: str, document: bytes, app_state: bool = False, experimental: bool = False) -> tuple:
+
+        """
+        * Parse a page in the process pool (parse stage), see parse
+        """
+
+        if self.executor is None:
+            return parse(self.provider, kind, document, self.engine, app_state, experimental)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, parse, self.provider, kind, document, self.engine, app_state, experimental)
+
+    async def get_song(self, instance):
+
+        """
+        * Get the metadata of the song of a provider instance
+
+            Data Used:
+            - instance (Spotify or Deezer)
+                DESCRIPTION: The instance whose URL, options and cache are used
+
+            Data Returned:
+            - metadata (SongData)
+                DESCRIPTION: The metadata of the song, False for a failure remembered by the cache
+        """
+
+        cached = instance.get_cached("song", instance.found_id)
+        if cached is not MISS:
+            return cached
+
+        try:
+            app_state, experimental = getattr(instance, "app_state", False), instance.experimental
+            document = await self.fetch(instance.song_url, app_state or experimental)
+            metadata, album_url, artist_url = await self.parse("song", document, app_state, experimental)
+
+            if album_url is not None:
+                # The album and the artist of the song are fetched at the same time
+                instance.album_url = instance.get_album_page_url(album_url)
+                lookups = [self.get_album(instance)]
+                if artist_url:
+                    lookups.append(self.get_artist(artist_url))
+                album, *artist = await asyncio.gather(*lookups)
+                metadata = metadata.replace(album=album)
+                if artist:
+                    metadata = metadata.replace(artist=UNKNOWN if artist[0] is None else artist[0])
+
+            instance.set_cached("song", instance.found_id, metadata)
+            return metadata
+        except Exception as e:
+            instance.error = e
+            instance.set_cached_failure("song", instance.found_id, e)
+            raise
+
+    async def get_album(self, instance):
+
+        """
+        * Get the metadata of the album of a provider instance
+
+            Data Used:
+            - instance (Spotify or Deezer)
+                DESCRIPTION: The instance whose album URL, options and cache are used
+
+            Data Returned:
+            - metadata (AlbumData)
+                DESCRIPTION: The metadata of the album
+        """
+
+        album_id = instance.get_album_id()
+        cached = instance.get_cached("album", album_id)
+        if cached is False:
+            raise instance.error
+        if cached is not MISS:
+            return cached
+
+        album = album_cache.get(instance.album_url)
+        if album is not MISS:
+            return album
+
+        try:
+            app_state, experimental = getattr(instance, "app_state", False), instance.experimental
+            album = await self.flights.do(("album", instance.album_url), self._get_album, instance.album_url, app_state, experimental)
+        except Exception as e:
+            instance.error = e
+            instance.set_cached_failure("album", album_id, e)
+            raise
+        instance.set_cached("album", album_id, album)
+        return album
+
+    async def _get_album(self, album_url: str, app_state: bool, experimental: bool):
+        document = await self.fetch(album_url, app_state or experimental)
+        metadata, _, artist_url = await self.parse("album", document, app_state, experimental)
+        if artist_url:
+            artist = await self.get_artist(artist_url)
+            metadata = metadata.replace(artist=UNKNOWN if artist is None else artist)
+        album_cache.set(album_url, metadata)
+        return metadata
+
+    async def get_artist(self, artist_url: str) -> str:
+
+        """
+        * Get the name of an artist from its page, through the artist cache
+        """
+
+        artist = artist_cache.get(artist_url)
+        if artist is not MISS:
+            return artist
+        return await self.flights.do(("artist", artist_url), self._get_artist, artist_url)
+
+    async def _get_artist(self, artist_url: str) -> str:
+        artist, _, _ = await self.parse("artist", await self.fetch(artist_url))
+        artist_cache.set(artist_url, artist)
+        return artist
+
+    async def lookup(self, method: str, url: str) -> BatchResult:
+
+        """
+        * Resolve a single URL or ID, like batch.lookup
+
+            Data Used:
+            - method (str)
+                DESCRIPTION: "get_song" or "get_album"
+            - url (str)
+                DESCRIPTION: The URL or ID to resolve
+
+            Data Returned:
+            - result (BatchResult)
+                DESCRIPTION: The metadata, or the error that stopped the lookup
+        """
+
+        instance = None
+        try:
+            instance = self.provider(url, self.logger, **self.options)
+            data = await (self.get_song(instance) if method == "get_song" else self.get_album(instance))
+        except Exception as e:
+            self.logger.error(f"Failed to get {url}: {e}")
+            return BatchResult(url, error=f"{type(e).__name__}: {e}")
+
+        if data is False:
+            error = instance.error
+            return BatchResult(url, error=f"{type(error).__name__}: {error}" if error else "Lookup failed")
+        return BatchResult(url, data=data)
+
+    async def iter_results(self, method: str, urls, max_lookups: int = DEFAULT_LOOKUPS, dedupe: int = DEFAULT_DEDUPE_ENTRIES):
+
+        """
+        * Resolve many URLs or IDs, yielding in input order
+
+            Data Used:
+            - method (str)
+                DESCRIPTION: "get_song" or "get_album"
+            - urls (iterable)
+                DESCRIPTION: The URLs or IDs to resolve, consumed lazily
+            - max_lookups (int)
+                DESCRIPTION: The number of lookups in flight at once
+            - dedupe (int)
+                DESCRIPTION: How many recent inputs are remembered so duplicates are looked up once, 0 to look up every input
+
+            Data Returned:
+            - results (async generator of BatchResult)
+                DESCRIPTION: One result per input, in the same order as the input
+        """
+
+        if max_lookups < 1:
+            raise ValueError("max_lookups must be at least 1")
+
+        pending = collections.deque()
+        seen = LRUCache(dedupe)
+        default_type = method_type(method)
+
+        async def output(url: str, key, entry) -> BatchResult:
+            result = await entry if isinstance(entry, asyncio.Future) else entry
+            # Finished lookups are remembered by their result, a fraction of the size of their task
+            if dedupe:
+                seen.set(key, result)
+            return fan_out(result, url)
+
+        try:
+            for url in urls:
+                key = dedupe_key(url, default_type) if dedupe else None
+                entry = seen.get(key) if dedupe else MISS
+                if entry is MISS:
+                    entry = asyncio.ensure_future(self.lookup(method, url))
+                    seen.set(key, entry)
+                pending.append((url, key, entry))
+                if len(pending) >= max_lookups:
+                    yield await output(*pending.popleft())
+            while pending:
+                yield await output(*pending.popleft())
+        finally:
+            for _, _, entry in pending:
+                if isinstance(entry, asyncio.Future):
+                    entry.cancel()
+
+async def _collect(pipeline: Pipeline, method: str, urls, max_lookups: int, dedupe: int) -> list:
+    return [result async for result in pipeline.iter_results(method, urls, max_lookups, dedupe)]
+
+def run_pipeline(provider: type, method: str, urls, logger: logging.Logger, parse_workers: int = None, max_lookups: int = DEFAULT_LOOKUPS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+
+    """
+    * Resolve many URLs or IDs with a Pipeline on a new event loop
+
+        Data Used:
+        - provider (type)
+            DESCRIPTION: The provider class (Spotify or Deezer)
+        - method (str)
+            DESCRIPTION: "get_song" or "get_album"
+        - urls (iterable)
+            DESCRIPTION: The URLs or IDs to resolve
+        - parse_workers (int)
+            DESCRIPTION: The number of parse processes, defaults to the number of CPUs
+        - max_lookups (int)
+            DESCRIPTION: The number of lookups in flight at once
+        - dedupe (int)
+            DESCRIPTION: How many recent inputs are remembered so duplicates are looked up once
+
+        Data Returned:
+        - results (list of BatchResult)
+            DESCRIPTION: One result per input, in the same order as the input
+    """
+
+    with Pipeline(provider, logger, parse_workers, **options) as pipeline:
+        return asyncio.run(_collect(pipeline, method, urls, max_lookups, dedupe))
@@ -0,0 +1,343 @@
+import time
+import random
+import asyncio
+import threading
+import email.utils
+
+# No rate limit until a host throttles, then the rate adapts like the concurrency
+DEFAULT_RATE = None
+DEFAULT_MIN_RATE = 1.0
+DEFAULT_BURST = 40
+DEFAULT_CONCURRENCY = 16
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# How long waiting threads/tasks sleep at most before checking again
+POLL_INTERVAL = 0.05
+# How often the rate requests are sent at is measured, in seconds
+RATE_WINDOW = 1.0
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+class HostState:
+
+    def __init__(self, rate: float, burst: int, concurrency: float):
+        self.rate = rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.window_start = self.updated
+        self.window_requests = 0
+        self.sent_rate = None
+        self.limit = float(concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.last_rate_decrease = 0.0
+        self.latency = None
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+class RateLimiter:
+
+    """
+    * Per-host token bucket with an adaptive (AIMD) rate and concurrency limit
+
+        The number of requests in flight per host grows by about one for
+        every window of successful responses, and is halved when the host
+        throttles (429), fails (5xx, connection errors) or answers slower
+        than latency_target. A Retry-After header pauses the whole host.
+
+        The request rate adapts the same way. Without a starting rate, a
+        host is not rate limited until it first throttles or fails, which
+        sets its rate to half the rate requests were being sent at. Every
+        successful response then raises the rate, by about one request per
+        second every second, and throttling halves it again, at most once
+        per second.
+
+        Data Used:
+        - rate (float)
+            DESCRIPTION: The starting number of requests per second per host, None for no limit until the host throttles
+        - min_rate (float)
+            DESCRIPTION: The lowest the rate can go
+        - burst (int)
+            DESCRIPTION: The number of requests that can be sent at once after being idle
+        - concurrency (int)
+            DESCRIPTION: The initial number of requests in flight per host
+        - min_concurrency (int)
+            DESCRIPTION: The lowest the concurrency limit can go
+        - max_concurrency (int)
+            DESCRIPTION: The highest the concurrency limit can go
+        - latency_target (float)
+            DESCRIPTION: Responses slower than this (in seconds) count as congestion, None to ignore latency
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, concurrency: int = DEFAULT_CONCURRENCY,
+                 min_concurrency: int = DEFAULT_MIN_CONCURRENCY, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, latency_target: float = None,
+                 min_rate: float = DEFAULT_MIN_RATE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+
+    def _host(self, host: str) -> HostState:
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.rate, self.burst, self.concurrency)
+        return state
+
+    def try_acquire(self, host: str) -> float:
+
+        """
+        * Try to take a token and a concurrency slot for a host, without waiting
+
+            Data Used:
+            - host (str)
+                DESCRIPTION: The host the request goes to
+
+            Data Returned:
+            - wait (float)
+                DESCRIPTION: 0 if the request may be sent now (release must be called after it),
+                otherwise how long to wait before trying again
+        """
+
+        with self.lock:
+            return self._try_acquire(host)
+
+    def _try_acquire(self, host: str) -> float:
+        state = self._host(host)
+        now = time.monotonic()
+        if state.blocked_until > now:
+            return state.blocked_until - now
+
+        if state.rate is not None:
+            state.tokens = min(float(self.burst), state.tokens + (now - state.updated) * state.rate)
+        state.updated = now
+        if state.in_flight >= int(state.limit):
+            return POLL_INTERVAL
+        if state.rate is not None:
+            if state.tokens < 1:
+                return (1 - state.tokens) / state.rate
+            state.tokens -= 1
+
+        state.in_flight += 1
+        state.requests += 1
+        state.window_requests += 1
+        if now - state.window_start >= RATE_WINDOW:
+            state.sent_rate = state.window_requests / (now - state.window_start)
+            state.window_start = now
+            state.window_requests = 0
+        return 0.0
+
+    def _decrease_rate(self, state: HostState, now: float) -> None:
+        # Like the concurrency, but at most once per window, since a whole
+        # window of requests went out before the host could push back
+        if now - state.last_rate_decrease < RATE_WINDOW:
+            return
+        state.last_rate_decrease = now
+        if state.rate is None:
+            # Start from the rate requests were sent at when the host gave up
+            sent_rate = state.sent_rate or state.window_requests / max(now - state.window_start, POLL_INTERVAL)
+            state.rate = max(sent_rate, self.min_rate)
+            state.tokens = 0.0
+        state.rate = max(self.min_rate, state.rate / 2)
+
+    def acquire(self, host: str) -> None:
+
+        """
+        * Wait until a request to host may be sent (threads)
+        """
+
+        with self.lock:
+            while True:
+                wait = self._try_acquire(host)
+                if not wait:
+                    return
+                self.released.wait(min(wait, POLL_INTERVAL * 4))
+
+    async def acquire_async(self, host: str) -> None:
+
+        """
+        * Wait until a request to host may be sent (asyncio)
+        """
+
+        while True:
+            wait = self.try_acquire(host)
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, POLL_INTERVAL * 4))
+
+    def release(self, host: str, status: int = None, latency: float = None, retry_after: float = None) -> None:
+
+        """
+        * Report the outcome of a request and free its concurrency slot
+
+            Data Used:
+            - host (str)
+                DESCRIPTION: The host the request went to
+            - status (int)
+                DESCRIPTION: The HTTP status, None when the connection failed
+            - latency (float)
+                DESCRIPTION: How long the request took in seconds
+            - retry_after (float)
+                DESCRIPTION: The delay asked for by a Retry-After header, in seconds
+        """
+
+        with self.lock:
+            state = self._host(host)
+            state.in_flight = max(state.in_flight - 1, 0)
+            now = time.monotonic()
+
+            if latency is not None:
+                state.latency = latency if state.latency is None else state.latency * 0.8 + latency * 0.2
+
+            throttled = status == 429 or retry_after is not None
+            failed = status is None or status >= 500
+            slow = self.latency_target is not None and latency is not None and latency > self.latency_target
+
+            if throttled:
+                state.throttled += 1
+            if failed:
+                state.errors += 1
+            if retry_after is not None:
+                state.blocked_until = max(state.blocked_until, now + retry_after)
+
+            if throttled or failed or slow:
+                # Multiplicative decrease, at most once per round trip so a
+                # burst of errors from one window doesn't collapse the limit
+                if now - state.last_decrease >= (state.latency or 0.0):
+                    state.limit = max(float(self.min_concurrency), state.limit / 2)
+                    if throttled or failed:
+                        self._decrease_rate(state, now)
+                    state.last_decrease = now
+            else:
+                state.limit = min(float(self.max_concurrency), state.limit + 1 / state.limit)
+                if state.rate is not None:
+                    state.rate += 1 / state.rate
+
+            self.released.notify_all()
+
+    def cancel(self, host: str) -> None:
+
+        """
+        * Free the concurrency slot of a request abandoned before it finished, without recording an outcome
+        """
+
+        with self.lock:
+            state = self._host(host)
+            state.in_flight = max(state.in_flight - 1, 0)
+            self.released.notify_all()
+
+    def stats(self) -> dict:
+
+        """
+        * Get the state of every host
+
+            Data Returned:
+            - stats (dict)
+                DESCRIPTION: Host to its rate (None if unlimited), concurrency limit, requests in flight, latency and counters
+        """
+
+        with self.lock:
+            return {
+                host: {
+                    "rate": state.rate,
+                    "limit": int(state.limit),
+                    "in_flight": state.in_flight,
+                    "latency": state.latency,
+                    "requests": state.requests,
+                    "throttled": state.throttled,
+                    "errors": state.errors,
+                }
+                for host, state in self.hosts.items()
+            }
+
+class RetryPolicy:
+
+    """
+    * When and how long to wait before retrying a request
+
+        Data Used:
+        - retries (int)
+            DESCRIPTION: The number of retries after the first attempt
+        - backoff (float)
+            DESCRIPTION: The base delay in seconds, doubled on every retry
+        - max_backoff (float)
+            DESCRIPTION: The longest delay between two attempts
+        - statuses (iterable)
+            DESCRIPTION: The HTTP statuses that are retried
+    """
+
+    def __init__(self, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF, max_backoff: float = DEFAULT_MAX_BACKOFF, statuses=RETRY_STATUSES):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+
+    def should_retry(self, attempt: int, status: int = None) -> bool:
+
+        """
+        * Whether a failed attempt is retried, status None means the connection failed
+        """
+
+        return attempt < self.retries and (status is None or status in self.statuses)
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+
+        """
+        * Get the delay before the next attempt (exponential backoff with full jitter)
+        """
+
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+def parse_retry_after(value: str) -> float:
+
+    """
+    * Parse a Retry-After header, given in seconds or as an HTTP date
+
+        Data Returned:
+        - delay (float)
+            DESCRIPTION: The delay in seconds, None if the header is missing or invalid
+    """
+
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0.0)
+
+def get_limiter() -> RateLimiter:
+
+    """
+    * Get the process-wide RateLimiter shared by the default Session and AsyncClients
+
+        Data Returned:
+        - limiter (RateLimiter)
+            DESCRIPTION: The shared limiter, created on first use
+    """
+
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_lock:
+            if _default_limiter is None:
+                _default_limiter = RateLimiter()
+    return _default_limiter
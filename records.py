@@ -0,0 +1,458 @@
+import json
+import array
+import threading
+import dataclasses
+
+# Stored in the duration column when a song has no known duration
+MISSING_DURATION = -1
+
+class _Unknown:
+
+    """
+    * The value of a field that couldn't be found
+
+        It compares equal to "Unknown" (what missing fields used to be
+        filled with), is falsy, and is exported as None/null.
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other) -> bool:
+        return other is self or other == "Unknown"
+
+    def __hash__(self) -> int:
+        return hash("Unknown")
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __str__(self) -> str:
+        return "Unknown"
+
+    def __repr__(self) -> str:
+        return "UNKNOWN"
+
+    def __reduce__(self) -> str:
+        return "UNKNOWN"
+
+UNKNOWN = _Unknown()
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class AlbumData:
+
+    artwork_url: str = UNKNOWN
+    title: str = UNKNOWN
+    artist: str = UNKNOWN
+    description: str = UNKNOWN
+    release_date: str = UNKNOWN
+
+    def replace(self, **changes) -> "AlbumData":
+        return dataclasses.replace(self, **changes)
+
+    def to_dict(self) -> dict:
+        return {name: export(getattr(self, name)) for name in ALBUM_FIELDS}
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class SongData:
+
+    artwork_url: str = UNKNOWN
+    duration: int = UNKNOWN
+    genre: str = UNKNOWN
+    album: AlbumData = UNKNOWN
+    title: str = UNKNOWN
+    artist: str = UNKNOWN
+    release_date: str = UNKNOWN
+    isrc: str = UNKNOWN
+
+    def replace(self, **changes) -> "SongData":
+        return dataclasses.replace(self, **changes)
+
+    def to_dict(self) -> dict:
+        data = {name: export(getattr(self, name)) for name in SONG_FIELDS}
+        album = self.album.get() if isinstance(self.album, LazyAlbum) else self.album
+        data["album"] = album.to_dict() if isinstance(album, AlbumData) else export(album)
+        return data
+
+class LazyAlbum(AlbumData):
+
+    """
+    * Album of a song that is only fetched when it is first read
+
+        Reading any AlbumData attribute or method (title, to_dict, ...) fetches
+        the album once and caches it, later reads are free. prefetch_albums in
+        batch.py resolves many handles at once.
+
+        It is an AlbumData, but equality and hashing go by URL and never fetch:
+        two handles are equal when they point to the same album page, and a
+        handle never equals a plain AlbumData (compare get() for that).
+        Unresolved handles can't be pickled or copied.
+
+        Data Used:
+        - url (str)
+            DESCRIPTION: The URL of the album page
+        - resolve (callable)
+            DESCRIPTION: Fetches the album, returns AlbumData or False
+        - on_resolve (callable)
+            DESCRIPTION: Called with the album (or False) once the handle is resolved, by get or set
+    """
+
+    __slots__ = ("url", "_resolve", "_on_resolve", "_album", "_lock")
+
+    def __init__(self, url: str, resolve, on_resolve=None):
+        # The fields of AlbumData stay unset until the album is fetched, reading them calls __getattr__
+        object.__setattr__(self, "url", url)
+        object.__setattr__(self, "_resolve", resolve)
+        object.__setattr__(self, "_on_resolve", on_resolve)
+        object.__setattr__(self, "_album", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    @property
+    def resolved(self) -> bool:
+        return self._album is not None
+
+    def get(self):
+
+        """
+        * Get the album, fetching it on the first call
+
+            Data Returned:
+            - album (AlbumData)
+                DESCRIPTION: The album, or False if it couldn't be fetched
+        """
+
+        if self._album is None:
+            with self._lock:
+                if self._album is None:
+                    self._resolved(self._resolve())
+        return self._album
+
+    def set(self, album) -> None:
+
+        """
+        * Resolve the handle with an album fetched elsewhere
+        """
+
+        with self._lock:
+            if self._album is None:
+                self._resolved(album)
+
+    def _resolved(self, album) -> None:
+        object.__setattr__(self, "_album", album)
+        object.__setattr__(self, "_resolve", None)
+        if isinstance(album, AlbumData):
+            # Later reads of the fields no longer go through __getattr__
+            for name in ALBUM_FIELDS:
+                object.__setattr__(self, name, getattr(album, name))
+        on_resolve = self._on_resolve
+        object.__setattr__(self, "_on_resolve", None)
+        if on_resolve is not None:
+            on_resolve(album)
+
+    def __getattr__(self, name: str):
+        # Only called for the fields that are still unset
+        if name not in ALBUM_FIELDS:
+            raise AttributeError(name)
+        if self.get() is False:
+            raise AttributeError(f"The album {self.url} could not be fetched")
+        return getattr(self._album, name)
+
+    def replace(self, **changes) -> AlbumData:
+        album = self.get()
+        if album is False:
+            raise AttributeError(f"The album {self.url} could not be fetched")
+        return album.replace(**changes)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LazyAlbum):
+            return self.url == other.url
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.url)
+
+    def __repr__(self) -> str:
+        if self.resolved:
+            return repr(self._album)
+        return f"LazyAlbum({self.url!r})"
+
+    def __reduce__(self):
+        # Pickle (and copy) the fetched album, never the fetching machinery
+        if not self.resolved:
+            raise TypeError(f"The album {self.url} was not fetched yet, resolve it with get() or batch.prefetch_albums first")
+        return (_identity, (self._album,))
+
+def _identity(value):
+    return value
+
+ALBUM_FIELDS = tuple(field.name for field in dataclasses.fields(AlbumData))
+SONG_FIELDS = tuple(field.name for field in dataclasses.fields(SongData))
+
+# Songs are stored flat, with the fields of their album prefixed by "album_"
+ALBUM_COLUMNS = ALBUM_FIELDS
+SONG_COLUMNS = ("artwork_url", "duration", "genre", "title", "artist", "release_date", "isrc", "album_url") + tuple(f"album_{name}" for name in ALBUM_FIELDS)
+
+def export(value):
+
+    """
+    * Convert a field value for export, UNKNOWN (and False) become None
+    """
+
+    if value is UNKNOWN or value is False:
+        return None
+    return value
+
+def flatten(record) -> dict:
+
+    """
+    * Convert a SongData or AlbumData to a flat row, see SONG_COLUMNS and ALBUM_COLUMNS
+
+        Lazy albums that were never read only fill album_url.
+
+        Data Used:
+        - record (SongData or AlbumData)
+            DESCRIPTION: The record to convert
+
+        Data Returned:
+        - row (dict)
+            DESCRIPTION: Column name to value, None for unknown values
+    """
+
+    if isinstance(record, AlbumData):
+        return {name: export(getattr(record, name)) for name in ALBUM_FIELDS}
+
+    row = {name: export(getattr(record, name)) for name in ("artwork_url", "genre", "title", "artist", "release_date", "isrc")}
+    row["duration"] = record.duration if isinstance(record.duration, int) else None
+
+    album = record.album
+    if isinstance(album, LazyAlbum):
+        album = album.get() if album.resolved else album.url
+    row["album_url"] = album if isinstance(album, str) else None
+    for name in ALBUM_FIELDS:
+        row[f"album_{name}"] = export(getattr(album, name)) if isinstance(album, AlbumData) else None
+    return row
+
+class StringColumn:
+
+    """
+    * Column of strings (None when unknown) laid out like an Arrow large_string array
+
+        The UTF-8 bytes of every string are appended to a single data buffer,
+        an array of 64-bit offsets marks where each one starts and ends, and
+        a validity bitmap marks the None values. Arrow can use these buffers
+        as they are.
+    """
+
+    __slots__ = ("offsets", "data", "validity", "length")
+
+    def __init__(self, values=()):
+        self.offsets = array.array("q", [0])
+        self.data = bytearray()
+        self.validity = bytearray()
+        self.length = 0
+        for value in values:
+            self.append(value)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        data, offsets, validity = self.data, self.offsets, self.validity
+        for index in range(self.length):
+            if validity[index >> 3] >> (index & 7) & 1:
+                yield data[offsets[index]:offsets[index + 1]].decode("utf-8")
+            else:
+                yield None
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("StringColumn index out of range")
+        if not self.validity[index >> 3] >> (index & 7) & 1:
+            return None
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def append(self, value) -> None:
+        if self.length & 7 == 0:
+            self.validity.append(0)
+        if value is not None:
+            self.data += str(value).encode("utf-8")
+            self.validity[self.length >> 3] |= 1 << (self.length & 7)
+        self.offsets.append(len(self.data))
+        self.length += 1
+
+class RecordBatch:
+
+    """
+    * Column-wise container for many SongData or AlbumData
+
+        Every field is kept in its own column: a StringColumn (None when
+        unknown) or, for durations, an array of 64-bit integers with
+        MISSING_DURATION for unknown ones. Holding a batch this way avoids
+        one object per result and makes bulk exports cheap. Lazy albums
+        that were never read are stored by URL only.
+
+        Data Used:
+        - record_type (type)
+            DESCRIPTION: SongData or AlbumData
+        - records (iterable)
+            DESCRIPTION: Records to add right away
+    """
+
+    def __init__(self, record_type: type = SongData, records=()):
+        if record_type not in (SongData, AlbumData):
+            raise TypeError("record_type must be SongData or AlbumData")
+        self.record_type = record_type
+        self.column_names = SONG_COLUMNS if record_type is SongData else ALBUM_COLUMNS
+        self.columns = {name: array.array("q") if name == "duration" else StringColumn() for name in self.column_names}
+        self.extend(records)
+
+    def __len__(self) -> int:
+        return len(self.columns[self.column_names[0]])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index: int):
+        row = {name: self.columns[name][index] for name in self.column_names}
+        if self.record_type is AlbumData:
+            return AlbumData(**{name: UNKNOWN if row[name] is None else row[name] for name in ALBUM_FIELDS})
+
+        album = row["album_url"]
+        if any(row[f"album_{name}"] is not None for name in ALBUM_FIELDS):
+            album = AlbumData(**{name: UNKNOWN if row[f"album_{name}"] is None else row[f"album_{name}"] for name in ALBUM_FIELDS})
+        duration = row["duration"]
+        return SongData(
+            artwork_url=UNKNOWN if row["artwork_url"] is None else row["artwork_url"],
+            duration=UNKNOWN if duration == MISSING_DURATION else duration,
+            genre=UNKNOWN if row["genre"] is None else row["genre"],
+            album=UNKNOWN if album is None else album,
+            title=UNKNOWN if row["title"] is None else row["title"],
+            artist=UNKNOWN if row["artist"] is None else row["artist"],
+            release_date=UNKNOWN if row["release_date"] is None else row["release_date"],
+            isrc=UNKNOWN if row["isrc"] is None else row["isrc"],
+        )
+
+    def append(self, record) -> None:
+
+        """
+        * Add a record at the end of the batch
+        """
+
+        if not isinstance(record, self.record_type):
+            raise TypeError(f"Expected {self.record_type.__name__}, got {type(record).__name__}")
+        row = flatten(record)
+        if "duration" in row:
+            row["duration"] = MISSING_DURATION if row["duration"] is None else row["duration"]
+        columns = self.columns
+        for name in self.column_names:
+            columns[name].append(row[name])
+
+    def extend(self, records) -> None:
+        for record in records:
+            self.append(record)
+
+    def to_columns(self) -> dict:
+
+        """
+        * Get the columns of the batch without copying them
+
+            Data Returned:
+            - columns (dict)
+                DESCRIPTION: Column name to StringColumn (array of int64 for duration)
+        """
+
+        return self.columns
+
+    def to_numpy(self):
+
+        """
+        * Export the batch as a NumPy structured array (requires numpy)
+
+            NumPy can't view the string buffers, so this copies: strings are
+            decoded into objects, and durations are copied into the rows of
+            the structured array. to_arrow doesn't copy.
+
+            Data Returned:
+            - records (numpy.ndarray)
+                DESCRIPTION: One row per record, one field per column
+        """
+
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("to_numpy needs numpy, install it with: pip install numpy")
+
+        dtype = [(name, "i8" if name == "duration" else object) for name in self.column_names]
+        records = numpy.empty(len(self), dtype=dtype)
+        for name in self.column_names:
+            if name == "duration":
+                records[name] = numpy.frombuffer(self.columns[name], dtype="i8")
+            else:
+                records[name] = list(self.columns[name])
+        return records
+
+    def to_arrow(self):
+
+        """
+        * Export the batch as a pyarrow Table (requires pyarrow)
+
+            The buffers of every column are handed to Arrow without copying:
+            strings as large_string arrays, and durations with a validity
+            bitmap marking the unknown ones as null (building it is the only
+            pass over the rows). The table shares the memory of the batch,
+            which can't grow (BufferError) while the table is alive.
+
+            Data Returned:
+            - table (pyarrow.Table)
+                DESCRIPTION: One column per field
+        """
+
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("to_arrow needs pyarrow, install it with: pip install pyarrow")
+
+        arrays = {}
+        for name in self.column_names:
+            column = self.columns[name]
+            if name == "duration":
+                validity = bytearray((len(column) + 7) // 8)
+                for index, duration in enumerate(column):
+                    if duration != MISSING_DURATION:
+                        validity[index >> 3] |= 1 << (index & 7)
+                arrays[name] = pyarrow.Array.from_buffers(
+                    pyarrow.int64(), len(column), [pyarrow.py_buffer(validity), pyarrow.py_buffer(column)]
+                )
+            else:
+                arrays[name] = pyarrow.Array.from_buffers(
+                    pyarrow.large_string(), len(column),
+                    [pyarrow.py_buffer(column.validity), pyarrow.py_buffer(column.offsets), pyarrow.py_buffer(column.data)],
+                )
+        return pyarrow.table(arrays)
+
+    def write_jsonl(self, file) -> int:
+
+        """
+        * Write the batch as JSON Lines, one object per record
+
+            Data Used:
+            - file (file object)
+                DESCRIPTION: A text file opened for writing
+
+            Data Returned:
+            - count (int)
+                DESCRIPTION: The number of lines written
+        """
+
+        names = self.column_names
+        columns = [self.columns[name] for name in names]
+        count = 0
+        for row in zip(*columns):
+            line = dict(zip(names, row))
+            if "duration" in line and line["duration"] == MISSING_DURATION:
+                line["duration"] = None
+            file.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+        return count
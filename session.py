@@ -0,0 +1,443 @@
+import ssl
+import time
+import zlib
+import gzip
+import queue
+import threading
+import http.client
+import concurrent.futures
+import urllib.error
+import urllib.parse
+
+from singleflight import SingleFlight
+from ratelimit import RateLimiter, RetryPolicy, get_limiter, parse_retry_after
+from hedge import HedgePolicy, hedged_call
+from metrics import increment, record_request, record_stage
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+# How many bytes are read at a time when a body is streamed
+STREAM_CHUNK_SIZE = 16 * 1024
+# Threads running the requests of a session with hedging enabled. A thread is only
+# started when none is idle, so this is a safety bound, not a concurrency limit:
+# every caller needs at most two of them (its request and its hedge)
+HEDGE_WORKERS = 4096
+USER_AGENT = "Mozilla/5.0 (compatible; MusicData-Lib)"
+
+# Errors that mean a kept-alive connection was closed by the server while idle
+STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+
+_default_session = None
+_default_lock = threading.Lock()
+
+class Response:
+
+    url: str
+    status: int
+    reason: str
+    headers: dict
+    body: bytes
+    truncated: bool
+
+    def __init__(self, url: str, status: int, reason: str, headers: dict, body: bytes, truncated: bool = False):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.truncated = truncated
+
+class Session:
+
+    """
+    * Thread-safe HTTP session with per-host keep-alive connection pools
+
+        Connections to the same scheme, host and port are reused across
+        requests and threads. Responses are requested with gzip/deflate and
+        decoded transparently.
+
+        Data Used:
+        - pool_size (int)
+            DESCRIPTION: The maximum number of idle connections kept per host
+        - timeout (float)
+            DESCRIPTION: The socket read timeout in seconds
+        - connect_timeout (float)
+            DESCRIPTION: The connect timeout in seconds, defaults to timeout
+        - headers (dict)
+            DESCRIPTION: Extra headers sent with every request
+        - coalesce (bool)
+            DESCRIPTION: Whether concurrent GETs of the same URL share a single request
+        - limiter (RateLimiter)
+            DESCRIPTION: Throttles requests per host, None to send them unthrottled
+        - retry (RetryPolicy)
+            DESCRIPTION: Retries 429/5xx responses and connection errors, None to never retry
+        - hedge (HedgePolicy)
+            DESCRIPTION: Sends a duplicate of requests slower than usual, None to never hedge
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT, connect_timeout: float = None, headers: dict = None, coalesce: bool = True,
+                 limiter: RateLimiter = None, retry: RetryPolicy = None, hedge: HedgePolicy = None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout or timeout
+        self.headers = {
+            "User-Agent": USER_AGENT,
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+        self.headers.update(headers or {})
+        self.ssl_context = ssl.create_default_context()
+        self.pools = {}
+        self.lock = threading.Lock()
+        self.flights = SingleFlight() if coalesce else None
+        self.limiter = limiter
+        self.retry = retry
+        self.hedge = hedge
+        self.hedge_executor = None
+
+    def get(self, url: str, headers: dict = None, until=None) -> Response:
+
+        """
+        * GET a URL, following redirects
+
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL to request
+            - headers (dict)
+                DESCRIPTION: Extra headers for this request
+            - until (callable)
+                DESCRIPTION: Streams the body and stops reading (closing the connection)
+                as soon as until(body read so far, scan) is true, None to read the whole body.
+                scan is a dict kept for the whole body, where until can record how far
+                it already scanned (see extractor.head_complete)
+
+            Data Returned:
+            - response (Response)
+                DESCRIPTION: The final response, raises urllib.error.HTTPError for 4xx/5xx codes
+                and urllib.error.URLError when the host can't be reached
+        """
+
+        # Requests with their own headers may not be interchangeable, only
+        # plain GETs are coalesced
+        if self.flights is not None and not headers:
+            return self.flights.do(url if until is None else (url, until), self._get, url, headers, until)
+        return self._get(url, headers, until)
+
+    def _get(self, url: str, headers: dict = None, until=None) -> Response:
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self.request(url, headers, until)
+            location = response.headers.get("location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if response.status >= 400:
+                increment("http_errors")
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+            return response
+        raise urllib.error.URLError(f"too many redirects for {url}")
+
+    def request(self, url: str, headers: dict = None, until=None) -> Response:
+
+        """
+        * Send a GET request without following redirects, throttled and retried per host
+
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL to request
+            - headers (dict)
+                DESCRIPTION: Extra headers for this request
+            - until (callable)
+                DESCRIPTION: Stops reading the body once it returns true, see get
+
+            Data Returned:
+            - response (Response)
+                DESCRIPTION: The response of the last attempt
+        """
+
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire(host)
+            start = time.monotonic()
+            try:
+                response = self._send(host, url, headers, until)
+            except urllib.error.URLError:
+                if self.limiter is not None:
+                    self.limiter.release(host, None, time.monotonic() - start)
+                if self.retry is None or not self.retry.should_retry(attempt):
+                    increment("request_errors")
+                    raise
+                increment("retries")
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+
+            retry_after = parse_retry_after(response.headers.get("retry-after")) if response.status in (429, 503) else None
+            if self.limiter is not None:
+                self.limiter.release(host, response.status, time.monotonic() - start, retry_after)
+            if self.retry is None or not self.retry.should_retry(attempt, response.status):
+                return response
+            increment("retries")
+            time.sleep(self.retry.delay(attempt, retry_after))
+            attempt += 1
+
+    def _send(self, host: str, url: str, headers: dict = None, until=None) -> Response:
+        if self.hedge is None:
+            return self.send(url, headers, until)
+        if self.hedge_executor is None:
+            with self.lock:
+                if self.hedge_executor is None:
+                    self.hedge_executor = concurrent.futures.ThreadPoolExecutor(HEDGE_WORKERS, thread_name_prefix="hedge")
+        if self.limiter is None:
+            return hedged_call(self.hedge, self.hedge_executor, self.send, url, headers, until)
+        # A hedge takes its own limiter slot, and is skipped when the host has none to spare
+        return hedged_call(self.hedge, self.hedge_executor, self.send, url, headers, until,
+                           hedge_function=lambda *args: self._send_hedge(host, *args),
+                           admit=lambda: self.limiter.try_acquire(host) == 0)
+
+    def _send_hedge(self, host: str, url: str, headers: dict = None, until=None) -> Response:
+        start = time.monotonic()
+        try:
+            response = self.send(url, headers, until)
+        except urllib.error.URLError:
+            self.limiter.release(host, None, time.monotonic() - start)
+            raise
+        retry_after = parse_retry_after(response.headers.get("retry-after")) if response.status in (429, 503) else None
+        self.limiter.release(host, response.status, time.monotonic() - start, retry_after)
+        return response
+
+    def send(self, url: str, headers: dict = None, until=None) -> Response:
+
+        """
+        * Send a single GET request on a pooled connection, without following redirects
+        """
+
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        request_headers = dict(self.headers, **(headers or {}))
+
+        conn, reused = self._acquire(key)
+        start = time.perf_counter()
+        received = 0
+        def read(size: int) -> bytes:
+            nonlocal received
+            chunk = resp.read1(size)
+            received += len(chunk)
+            return chunk
+
+        try:
+            try:
+                conn.request("GET", path, headers=request_headers)
+                resp = conn.getresponse()
+            except STALE_ERRORS:
+                if not reused:
+                    raise
+                # The server dropped the idle connection, retry once on a new one
+                conn.close()
+                conn = self._connect(key)
+                conn.request("GET", path, headers=request_headers)
+                resp = conn.getresponse()
+            if until is None:
+                raw = resp.read()
+                received = len(raw)
+                body = decode_body(raw, resp.headers.get("content-encoding"))
+                truncated = False
+            else:
+                body, truncated = read_until(read, until, resp.headers.get("content-encoding"))
+                truncated = truncated and not resp.isclosed()
+        except (OSError, http.client.HTTPException, zlib.error) as e:
+            conn.close()
+            raise urllib.error.URLError(e)
+
+        record_stage("download", start)
+        record_request(received)
+
+        # A body that wasn't read to the end leaves the connection unusable
+        if resp.will_close or truncated:
+            conn.close()
+        else:
+            self._release(key, conn)
+
+        return Response(url, resp.status, resp.reason, resp.headers, body, truncated)
+
+    def close(self) -> None:
+
+        """
+        * Close every idle connection of the session
+        """
+
+        with self.lock:
+            pools, self.pools = self.pools, {}
+        for pool in pools.values():
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+    def _pool(self, key: tuple) -> queue.LifoQueue:
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = self.pools[key] = queue.LifoQueue(self.pool_size)
+            return pool
+
+    def _acquire(self, key: tuple) -> tuple:
+        try:
+            return self._pool(key).get_nowait(), True
+        except queue.Empty:
+            return self._connect(key), False
+
+    def _release(self, key: tuple, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._pool(key).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _connect(self, key: tuple) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=self.connect_timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.connect_timeout)
+        start = time.perf_counter()
+        try:
+            conn.connect()
+        except OSError as e:
+            conn.close()
+            raise urllib.error.URLError(e)
+        record_stage("connect", start)
+        conn.sock.settimeout(self.timeout)
+        return conn
+
+def decode_body(body: bytes, encoding: str = None) -> bytes:
+
+    """
+    * Decode a gzip or deflate encoded response body
+
+        Data Used:
+        - body (bytes)
+            DESCRIPTION: The raw response body
+        - encoding (str)
+            DESCRIPTION: The value of the Content-Encoding header
+
+        Data Returned:
+        - body (bytes)
+            DESCRIPTION: The decoded response body
+    """
+
+    encoding = (encoding or "").lower()
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+class BodyDecoder:
+
+    """
+    * Incremental version of decode_body, for bodies read chunk by chunk
+
+        Data Used:
+        - encoding (str)
+            DESCRIPTION: The value of the Content-Encoding header
+    """
+
+    def __init__(self, encoding: str = None):
+        self.encoding = (encoding or "").lower()
+        if self.encoding == "gzip":
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            self.decompressor = zlib.decompressobj()
+        else:
+            self.decompressor = None
+        self.started = False
+
+    def feed(self, chunk: bytes) -> bytes:
+        if self.decompressor is None:
+            return chunk
+        if not self.started and self.encoding == "deflate":
+            # Some servers send raw deflate streams without the zlib header
+            self.started = True
+            try:
+                return self.decompressor.decompress(chunk)
+            except zlib.error:
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self.decompressor.decompress(chunk)
+
+    def flush(self) -> bytes:
+        return self.decompressor.flush() if self.decompressor is not None else b""
+
+def read_until(read, until, encoding: str = None, chunk_size: int = STREAM_CHUNK_SIZE) -> tuple:
+
+    """
+    * Read and decode a body chunk by chunk, stopping as soon as enough of it was read
+
+        Data Used:
+        - read (callable)
+            DESCRIPTION: Returns up to chunk_size raw bytes of the body, b"" at its end
+        - until (callable)
+            DESCRIPTION: Gets the decoded body read so far and a dict kept across
+            the chunks of the body, returns true when it is enough
+        - encoding (str)
+            DESCRIPTION: The value of the Content-Encoding header
+
+        Data Returned:
+        - body (bytes)
+            DESCRIPTION: The decoded body read so far
+        - truncated (bool)
+            DESCRIPTION: Whether reading stopped before the end of the body
+    """
+
+    decoder = BodyDecoder(encoding)
+    body = bytearray()
+    scan = {}
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            body += decoder.flush()
+            return bytes(body), False
+        body += decoder.feed(chunk)
+        if until(body, scan):
+            return bytes(body), True
+
+def get_session() -> Session:
+
+    """
+    * Get the process-wide Session used by Spotify and Deezer
+
+        Data Returned:
+        - session (Session)
+            DESCRIPTION: The shared session, created on first use
+    """
+
+    global _default_session
+    if _default_session is None:
+        with _default_lock:
+            if _default_session is None:
+                _default_session = Session(limiter=get_limiter(), retry=RetryPolicy())
+    return _default_session
+
+def set_session(session: Session) -> None:
+
+    """
+    * Replace the process-wide Session, e.g. to change the pool size or timeouts
+
+        Data Used:
+        - session (Session)
+            DESCRIPTION: The session Spotify and Deezer should use from now on
+    """
+
+    global _default_session
+    with _default_lock:
+        previous, _default_session = _default_session, session
+    if previous is not None and previous is not session:
+        previous.close()
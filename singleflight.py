@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+
+    """
+    * Coalesce concurrent calls for the same key across threads
+
+        The first caller for a key runs the function, every caller that
+        arrives while it is running waits for it and gets the same result
+        (or the same exception).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, function, *args):
+
+        """
+        * Run function(*args) once for all concurrent callers of key
+
+            Data Used:
+            - key (hashable)
+                DESCRIPTION: What identifies identical calls, usually the URL
+            - function (callable)
+                DESCRIPTION: The function to run
+
+            Data Returned:
+            - result
+                DESCRIPTION: The result of the single shared call
+        """
+
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = _Call()
+                leader = True
+                self.executed += 1
+            else:
+                leader = False
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = function(*args)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self.calls)}
+
+class AsyncSingleFlight:
+
+    """
+    * Coalesce concurrent calls for the same key across asyncio tasks
+
+        The shared call runs in its own task, so cancelling one of the
+        waiting callers doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, function, *args):
+
+        """
+        * Await function(*args) once for all concurrent callers of key
+
+            Data Used:
+            - key (hashable)
+                DESCRIPTION: What identifies identical calls, usually the URL
+            - function (coroutine function)
+                DESCRIPTION: The coroutine function to run
+
+            Data Returned:
+            - result
+                DESCRIPTION: The result of the single shared call
+        """
+
+        task = self.tasks.get(key)
+        if task is None:
+            task = self.tasks[key] = asyncio.ensure_future(function(*args))
+            task.add_done_callback(lambda done: self.tasks.pop(key) if self.tasks.get(key) is done else None)
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self.tasks)}
@@ -1,35 +1,54 @@
 import re
+import asyncio
 import logging
-import urllib.request
+import functools
+import urllib.error
 
-from bs4 import BeautifulSoup
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
 
+from batch import DEFAULT_ASYNC_WORKERS, DEFAULT_DEDUPE_ENTRIES, DEFAULT_WORKERS, async_lookup, async_run_batch, run_batch, run_lookups
+from async_http import AsyncClient, get_client
+from session import get_session
+from extractor import Page, parse_page, stop_condition
+from records import AlbumData, LazyAlbum, SongData
+from normalize import normalize_for
+from metrics import stage, timed, traced
+from cache import MISS, CachedFailure, MetadataCache, album_cache, artist_cache, conditional_headers, get_validators
+
+SP_ALBUM_URL = "https://open.spotify.com/album/{}"
 SP_URL_REGEX = re.compile('https://open\.spotify\.com/(?P<type>[^/]*)/(?P<id>[^?]*)')
 
 class Spotify:
     
-    def __init__(self, url: str, logger: logging.Logger):
+    PROVIDER = "spotify"
+    
+    def __init__(self, url: str, logger: logging.Logger, cache: MetadataCache = None, lazy_album: bool = False):
         
         self.logger = logger
+        self.error = None
+        self.cache = cache
+        self.validators = {}
+        self.lazy_album = lazy_album
         self.experimental = False
         
-        if url.find("open.spotify.com") != -1:
-            logger.debug("Spotify URL detected!")
-            self.found_id = SP_URL_REGEX.search(url.split("?")[0]).group("id")
-            if self.found_id.find("/") != -1:
-                self.found_id = self.found_id.split("/")[1]
-        else:
-            logger.debug("Spotify ID detected!")
-            self.found_id = url
+        # An input that can't be read is kept as the ID, the lookups then fail with input_error
+        key = normalize_for(url, self.PROVIDER)
+        self.input_error = None if key is not None else ValueError(f"Not a Spotify URL, URI or ID: {url!r}")
+        logger.debug("Spotify ID detected!" if key is None or key[2] == url.strip() else "Spotify URL detected!")
+        self.found_id = key[2] if key is not None else url.strip()
         
         self.song_url = f"https://open.spotify.com/track/{self.found_id}"
-        self.album_url = f"https://open.spotify.com/album/{self.found_id}"
+        self.album_url = SP_ALBUM_URL.format(self.found_id)
         
         logger.debug(f"Song ID: {self.found_id}")
         logger.debug(f"Song URL: {self.song_url}")
         logger.debug(f"Album URL: {self.album_url}")
         
-    def get_song(self) -> dict:
+    @traced
+    def get_song(self) -> SongData:
         
         """
         * Get the metadata of a Spotify song
@@ -47,18 +66,38 @@ class Spotify:
                 DESCRIPTION: The date the song was released
         """
         
+        cached = self.get_cached("song", self.found_id)
+        if cached is not MISS:
+            return cached
+        
         try:
-            soup = self.get_webpage(self.song_url)
-            self.metatags = soup.findAll("meta")
-            metadata = self.get_metadata(self.metatags, "song")
-            self.album_url = f"{metadata.album}"
-            metadata.album = self.get_album()
+            self.check_input()
+            page, cached = self.get_revalidated_page("song", self.found_id, self.song_url)
+            if cached is not MISS:
+                return cached
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.song_url}")
+            self.metatags = page.metatags
+            metadata = self.get_metadata(self.metatags, "song", get_artist=self.get_cached_artist)
+            self.album_url = self.get_album_page_url(metadata.album)
+            if self.lazy_album:
+                # The song is cached once its album is fetched
+                metadata = metadata.replace(album=LazyAlbum(self.album_url, self.get_album, functools.partial(self.set_cached_song, metadata)))
+            else:
+                metadata = metadata.replace(album=self.get_album())
+            
+            # Songs are only cached once their album is known
+            if isinstance(metadata.album, AlbumData) and not isinstance(metadata.album, LazyAlbum):
+                self.set_cached("song", self.found_id, metadata)
             return metadata
         except Exception as e:
+            self.error = e
+            self.set_cached_failure("song", self.found_id, e)
             self.logger.error(f"Failed to get webpage: {e}")
             return False
     
-    def get_album(self) -> dict:
+    @traced
+    def get_album(self) -> AlbumData:
     
         """
         * Get the metadata of a Spotify album
@@ -72,17 +111,331 @@ class Spotify:
                 DESCRIPTION: The description of the album
         """
 
+        album_id = self.get_album_id()
+        cached = self.get_cached("album", album_id)
+        if cached is not MISS:
+            return cached
+        
+        # Albums are shared by every song on them, most lookups hit this
+        album = album_cache.get(self.album_url)
+        if album is not MISS:
+            return album
+        
         try:
-            soup = self.get_webpage(self.album_url)
-            self.metatags = soup.findAll("meta")
-            metadata = self.get_metadata(self.metatags, "album")
+            self.check_input()
+            page, cached = self.get_revalidated_page("album", album_id, self.album_url)
+            if cached is not MISS:
+                return cached
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.album_url}")
+            self.metatags = page.metatags
+            metadata = self.get_metadata(self.metatags, "album", get_artist=self.get_cached_artist)
+            album_cache.set(self.album_url, metadata)
+            self.set_cached("album", album_id, metadata)
             return metadata
         except Exception as e:
+            self.error = e
+            self.set_cached_failure("album", album_id, e)
             self.logger.error(f"Failed to get webpage: {e}")
             return False
     
+    @traced
+    def get_track(self, album: AlbumData) -> SongData:
+        
+        """
+        * Get the metadata of a Spotify song whose album is already known
+        
+            Data Used:
+            - album (AlbumData)
+                DESCRIPTION: The album of the song, used instead of fetching the album page
+                
+            Data Returned:
+            - song_data (SongData)
+                DESCRIPTION: The metadata of the song
+        """
+        
+        cached = self.get_cached("song", self.found_id)
+        if cached is not MISS:
+            return cached
+        
+        try:
+            page, cached = self.get_revalidated_page("song", self.found_id, self.song_url)
+            if cached is not MISS:
+                return cached.replace(album=album)
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.song_url}")
+            self.metatags = page.metatags
+            metadata = self.get_metadata(self.metatags, "song", get_artist=self.get_cached_artist).replace(album=album)
+            self.set_cached("song", self.found_id, metadata)
+            return metadata
+        except Exception as e:
+            self.error = e
+            self.set_cached_failure("song", self.found_id, e)
+            self.logger.error(f"Failed to get webpage: {e}")
+            return False
+    
+    def get_track_list(self) -> tuple:
+        
+        """
+        * Get the metadata and the track URLs of the Spotify album this instance points to
+        
+            Data Returned:
+            - album_data (AlbumData)
+                DESCRIPTION: The metadata of the album
+            - track_urls (list)
+                DESCRIPTION: The URLs of the album's tracks, in album order
+        """
+        
+        self.check_input()
+        page = self.get_page(self.album_url)
+        if not page:
+            raise ConnectionError(f"Could not fetch {self.album_url}")
+        self.metatags = page.metatags
+        
+        album_id = self.get_album_id()
+        album = self.get_cached("album", album_id)
+        if album is MISS or album is False:
+            album = album_cache.get(self.album_url)
+        if album is MISS:
+            album = self.get_metadata(self.metatags, "album", get_artist=self.get_cached_artist)
+            album_cache.set(self.album_url, album)
+            self.set_cached("album", album_id, album)
+        return album, self.get_track_urls(self.metatags)
+    
+    def check_input(self) -> None:
+        
+        """
+        * Raise the error of an input the constructor couldn't read, so the lookups fail (and log it) like any other
+        """
+        
+        if self.input_error is not None:
+            raise self.input_error
+    
+    def get_album_id(self) -> str:
+        
+        """
+        * Get the ID of the album page this instance points to
+        """
+        
+        return self.album_url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+    
+    def get_cached(self, metadata_type: str, found_id: str):
+        
+        """
+        * Get a lookup from the cache, if this instance has one
+        
+            Data Used:
+            - metadata_type (str)
+                DESCRIPTION: The type of metadata ("song" or "album")
+            - found_id (str)
+                DESCRIPTION: The ID of the song or album
+                
+            Data Returned:
+            - metadata (SongData or AlbumData)
+                DESCRIPTION: The cached metadata, False for a remembered failure, or MISS
+        """
+        
+        if self.cache is None:
+            return MISS
+        cached = self.cache.get(self.PROVIDER, metadata_type, found_id)
+        if isinstance(cached, CachedFailure):
+            self.error = cached
+            self.logger.debug(f"Cached failure for {metadata_type} {found_id}: {cached}")
+            return False
+        return cached
+    
+    def set_cached(self, metadata_type: str, found_id: str, metadata) -> None:
+        
+        """
+        * Store a successful lookup in the cache, if this instance has one
+        """
+        
+        if self.cache is not None:
+            validators, size = self.validators.get((metadata_type, found_id), (None, 0))
+            self.cache.set(self.PROVIDER, metadata_type, found_id, metadata, validators=validators, size=size)
+    
+    def set_cached_song(self, metadata: SongData, album) -> None:
+        
+        """
+        * Store a song looked up with lazy_album=True once its album is known, if this instance has a cache
+        
+            Data Used:
+            - metadata (SongData)
+                DESCRIPTION: The song, without its album
+            - album (AlbumData)
+                DESCRIPTION: The album the LazyAlbum of the song resolved to, False if it couldn't be fetched
+        """
+        
+        if isinstance(album, AlbumData):
+            self.set_cached("song", self.found_id, metadata.replace(album=album))
+    
+    def set_cached_failure(self, metadata_type: str, found_id: str, error: Exception) -> None:
+        
+        """
+        * Remember a lookup whose webpage couldn't be fetched, if this instance has a cache
+        """
+        
+        if self.cache is not None and isinstance(error, ConnectionError) and not isinstance(error, CachedFailure):
+            self.cache.set_failure(self.PROVIDER, metadata_type, found_id, error)
+    
+    def get_cached_artist(self, artist_url: str) -> str:
+        
+        """
+        * Get the name of an artist like get_artist, keeping it in the cache of this instance
+        
+            The name is stored with the validators of the artist page, so once
+            it expires the page is revalidated like songs and albums are.
+        
+            Data Used:
+            - artist_url (str)
+                DESCRIPTION: The URL of the artist page
+                
+            Data Returned:
+            - artist (str)
+                DESCRIPTION: The name of the artist
+        """
+        
+        if self.cache is None:
+            return Spotify.get_artist(artist_url)
+        artist = artist_cache.get(artist_url)
+        if artist is not MISS:
+            return artist
+        
+        with stage("artist"):
+            artist_id = artist_url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+            artist = self.get_cached("artist", artist_id)
+            if artist is MISS or artist is False:
+                page, artist = self.get_revalidated_page("artist", artist_id, artist_url)
+                if artist is MISS:
+                    if not page:
+                        raise ConnectionError(f"Could not fetch {artist_url}")
+                    artist = self.get_artist_name(page.metatags)
+                    self.set_cached("artist", artist_id, artist)
+            artist_cache.set(artist_url, artist)
+            return artist
+    
+    def get_revalidated_page(self, metadata_type: str, found_id: str, url: str, app_state: bool = False) -> tuple:
+        
+        """
+        * Get the webpage of a lookup, revalidating its expired cache entry instead of downloading it again
+        
+            When the cache holds the lookup with the validators of its webpage,
+            the webpage is requested with If-None-Match/If-Modified-Since, and
+            a 304 answer keeps the cached metadata for another TTL.
+        
+            Data Used:
+            - metadata_type (str)
+                DESCRIPTION: The type of metadata ("song", "album" or "artist")
+            - found_id (str)
+                DESCRIPTION: The ID of the song, album or artist
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - app_state (bool)
+                DESCRIPTION: Whether to also decode the Deezer app state script
+                
+            Data Returned:
+            - page (Page)
+                DESCRIPTION: The meta tags (and app state) of the webpage, None if it is unchanged, False if the request failed
+            - cached (SongData, AlbumData or str)
+                DESCRIPTION: The cached metadata if the webpage is unchanged, else MISS
+        """
+        
+        stale = self.cache.get_stale(self.PROVIDER, metadata_type, found_id) if self.cache is not None else MISS
+        resp = self.get_response(url, stop_condition(app_state), conditional_headers(stale[1]) if stale is not MISS else None)
+        if resp is False:
+            return False, MISS
+        if stale is not MISS:
+            self.cache.count_revalidation()
+        if resp.status == 304:
+            self.logger.debug(f"{url} not modified, keeping the cached {metadata_type}")
+            self.cache.refresh(self.PROVIDER, metadata_type, found_id)
+            return None, stale[0]
+        
+        validators = get_validators(resp.headers)
+        if validators:
+            self.validators[(metadata_type, found_id)] = (validators, len(resp.body))
+        return parse_page(resp.body, app_state), MISS
+    
+    @classmethod
+    def get_songs(cls, urls, logger: logging.Logger, max_workers: int = DEFAULT_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+        
+        """
+        * Get the metadata of many Spotify songs on a bounded thread pool
+        
+            Data Used:
+            - urls (iterable)
+                DESCRIPTION: The Spotify URLs or IDs of the songs
+            - max_workers (int)
+                DESCRIPTION: The number of songs fetched at the same time
+            - dedupe (int)
+                DESCRIPTION: How many recent inputs are remembered so duplicates are fetched once, 0 to fetch every input
+            - options (dict)
+                DESCRIPTION: Extra arguments for every Spotify instance (e.g. cache)
+                
+            Data Returned:
+            - results (list of BatchResult)
+                DESCRIPTION: One result per URL in input order, holding either the data or the error
+        """
+        
+        return run_batch(cls, "get_song", urls, logger, max_workers, dedupe, **options)
+    
+    @classmethod
+    def get_albums(cls, urls, logger: logging.Logger, max_workers: int = DEFAULT_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+        
+        """
+        * Get the metadata of many Spotify albums on a bounded thread pool
+        
+            Data Used:
+            - urls (iterable)
+                DESCRIPTION: The Spotify URLs or IDs of the albums
+            - max_workers (int)
+                DESCRIPTION: The number of albums fetched at the same time
+            - dedupe (int)
+                DESCRIPTION: How many recent inputs are remembered so duplicates are fetched once, 0 to fetch every input
+            - options (dict)
+                DESCRIPTION: Extra arguments for every Spotify instance (e.g. cache)
+                
+            Data Returned:
+            - results (list of BatchResult)
+                DESCRIPTION: One result per URL in input order, holding either the data or the error
+        """
+        
+        return run_batch(cls, "get_album", urls, logger, max_workers, dedupe, **options)
+    
+    @classmethod
+    def get_album_tracks(cls, album_url: str, logger: logging.Logger, max_workers: int = DEFAULT_WORKERS, **options) -> list:
+        
+        """
+        * Get the metadata of every song of a Spotify album
+        
+            The album page (and its artist page) is fetched once and shared by
+            every track, only the track pages are fetched on top of it, on a
+            bounded thread pool.
+        
+            Data Used:
+            - album_url (str)
+                DESCRIPTION: The Spotify URL or ID of the album
+            - max_workers (int)
+                DESCRIPTION: The number of track pages fetched at the same time
+            - options (dict)
+                DESCRIPTION: Extra arguments for every Spotify instance (e.g. cache)
+                
+            Data Returned:
+            - results (list of BatchResult)
+                DESCRIPTION: One result per track in album order, or False if the album page couldn't be fetched
+        """
+        
+        instance = cls(album_url, logger, **options)
+        try:
+            album, track_urls = instance.get_track_list()
+        except Exception as e:
+            instance.error = e
+            logger.error(f"Failed to get album tracks: {e}")
+            return False
+        return run_lookups(cls, "get_track", track_urls, logger, max_workers, options, (album,))
+    
     @staticmethod
-    def get_webpage(song_url) -> BeautifulSoup:
+    def get_webpage(song_url) -> "BeautifulSoup":
         
         """
         * Get the HTML of a webpage
@@ -96,8 +449,79 @@ class Spotify:
                 DESCRIPTION: The HTML of the webpage
         """
         
+        if BeautifulSoup is None:
+            raise ImportError("get_webpage needs beautifulsoup4, install it with: pip install beautifulsoup4")
+        
+        document = Spotify.get_html(song_url)
+        if document is False:
+            return False
+        return BeautifulSoup(document, "html.parser")
+    
+    @staticmethod
+    def get_page(url: str, app_state: bool = False) -> Page:
+        
+        """
+        * Get the meta tags of a webpage without building a full HTML tree
+        
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - app_state (bool)
+                DESCRIPTION: Whether to also decode the Deezer app state script
+                
+            Data Returned:
+            - page (Page)
+                DESCRIPTION: The meta tags (and app state) of the webpage
+        """
+        
+        document = Spotify.get_html(url, stop_condition(app_state))
+        if document is False:
+            return False
+        return parse_page(document, app_state)
+    
+    @staticmethod
+    def get_html(song_url: str, until=None) -> bytes:
+        
+        """
+        * Download the raw HTML of a webpage
+        
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - until (callable)
+                DESCRIPTION: Stops the download once until(html read so far) is true, see Session.get
+                
+            Data Returned:
+            - html (bytes)
+                DESCRIPTION: The decoded response body, or False if the request failed
+        """
+        
+        resp = Spotify.get_response(song_url, until)
+        if resp is False:
+            return False
+        return resp.body
+    
+    @staticmethod
+    def get_response(song_url: str, until=None, headers: dict = None):
+        
+        """
+        * Send a GET request for a webpage
+        
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - until (callable)
+                DESCRIPTION: Stops the download once until(html read so far) is true, see Session.get
+            - headers (dict)
+                DESCRIPTION: Extra headers, e.g. the conditional headers of a revalidation
+                
+            Data Returned:
+            - response (Response)
+                DESCRIPTION: The 200 response (or the 304 answer to a conditional request), or False if the request failed
+        """
+        
         try:
-            resp = urllib.request.urlopen(song_url)
+            resp = get_session().get(song_url, headers, until)
         except urllib.error.HTTPError:
             logging.error("got error urllib.error.HTTPError with " + song_url)
             return False
@@ -105,14 +529,104 @@ class Spotify:
             logging.error("got error urllib.error.URLError with " + song_url)
             return False
 
-        if resp.code != 200:
+        if resp.status == 304 and headers:
+            return resp
+        if resp.status != 200:
             logging.error("got httperror 200 with " + song_url)
             return False
         else:
-            return BeautifulSoup(resp.read(), "html.parser")
+            return resp
     
     @staticmethod
-    def get_metadata(found_tags: list, metadata_type: str = "song") -> dict:
+    @timed("artist")
+    def get_artist(artist_url: str) -> str:
+        
+        """
+        * Get the name of a Spotify artist from the artist page
+        
+            Data Used:
+            - artist_url (str)
+                DESCRIPTION: The URL of the artist page
+                
+            Data Returned:
+            - artist (str)
+                DESCRIPTION: The name of the artist
+        """
+        
+        artist = artist_cache.get(artist_url)
+        if artist is not MISS:
+            return artist
+        
+        page = Spotify.get_page(artist_url)
+        if not page:
+            raise ConnectionError(f"Could not fetch {artist_url}")
+        artist = Spotify.get_artist_name(page.metatags)
+        artist_cache.set(artist_url, artist)
+        return artist
+    
+    @staticmethod
+    def get_album_page_url(album) -> str:
+        
+        """
+        * Get the URL of an album page from any URL, URI or ID of the album
+        
+            Every lookup builds album URLs with it, so they share album_cache entries.
+        
+            Data Used:
+            - album (str)
+                DESCRIPTION: A Spotify album URL, URI or ID
+                
+            Data Returned:
+            - album_url (str)
+                DESCRIPTION: The album URL, album itself if it isn't a Spotify album
+        """
+        
+        key = normalize_for(str(album), Spotify.PROVIDER, "album")
+        if key is None or key[1] != "album":
+            return str(album)
+        return SP_ALBUM_URL.format(key[2])
+    
+    @staticmethod
+    def get_artist_name(found_tags: list) -> str:
+        
+        """
+        * Get the name of an artist from the tags of the artist page
+        """
+        
+        artist = None
+        for tag in found_tags:
+            if tag.get("property") == "og:title":
+                artist = tag.get("content")
+        return artist
+    
+    @staticmethod
+    def get_artist_url(found_tags: list) -> str:
+        
+        """
+        * Get the URL of the artist page linked from a song or album page
+        """
+        
+        for tag in found_tags:
+            if tag.get("name") == "music:musician":
+                return tag.get("content")
+        return None
+    
+    @staticmethod
+    def get_track_urls(found_tags: list) -> list:
+        
+        """
+        * Get the URLs of the tracks listed on an album page
+        """
+        
+        track_urls = []
+        for tag in found_tags:
+            if tag.get("name") == "music:song" and tag.get("content") and tag.get("content") not in track_urls:
+                track_urls.append(tag.get("content"))
+        return track_urls
+    
+    @staticmethod
+    @timed("extract")
+    def get_metadata(found_tags: list, metadata_type: str = "song", get_artist=None) -> SongData:
         
         """
         * Get the metadata of a Spotify song
@@ -122,16 +636,20 @@ class Spotify:
                 DESCRIPTION: The metadata tags found on the webpage
             - metadata_type (str)
                 DESCRIPTION: The type of metadata to get
+            - get_artist (callable)
+                DESCRIPTION: Resolves an artist URL to its name, defaults to fetching the artist page
                 
             Data Returned:
-            - song_data (dict)
+            - song_data (SongData)
                 DESCRIPTION: The metadata of the song
-            - album_data (dict)
+            - album_data (AlbumData)
                 DESCRIPTION: The metadata of the album
         """
         
+        get_artist = get_artist or Spotify.get_artist
+        
         if metadata_type == "song":
-            found_data = SongData()
+            found_data = {}
             
             """
             * SongMetadata Tags:
@@ -148,31 +666,31 @@ class Spotify:
             for tag in found_tags:
                 # artwork_url
                 if tag.get("property") == "og:image":
-                    found_data.artwork_url = tag.get("content")
+                    found_data["artwork_url"] = tag.get("content")
                 # duration
                 elif tag.get("name") == "music:duration":
-                    found_data.duration = int(tag.get("content"))
+                    found_data["duration"] = int(tag.get("content"))
                 # genre
                 elif tag.get("name") == "music:genre":
-                    found_data.genre = tag.get("content")
+                    found_data["genre"] = tag.get("content")
                 # album
                 elif tag.get("name") == "music:album":
-                    found_data.album = tag.get("content")
+                    found_data["album"] = tag.get("content")
                 # title
                 elif tag.get("name") == "music:song":
-                    found_data.title = tag.get("content")
+                    found_data["title"] = tag.get("content")
                 # artist
                 elif tag.get("name") == "music:musician_description":
-                    found_data.artist = tag.get("content")
+                    found_data["artist"] = tag.get("content")
                 # release_date
                 elif tag.get("name") == "music:release_date":
-                    found_data.release_date = tag.get("content")
+                    found_data["release_date"] = tag.get("content")
                 # title
                 elif tag.get("property") == "og:title":
-                    found_data.title = tag.get("content")
+                    found_data["title"] = tag.get("content")
             
         elif metadata_type == "album":
-            found_data = AlbumData()
+            found_data = {}
             
             """
             * AlbumMetadata Tags:
@@ -187,64 +705,283 @@ class Spotify:
             for tag in found_tags:
                 # artwork_url
                 if tag.get("property") == "og:image":
-                    found_data.artwork_url = tag.get("content")
+                    found_data["artwork_url"] = tag.get("content")
                 # title
                 elif tag.get("property") == "og:title":
-                    found_data.title = tag.get("content")
+                    found_data["title"] = tag.get("content")
                 # artist
                 elif tag.get("name") == "music:musician":
-                    soup = Spotify.get_webpage(tag.get("content"))
-                    tags = soup.findAll("meta")
-                    for tag in tags:
-                        if tag.get("property") == "og:title":
-                            found_data.artist = tag.get("content")
+                    found_data["artist"] = get_artist(tag.get("content"))
                 # description
                 elif tag.get("property") == "og:description":
-                    found_data.description = tag.get("content")
+                    found_data["description"] = tag.get("content")
                 # release_date
                 elif tag.get("name") == "music:release_date":
-                    found_data.release_date = tag.get("content")
+                    found_data["release_date"] = tag.get("content")
                     
-        # Refill NoneType values with "Unknown"
-        for key, value in found_data.__dict__.items():
-            if value == None:
-                found_data.__dict__[key] = "Unknown"
+        # Leave NoneType values out, they are filled with UNKNOWN
+        found_data = {key: value for key, value in found_data.items() if value is not None}
+        
+        if metadata_type == "song":
+            return SongData(**found_data)
+        return AlbumData(**found_data)
+        
+class AsyncSpotify(Spotify):
+    
+    """
+    * asyncio version of Spotify
+    
+        get_song, get_album, get_songs and get_albums are awaitable. Requests
+        go through an AsyncClient, whose semaphore limits how many of them are
+        in flight across every instance sharing it. Expired cache entries
+        are downloaded again, not revalidated: AsyncClient sends no
+        conditional headers.
+    """
+    
+    def __init__(self, url: str, logger: logging.Logger, client: AsyncClient = None, cache: MetadataCache = None):
+        
+        super().__init__(url, logger, cache)
+        self.client = client
+        
+    @traced
+    async def get_song(self) -> SongData:
+        
+        """
+        * Get the metadata of a Spotify song without blocking the event loop
+        """
+        
+        cached = self.get_cached("song", self.found_id)
+        if cached is not MISS:
+            return cached
+        
+        try:
+            self.check_input()
+            page = await self.get_page(self.song_url)
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.song_url}")
+            self.metatags = page.metatags
+            metadata = self.get_metadata(self.metatags, "song")
+            self.album_url = self.get_album_page_url(metadata.album)
+            metadata = metadata.replace(album=await self._get_cached_album({}, self.get_artist_url(self.metatags)))
+            self.set_cached("song", self.found_id, metadata)
+            return metadata
+        except Exception as e:
+            self.error = e
+            self.set_cached_failure("song", self.found_id, e)
+            self.logger.error(f"Failed to get webpage: {e}")
+            return False
+    
+    @traced
+    async def get_album(self) -> AlbumData:
+        
+        """
+        * Get the metadata of a Spotify album without blocking the event loop
+        """
+        
+        album_id = self.get_album_id()
+        cached = self.get_cached("album", album_id)
+        if cached is not MISS:
+            return cached
+        
+        try:
+            self.check_input()
+            metadata = await self._get_album({})
+            self.set_cached("album", album_id, metadata)
+            return metadata
+        except Exception as e:
+            self.error = e
+            self.set_cached_failure("album", album_id, e)
+            self.logger.error(f"Failed to get webpage: {e}")
+            return False
+    
+    @traced
+    async def get_track(self, album: AlbumData) -> SongData:
+        
+        """
+        * Get the metadata of a Spotify song whose album is already known without blocking the event loop
+        """
+        
+        cached = self.get_cached("song", self.found_id)
+        if cached is not MISS:
+            return cached
+        
+        try:
+            page = await self.get_page(self.song_url)
+            if not page:
+                raise ConnectionError(f"Could not fetch {self.song_url}")
+            self.metatags = page.metatags
+            metadata = self.get_metadata(self.metatags, "song").replace(album=album)
+            self.set_cached("song", self.found_id, metadata)
+            return metadata
+        except Exception as e:
+            self.error = e
+            self.set_cached_failure("song", self.found_id, e)
+            self.logger.error(f"Failed to get webpage: {e}")
+            return False
+    
+    async def get_track_list(self) -> tuple:
+        
+        """
+        * Get the metadata and the track URLs of the Spotify album this instance points to without blocking the event loop
+        """
+        
+        self.check_input()
+        page = await self.get_page(self.album_url)
+        if not page:
+            raise ConnectionError(f"Could not fetch {self.album_url}")
+        self.metatags = page.metatags
+        
+        album_id = self.get_album_id()
+        album = self.get_cached("album", album_id)
+        if album is MISS or album is False:
+            album = album_cache.get(self.album_url)
+        if album is MISS:
+            artists = {}
+            artist_url = self.get_artist_url(self.metatags)
+            if artist_url:
+                artists[artist_url] = await self.get_artist(artist_url)
+            album = self.get_metadata(self.metatags, "album", get_artist=artists.get)
+            album_cache.set(self.album_url, album)
+            self.set_cached("album", album_id, album)
+        return album, self.get_track_urls(self.metatags)
+    
+    async def _get_cached_album(self, artists: dict, artist_url: str = None) -> AlbumData:
+        
+        album_id = self.get_album_id()
+        album = self.get_cached("album", album_id)
+        if album is False:
+            raise self.error
+        if album is MISS:
+            album = await self._get_album(artists, artist_url)
+            self.set_cached("album", album_id, album)
+        return album
+    
+    async def _get_album(self, artists: dict, artist_url: str = None) -> AlbumData:
+        
+        album = album_cache.get(self.album_url)
+        if album is not MISS:
+            return album
+        
+        if artist_url and artist_url not in artists:
+            artist = artist_cache.get(artist_url)
+            if artist is not MISS:
+                artists[artist_url] = artist
+        
+        # The artist page of the song is fetched alongside the album page,
+        # it is usually the same artist as the album one
+        pages = [self.get_page(self.album_url)]
+        if artist_url and artist_url not in artists:
+            pages.append(self.get_page(artist_url))
+        page, *artist_page = await asyncio.gather(*pages)
+        if not page:
+            raise ConnectionError(f"Could not fetch {self.album_url}")
+        if artist_page:
+            if not artist_page[0]:
+                raise ConnectionError(f"Could not fetch {artist_url}")
+            artists[artist_url] = self.get_artist_name(artist_page[0].metatags)
+            artist_cache.set(artist_url, artists[artist_url])
+        
+        self.metatags = page.metatags
+        album_artist_url = self.get_artist_url(self.metatags)
+        if album_artist_url and album_artist_url not in artists:
+            artists[album_artist_url] = await self.get_artist(album_artist_url)
+        metadata = self.get_metadata(self.metatags, "album", get_artist=artists.get)
+        album_cache.set(self.album_url, metadata)
+        return metadata
+    
+    @timed("artist")
+    async def get_artist(self, artist_url: str) -> str:
+        
+        """
+        * Get the name of a Spotify artist from the artist page without blocking the event loop
+        """
+        
+        artist = artist_cache.get(artist_url)
+        if artist is not MISS:
+            return artist
+        
+        page = await self.get_page(artist_url)
+        if not page:
+            raise ConnectionError(f"Could not fetch {artist_url}")
+        artist = self.get_artist_name(page.metatags)
+        artist_cache.set(artist_url, artist)
+        return artist
+    
+    async def get_page(self, url: str, app_state: bool = False) -> Page:
+        
+        """
+        * Get the meta tags of a webpage through the asyncio client
+        
+            Data Used:
+            - url (str)
+                DESCRIPTION: The URL of the webpage
+            - app_state (bool)
+                DESCRIPTION: Whether to also decode the Deezer app state script
+                
+            Data Returned:
+            - page (Page)
+                DESCRIPTION: The meta tags (and app state) of the webpage
+        """
+        
+        client = self.client or get_client()
+        try:
+            response = await client.get(url, stop_condition(app_state))
+        except urllib.error.HTTPError:
+            logging.error("got error urllib.error.HTTPError with " + url)
+            return False
+        except (urllib.error.URLError, OSError, asyncio.TimeoutError):
+            logging.error("got error urllib.error.URLError with " + url)
+            return False
+        
+        return parse_page(response.body, app_state)
+    
+    @classmethod
+    async def get_songs(cls, urls, logger: logging.Logger, max_workers: int = DEFAULT_ASYNC_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+        
+        """
+        * Get the metadata of many Spotify songs concurrently
+        
+            Data Used:
+            - urls (iterable)
+                DESCRIPTION: The Spotify URLs or IDs of the songs
+            - max_workers (int)
+                DESCRIPTION: Half the number of songs started ahead of the one awaited, see batch.async_iter_batch
+            - dedupe (int)
+                DESCRIPTION: How many recent inputs are remembered so duplicates are fetched once, 0 to fetch every input
+            - options (dict)
+                DESCRIPTION: Extra arguments for every instance (e.g. client, cache)
                 
-        return found_data
-        
-class SongData:
-    
-    artwork_url: str
-    duration: int
-    genre: str
-    album: str
-    title: str
-    artist: str
-    release_date: str
-    
-    def __init__(self):
-        self.artwork_url = None
-        self.duration = None
-        self.genre = None
-        self.album = None
-        self.title = None
-        self.artist = None
-        self.release_date = None
-    
-class AlbumData:
-    
-    artwork_url: str
-    title: str
-    artist: str
-    description: str
-    release_date: str
-    
-    def __init__(self):
-        self.artwork_url = None
-        self.title = None
-        self.artist = None
-        self.description = None
-        self.release_date = None
+            Data Returned:
+            - results (list of BatchResult)
+                DESCRIPTION: One result per URL in input order, holding either the data or the error
+        """
+        
+        return await async_run_batch(cls, "get_song", urls, logger, max_workers, dedupe, **options)
+    
+    @classmethod
+    async def get_albums(cls, urls, logger: logging.Logger, max_workers: int = DEFAULT_ASYNC_WORKERS, dedupe: int = DEFAULT_DEDUPE_ENTRIES, **options) -> list:
+        
+        """
+        * Get the metadata of many Spotify albums concurrently
+        """
+        
+        return await async_run_batch(cls, "get_album", urls, logger, max_workers, dedupe, **options)
+    
+    @classmethod
+    async def get_album_tracks(cls, album_url: str, logger: logging.Logger, **options) -> list:
+        
+        """
+        * Get the metadata of every song of a Spotify album concurrently, see Spotify.get_album_tracks
+        """
+        
+        instance = cls(album_url, logger, **options)
+        try:
+            album, track_urls = await instance.get_track_list()
+        except Exception as e:
+            instance.error = e
+            logger.error(f"Failed to get album tracks: {e}")
+            return False
+        return await asyncio.gather(*(async_lookup(cls, "get_track", url, logger, options, (album,)) for url in track_urls))
     
 if __name__ == "__main__":
         
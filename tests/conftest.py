@@ -0,0 +1,34 @@
+import os
+import sys
+import logging
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+from fixtures import FixtureServer, FixtureSession
+from session import set_session
+from cache import album_cache, artist_cache
+
+@pytest.fixture
+def logger() -> logging.Logger:
+    return logging.getLogger("musicdata.tests")
+
+@pytest.fixture
+def fixture_server():
+
+    """
+    * A FixtureServer with small generated pages, installed as the default session
+    """
+
+    album_cache.clear()
+    artist_cache.clear()
+    with FixtureServer(page_size=2000) as server:
+        set_session(FixtureSession(server))
+        try:
+            yield server
+        finally:
+            set_session(None)
+            album_cache.clear()
+            artist_cache.clear()
@@ -0,0 +1,46 @@
+import os
+
+import archive
+from archive import ArchiveReader, ArchiveWriter, LOOKUP_SUFFIX
+
+def record(path: str, pages: list) -> None:
+    with ArchiveWriter(path) as writer:
+        for url, body in pages:
+            writer.append(url, 200, {"content-type": "text/html"}, body)
+
+def test_the_last_response_of_a_url_is_served(tmp_path):
+    path = str(tmp_path / "pages.arc")
+    record(path, [(f"https://example.com/{number}", b"first %d" % number) for number in range(100)])
+    record(path, [("https://example.com/7", b"second")])
+    assert os.path.exists(path + LOOKUP_SUFFIX)
+
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 101
+        assert reader.get("https://example.com/7").body == b"second"
+        assert reader.get("https://example.com/42").body == b"first 42"
+        assert reader.get("https://example.com/100") is None
+        assert [page.url for page in reader][-1] == "https://example.com/7"
+
+def test_colliding_hashes_keep_every_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "url_hash", lambda url: 1)
+    path = str(tmp_path / "pages.arc")
+    record(path, [("https://example.com/a", b"a"), ("https://example.com/b", b"b"), ("https://example.com/a", b"a2")])
+
+    with ArchiveReader(path) as reader:
+        assert reader.get("https://example.com/a").body == b"a2"
+        assert reader.get("https://example.com/b").body == b"b"
+        assert reader.get("https://example.com/c") is None
+
+def test_an_interrupted_recording_is_readable(tmp_path):
+    path = str(tmp_path / "pages.arc")
+    record(path, [("https://example.com/a", b"a")])
+    writer = ArchiveWriter(path)
+    writer.append("https://example.com/b", 200, {}, b"b")
+    writer.index.write(b"\0" * 5)
+    writer.index.flush()
+
+    with ArchiveReader(path) as reader:
+        assert reader.get("https://example.com/a").body == b"a"
+        assert reader.get("https://example.com/b").body == b"b"
+        assert len(reader) == 2
+    writer.close()
@@ -0,0 +1,26 @@
+import asyncio
+
+from fixtures import FixtureClient, FixtureServer, track_urls
+
+def test_connections_are_kept_alive():
+    async def fetch(client, urls):
+        return [await client.get(url) for url in urls]
+
+    with FixtureServer(page_size=2000) as server:
+        client = FixtureClient(server, pool_size=1)
+        connects = []
+        connect = client._connect
+        async def count(key):
+            connects.append(key)
+            return await connect(key)
+        client._connect = count
+
+        responses = asyncio.run(fetch(client, track_urls("spotify", 3)))
+        assert [response.status for response in responses] == [200] * 3
+        assert len(connects) == 1
+
+        # Connections stay with the event loop that opened them
+        assert asyncio.run(fetch(client, track_urls("spotify", 1)))[0].status == 200
+        assert len(connects) == 2
+        client.close()
+        assert server.stats()["requests"] == 4
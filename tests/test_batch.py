@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+import batch
+from batch import BatchResult, async_run_batch
+from deezer import AsyncDeezer, Deezer
+from spotify import AsyncSpotify, Spotify
+from fixtures import FixtureClient, track_urls
+
+def test_batches_report_each_error_in_place(fixture_server, logger):
+    urls = [track_urls("spotify", 1)[0], "not an id", "A" * 22, track_urls("spotify", 2)[1]]
+    results = Spotify.get_songs(urls, logger, max_workers=2)
+    assert [result.url for result in results] == urls
+    assert [result.ok for result in results] == [True, False, False, True]
+    assert results[1].error.startswith("ValueError: Not a Spotify URL")
+    assert results[2].error.startswith("ConnectionError")
+    assert results[3].data.title == "Track 1 & Friends"
+
+@pytest.mark.parametrize("provider, async_provider", [(Spotify, AsyncSpotify), (Deezer, AsyncDeezer)])
+def test_async_lookups_match_the_thread_based_ones(fixture_server, logger, provider, async_provider):
+    name = provider.PROVIDER
+    urls = track_urls(name, 3) + track_urls(name, 1) + ["not an id"]
+    async def run() -> list:
+        return await async_provider.get_songs(urls, logger, client=FixtureClient(fixture_server))
+    results = asyncio.run(run())
+    expected = provider.get_songs(urls, logger)
+    assert [result.data for result in results] == [result.data for result in expected]
+    assert [result.ok for result in results] == [True] * 4 + [False]
+
+def test_async_batches_cap_lookups_in_flight(logger, monkeypatch):
+    in_flight, peak, calls = 0, 0, []
+    async def lookup(provider, method, url, logger, options, args=()):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        calls.append(url)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return BatchResult(url, data=url.upper())
+    monkeypatch.setattr(batch, "async_lookup", lookup)
+
+    urls = [f"{number:022d}" for number in range(50)] * 2
+    results = asyncio.run(async_run_batch(None, "get_song", urls, logger, max_workers=3))
+    assert [result.data for result in results] == [url.upper() for url in urls]
+    assert peak <= 6
+    assert len(calls) == 50
+
+    results = asyncio.run(async_run_batch(None, "get_song", urls, logger, max_workers=3, dedupe=0))
+    assert [result.url for result in results] == urls
+    assert len(calls) == 150
@@ -0,0 +1,56 @@
+from spotify import Spotify
+from batch import prefetch_albums
+from records import AlbumData
+from cache import MISS, MetadataCache, artist_cache
+from fixtures import SPOTIFY_ROOT, FixtureServer, FixtureSession, spotify_id, track_urls
+from session import set_session
+
+ARTIST_URL = f"{SPOTIFY_ROOT}artist/{spotify_id(0)}"
+
+def test_artist_names_are_revalidated(fixture_server, logger):
+    cache = MetadataCache(ttl=0)
+    lookup = Spotify(track_urls("spotify", 1)[0], logger, cache=cache)
+    assert lookup.get_cached_artist(ARTIST_URL) == "Artist 0"
+
+    artist_cache.clear()
+    assert lookup.get_cached_artist(ARTIST_URL) == "Artist 0"
+    stats = cache.stats()
+    assert stats["revalidations"] == 1
+    assert stats["not_modified"] == 1
+    assert stats["bytes_saved"] > 0
+    assert fixture_server.stats()["requests"] == 2
+
+def test_songs_keep_the_validators_of_their_artist(fixture_server, logger):
+    cache = MetadataCache(ttl=0)
+    song = Spotify(track_urls("spotify", 1)[0], logger, cache=cache).get_song()
+    assert song.artist == "Artist 0"
+    assert cache.get_stale("spotify", "artist", spotify_id(0)) is not MISS
+
+def test_revalidations_count_only_requests_sent(logger):
+    cache = MetadataCache(ttl=0)
+    cache.set("spotify", "artist", spotify_id(0), "Artist 0", validators={"etag": '"0"'})
+    artist_cache.clear()
+    with FixtureServer() as server:
+        pass
+    # The server is closed, the conditional request can't go out
+    set_session(FixtureSession(server))
+    try:
+        lookup = Spotify(track_urls("spotify", 1)[0], logger, cache=cache)
+        page, cached = lookup.get_revalidated_page("artist", spotify_id(0), ARTIST_URL)
+    finally:
+        set_session(None)
+    assert page is False
+    assert cache.stats()["revalidations"] == 0
+
+def test_lazy_album_songs_are_cached_once_their_album_resolves(fixture_server, logger):
+    cache = MetadataCache()
+    urls = track_urls("spotify", 3)
+    songs = [Spotify(url, logger, cache=cache, lazy_album=True).get_song() for url in urls]
+    assert cache.get("spotify", "song", spotify_id(0)) is MISS
+
+    assert songs[0].album.title == "Album 0"
+    assert prefetch_albums(songs) == 1
+    for number in range(3):
+        cached = cache.get("spotify", "song", spotify_id(number))
+        assert isinstance(cached.album, AlbumData)
+        assert cached.album.title == "Album 0"
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+import cli
+from fixtures import track_urls
+
+@pytest.mark.parametrize("unordered", [False, True])
+def test_resumed_runs_write_every_result_once(fixture_server, tmp_path, monkeypatch, unordered):
+    urls = track_urls("spotify", 30) + ["https://example.com/not-a-track"] + track_urls("deezer", 30)
+    source = tmp_path / "urls.txt"
+    source.write_text("\n".join(urls) + "\n", encoding="utf-8")
+    output, failures, checkpoint = tmp_path / "songs.jsonl", tmp_path / "failed.jsonl", tmp_path / "progress.json"
+    argv = [str(source), "-o", str(output), "--failures", str(failures), "-j", "4",
+            "--checkpoint", str(checkpoint), "--checkpoint-every", "7"] + (["--unordered"] if unordered else [])
+
+    # Kill the run after 40 results, some of them written after the last save
+    write = cli.Writer.write
+    written = []
+    def crash(self, *args, **kwargs):
+        if len(written) == 40:
+            raise KeyboardInterrupt
+        written.append(args)
+        return write(self, *args, **kwargs)
+    monkeypatch.setattr(cli.Writer, "write", crash)
+    with pytest.raises(KeyboardInterrupt):
+        cli.main(argv)
+    assert json.loads(checkpoint.read_text())["line"] < 40
+
+    monkeypatch.setattr(cli.Writer, "write", write)
+    cli.main(argv)
+    results = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    inputs = [result["input"] for result in results]
+    assert sorted(inputs) == sorted(set(urls) - {"https://example.com/not-a-track"})
+    if not unordered:
+        assert inputs == [url for url in urls if url in set(inputs)]
+    assert len(failures.read_text(encoding="utf-8").splitlines()) == 1
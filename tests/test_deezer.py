@@ -0,0 +1,75 @@
+import time
+
+from cache import album_cache
+from deezer import API_DOWN, API_NOT_FOUND, DZ_COVER_URL, Deezer, api_available, set_api_failed
+from fixtures import DEEZER_ROOT, FixtureServer, track_urls
+
+def test_backends_build_the_same_album_url(fixture_server, logger):
+    url = track_urls("deezer", 1)[0]
+    html = Deezer(url, logger)
+    api = Deezer(url, logger, backend="api", api_url=fixture_server.api_url())
+    assert html.get_song() and api.get_song()
+    assert html.album_url == api.album_url == "https://www.deezer.com/en/album/0"
+
+def count_api_calls(monkeypatch) -> list:
+    calls = []
+    get_api_data = Deezer.get_api_data
+    monkeypatch.setattr(Deezer, "get_api_data", lambda self, *args: calls.append(args) or get_api_data(self, *args))
+    return calls
+
+def test_api_failures_send_every_instance_to_the_webpages(fixture_server, logger, monkeypatch):
+    with FixtureServer() as down:
+        api_url = down.api_url()
+    calls = count_api_calls(monkeypatch)
+
+    for url in track_urls("deezer", 3):
+        assert Deezer(url, logger, backend="api", api_url=api_url).get_song().title.startswith("Track")
+    assert len(calls) == 1
+    assert not api_available(api_url)
+    assert api_available(fixture_server.api_url())
+
+    # Album track lists go through the same cooldown
+    assert Deezer(f"{DEEZER_ROOT}album/0", logger, backend="api", api_url=api_url).get_track_list()[0].title == "Album 0"
+    assert len(calls) == 1
+
+def test_missing_resources_only_fall_back_for_themselves(fixture_server, logger, monkeypatch):
+    api_url = fixture_server.api_url().replace("deezer-api", "nowhere")
+    calls = count_api_calls(monkeypatch)
+
+    for url in track_urls("deezer", 3):
+        assert Deezer(url, logger, backend="api", api_url=api_url).get_song().title.startswith("Track")
+    assert [resource for resource, _ in calls].count("track") == 3
+    assert api_available(api_url)
+
+def test_track_list_failures_start_the_cooldown(fixture_server, logger):
+    with FixtureServer() as down:
+        api_url = down.api_url()
+    album, track_urls = Deezer(f"{DEEZER_ROOT}album/0", logger, backend="api", api_url=api_url).get_track_list()
+    assert album.title == "Album 0" and len(track_urls) == 10
+    assert not api_available(api_url)
+
+def test_api_errors_are_told_apart():
+    assert Deezer.read_api_data(b'{"id": 1}', "url") == ({"id": 1}, None)
+    assert Deezer.read_api_data(b'{"error": {"type": "DataException", "code": 800}}', "url") == (None, API_NOT_FOUND)
+    assert Deezer.read_api_data(b'{"error": {"type": "Exception", "code": 4}}', "url") == (None, API_DOWN)
+    assert Deezer.read_api_data(b"<html>", "url") == (None, API_DOWN)
+    assert Deezer.get_api_http_error(404) == API_NOT_FOUND
+    assert Deezer.get_api_http_error(429) == API_DOWN
+    assert Deezer.get_api_http_error(503) == API_DOWN
+
+def test_the_api_is_asked_again_after_the_cooldown():
+    api_url = "http://127.0.0.1:9/cooldown/"
+    set_api_failed(api_url, cooldown=0.05)
+    assert not api_available(api_url)
+    time.sleep(0.1)
+    assert api_available(api_url)
+
+def test_app_state_songs_cache_their_album(fixture_server, logger):
+    song = Deezer(track_urls("deezer", 1)[0], logger, app_state=True).get_song()
+    # The app state cover wins over the og:image of the page
+    assert song.artwork_url == song.album.artwork_url == DZ_COVER_URL.format(f"{0:032x}")
+    assert album_cache.get("https://www.deezer.com/en/album/0") == song.album
+
+    requests = fixture_server.stats()["requests"]
+    assert Deezer(f"{DEEZER_ROOT}album/0", logger).get_album() == song.album
+    assert fixture_server.stats()["requests"] == requests
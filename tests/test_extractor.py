@@ -0,0 +1,50 @@
+import pytest
+
+from deezer import Deezer
+from spotify import Spotify
+from extractor import META_ATTRS, app_state_complete, head_complete, parse_page
+from fixtures import deezer_page, spotify_page
+
+# Upper case tags and attributes, entities, single quoted and unquoted values, and meta tags without the attributes read
+TRICKY_PAGE = (
+    "<!DOCTYPE html><html><HEAD><title>x</title>"
+    '<META PROPERTY="og:title" CONTENT="Rock &amp; Roll &#233;">'
+    "<meta name='music:duration' content='200'/>"
+    '<meta content=https://example.com/cover.jpg property=og:image>'
+    '<meta charset="utf-8"><meta http-equiv="refresh" content="5">'
+    "</head><body></body></html>"
+)
+PAGES = {
+    "spotify-track": (Spotify, "song", spotify_page("track", 12, 2000)),
+    "spotify-album": (Spotify, "album", spotify_page("album", 1, 2000)),
+    "deezer-track": (Deezer, "song", deezer_page("track", 12, 2000)),
+    "deezer-album": (Deezer, "album", deezer_page("album", 1, 2000)),
+    "tricky": (Spotify, "song", TRICKY_PAGE),
+}
+
+def read_tags(page) -> list:
+    return [{name: tag.get(name) for name in META_ATTRS if tag.get(name) is not None} for tag in page.metatags]
+
+@pytest.mark.parametrize("name", PAGES)
+def test_fast_engine_matches_bs4(name):
+    pytest.importorskip("bs4")
+    provider, metadata_type, document = PAGES[name]
+    app_state = provider is Deezer
+    fast = parse_page(document, app_state, engine="fast")
+    bs4 = parse_page(document, app_state, engine="bs4")
+    assert read_tags(fast) == read_tags(bs4)
+    assert fast.app_state == bs4.app_state
+    assert (provider.get_metadata(fast.metatags, metadata_type, get_artist=lambda url: None)
+            == provider.get_metadata(bs4.metatags, metadata_type, get_artist=lambda url: None))
+
+@pytest.mark.parametrize("until", [head_complete, app_state_complete])
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64])
+def test_stop_conditions_only_scan_new_chunks(until, chunk_size):
+    document = deezer_page("track", 1, 2000).encode("utf-8").replace(b"</head>", b"</HEAD \n>")
+    scan = {}
+    for end in range(chunk_size, len(document) + chunk_size, chunk_size):
+        # Same answer as scanning every prefix from the start
+        assert until(document[:end], scan) == until(document[:end])
+        if until(document[:end]):
+            break
+    assert until(document[:end], scan)
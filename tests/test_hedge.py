@@ -0,0 +1,61 @@
+import time
+import concurrent.futures
+
+from hedge import HedgePolicy, hedged_call
+from ratelimit import RateLimiter
+from fixtures import FixtureServer, FixtureSession, track_urls
+
+def warm_policy(latency: float = 0.01) -> HedgePolicy:
+    policy = HedgePolicy(min_samples=20)
+    for _ in range(20):
+        policy.record(latency)
+    return policy
+
+def slow(value):
+    time.sleep(0.2)
+    return value
+
+def test_hedge_is_skipped_when_not_admitted():
+    policy = warm_policy()
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        assert hedged_call(policy, executor, slow, "primary", admit=lambda: False) == "primary"
+    stats = policy.stats()
+    assert stats["sent"] == 0
+    assert stats["skipped"] == 1
+    assert stats["outstanding"] == 0
+
+def test_hedge_uses_the_hedge_function():
+    policy = warm_policy()
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        assert hedged_call(policy, executor, slow, "primary", hedge_function=lambda value: "hedge") == "hedge"
+    assert policy.stats()["won"] == 1
+
+def test_latency_excludes_time_queued_in_the_executor():
+    policy = HedgePolicy(min_samples=1)
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        executor.submit(time.sleep, 0.3)
+        hedged_call(policy, executor, lambda: None)
+    assert policy.delay() < 0.1
+
+def test_hedges_take_a_limiter_slot():
+    limiter = RateLimiter()
+    policy = warm_policy()
+    with FixtureServer(latency=0.2, page_size=2000) as server:
+        session = FixtureSession(server, limiter=limiter, hedge=policy)
+        assert session.get(track_urls("spotify", 1)[0]).status == 200
+        time.sleep(0.3)
+        assert server.stats()["requests"] == 2
+    stats = limiter.stats()["open.spotify.com"]
+    assert stats["requests"] == 2
+    assert stats["in_flight"] == 0
+    assert policy.stats()["sent"] == 1
+
+def test_hedges_are_skipped_when_the_host_is_at_its_limit():
+    limiter = RateLimiter(concurrency=1, min_concurrency=1, max_concurrency=1)
+    policy = warm_policy()
+    with FixtureServer(latency=0.2, page_size=2000) as server:
+        session = FixtureSession(server, limiter=limiter, hedge=policy)
+        assert session.get(track_urls("spotify", 1)[0]).status == 200
+        assert server.stats()["requests"] == 1
+    assert limiter.stats()["open.spotify.com"]["in_flight"] == 0
+    assert policy.stats()["skipped"] == 1
@@ -0,0 +1,28 @@
+from spotify import Spotify
+from metrics import get_metrics
+from fixtures import track_urls
+
+def test_lookups_are_traced_and_counted(fixture_server, logger):
+    metrics = get_metrics()
+    metrics.reset()
+    traces = []
+    hook = traces.append
+    metrics.add_trace_hook(hook)
+    try:
+        assert Spotify(track_urls("spotify", 1)[0], logger).get_song()
+        assert Spotify("A" * 22, logger).get_song() is False
+    finally:
+        metrics.remove_hook(hook)
+
+    song, failed = traces
+    assert (song.kind, song.provider, song.error) == ("get_song", "spotify", None)
+    assert failed.error.startswith("ConnectionError")
+    # The album and artist pages are part of the song lookup
+    assert song.requests == 3 and song.bytes > 0
+    assert {"download", "parse"} <= {stage for stage, _, _ in song.spans}
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["lookups"] == 2
+    assert snapshot["counters"]["lookup_errors"] == 1
+    assert snapshot["counters"]["requests"] == song.requests + failed.requests == fixture_server.stats()["requests"]
+    assert snapshot["histograms"]["lookup"]["count"] == 2
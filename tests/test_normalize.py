@@ -0,0 +1,49 @@
+import pytest
+
+from normalize import normalize_for
+from spotify import Spotify
+from deezer import Deezer
+from fixtures import spotify_id
+
+SPOTIFY_ID = "0ax4ZXW4EOk4zUvdP9Fu2H"
+
+@pytest.mark.parametrize("value", [
+    SPOTIFY_ID,
+    f" {SPOTIFY_ID} ",
+    f"spotify:track:{SPOTIFY_ID}",
+    f"https://open.spotify.com/intl-es/track/{SPOTIFY_ID}?si=1",
+])
+def test_spotify_inputs_share_an_id(value, logger):
+    assert Spotify(value, logger).song_url == f"https://open.spotify.com/track/{SPOTIFY_ID}"
+
+@pytest.mark.parametrize("value", ["123", " 123 ", "https://www.deezer.com/es/track/123?host=0"])
+def test_deezer_inputs_share_an_id(value, logger):
+    assert Deezer(value, logger).song_url == "https://www.deezer.com/en/track/123"
+
+def test_bare_ids_belong_to_the_provider_they_are_given_to():
+    assert normalize_for("0" * 22, "deezer") == ("deezer", "track", "0" * 22)
+    assert normalize_for("0" * 22, "spotify") == ("spotify", "track", "0" * 22)
+
+@pytest.mark.parametrize("cls, value", [
+    (Spotify, "https://www.deezer.com/track/123"),
+    (Deezer, f"spotify:track:{SPOTIFY_ID}"),
+    (Deezer, f"https://open.spotify.com/track/{SPOTIFY_ID}"),
+    (Spotify, "not an id"),
+])
+def test_other_provider_inputs_are_rejected(cls, value, logger, fixture_server):
+    instance = cls(value, logger)
+    assert instance.get_song() is False and instance.get_album() is False
+    assert isinstance(instance.error, ValueError)
+    with pytest.raises(ValueError):
+        instance.get_track_list()
+    assert fixture_server.stats()["requests"] == 0
+
+@pytest.mark.parametrize("order", [1, -1])
+def test_mixed_uri_and_url_batch(fixture_server, logger, order):
+    found_id = spotify_id(7)
+    urls = [f"spotify:track:{found_id}", f"https://open.spotify.com/track/{found_id}"][::order]
+    results = Spotify.get_songs(urls, logger)
+    assert [result.url for result in results] == urls
+    assert all(result.ok for result in results)
+    assert results[0].data == results[1].data
+    assert results[0].data.title == "Track 7 & Friends"
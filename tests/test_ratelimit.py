@@ -0,0 +1,92 @@
+import time
+import email.utils
+import urllib.error
+
+import pytest
+
+from ratelimit import RateLimiter, RetryPolicy, parse_retry_after
+from metrics import get_metrics
+from fixtures import FixtureServer, FixtureSession, track_urls
+
+def test_healthy_hosts_are_not_rate_limited():
+    limiter = RateLimiter()
+    for _ in range(500):
+        assert limiter.try_acquire("host") == 0
+        limiter.release("host", 200, 0.01)
+    assert limiter.stats()["host"]["rate"] is None
+
+def test_throttling_halves_the_sent_rate_then_recovers():
+    limiter = RateLimiter(burst=10)
+    for _ in range(50):
+        assert limiter.try_acquire("host") == 0
+        limiter.release("host", 200, 0.0)
+    assert limiter.try_acquire("host") == 0
+    limiter.release("host", 429, 0.0)
+
+    throttled = limiter.stats()["host"]["rate"]
+    assert throttled is not None and throttled >= limiter.min_rate
+    assert limiter.try_acquire("host") > 0
+
+    time.sleep(1 / throttled * 2)
+    assert limiter.try_acquire("host") == 0
+    for _ in range(20):
+        limiter.release("host", 200, 0.0)
+    assert limiter.stats()["host"]["rate"] > throttled
+
+def test_retry_after_pauses_the_host():
+    limiter = RateLimiter()
+    limiter.try_acquire("host")
+    limiter.release("host", 429, 0.0, retry_after=0.5)
+    assert 0.4 < limiter.try_acquire("host") <= 0.5
+    assert limiter.try_acquire("other") == 0
+
+def test_backoff_is_exponential_with_jitter():
+    policy = RetryPolicy(backoff=1.0, max_backoff=5.0)
+    for attempt in range(5):
+        delays = [policy.delay(attempt) for _ in range(200)]
+        assert max(delays) <= min(5.0, 2 ** attempt)
+        assert min(delays) >= 0
+    assert policy.delay(0, retry_after=3.0) >= 3.0
+    assert policy.delay(0, retry_after=60.0) == 5.0
+
+def test_retry_statuses():
+    policy = RetryPolicy(retries=2)
+    assert policy.should_retry(0, 429) and policy.should_retry(1, 503) and policy.should_retry(0, None)
+    assert not policy.should_retry(0, 404)
+    assert not policy.should_retry(2, 429)
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < parse_retry_after(date) <= 30
+
+def test_throttled_requests_are_retried():
+    metrics = get_metrics()
+    metrics.reset()
+    # Errors come at random here, not because of the rate, so the rate is kept from collapsing
+    limiter = RateLimiter(min_rate=50)
+    with FixtureServer(error_rate=0.4, error_status=429, page_size=2000, seed=3) as server:
+        session = FixtureSession(server, limiter=limiter, retry=RetryPolicy(retries=20, backoff=0.001, max_backoff=0.01))
+        for url in track_urls("spotify", 30):
+            assert session.get(url).status == 200
+        stats = server.stats()
+
+    assert stats["errors"] > 0
+    assert stats["requests"] == 30 + stats["errors"]
+    assert metrics.snapshot()["counters"]["retries"] == stats["errors"]
+    host = limiter.stats()["open.spotify.com"]
+    assert host["throttled"] == stats["errors"]
+    assert host["rate"] is not None
+
+def test_retry_after_delays_the_retry():
+    with FixtureServer(error_rate=1.0, error_status=429, retry_after="1") as server:
+        session = FixtureSession(server, retry=RetryPolicy(retries=1, backoff=0.0, max_backoff=0.3))
+        start = time.monotonic()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            session.get(track_urls("spotify", 1)[0])
+        elapsed = time.monotonic() - start
+        assert error.value.code == 429
+        assert server.stats()["requests"] == 2
+    assert 0.3 <= elapsed < 1.0
@@ -0,0 +1,70 @@
+import io
+import json
+import pickle
+
+import pytest
+
+from records import UNKNOWN, AlbumData, LazyAlbum, RecordBatch, SongData, StringColumn
+
+SONGS = [
+    SongData(title="Déjà vu", duration=180, album=AlbumData(title="Album 0")),
+    SongData(),
+    SongData(title="", artist="Artist 1", album="https://open.spotify.com/album/1"),
+]
+
+def test_string_columns_keep_none_and_empty_strings():
+    column = StringColumn(["a", None, "", "ü" * 3] * 5)
+    assert len(column) == 20
+    assert list(column) == ["a", None, "", "ü" * 3] * 5
+    assert column[-1] == "ü" * 3
+    with pytest.raises(IndexError):
+        column[20]
+
+def test_batches_round_trip():
+    batch = RecordBatch(SongData, SONGS)
+    assert list(batch) == SONGS
+    assert batch[1].title is UNKNOWN
+
+    lines = io.StringIO()
+    assert batch.write_jsonl(lines) == 3
+    rows = [json.loads(line) for line in lines.getvalue().splitlines()]
+    assert rows[0]["title"] == "Déjà vu" and rows[1]["title"] is None and rows[2]["title"] == ""
+
+def test_to_arrow_shares_the_string_buffers():
+    pyarrow = pytest.importorskip("pyarrow")
+    batch = RecordBatch(SongData, SONGS)
+    table = batch.to_arrow()
+    assert table.column("title").to_pylist() == ["Déjà vu", None, ""]
+    assert table.column("duration").to_pylist() == [180, None, None]
+
+    column = batch.columns["title"]
+    buffers = table.column("title").chunk(0).buffers()
+    assert buffers[2].address == pyarrow.py_buffer(column.data).address
+    assert buffers[1].address == pyarrow.py_buffer(column.offsets).address
+
+def test_to_numpy():
+    pytest.importorskip("numpy")
+    records = RecordBatch(SongData, SONGS).to_numpy()
+    assert list(records["title"]) == ["Déjà vu", None, ""]
+    assert list(records["duration"]) == [180, -1, -1]
+
+def test_lazy_albums_act_as_albums_without_fetching_to_compare():
+    fetches = []
+    def resolve():
+        fetches.append(1)
+        return AlbumData(title="Album 0", artist="Artist 0")
+
+    album = LazyAlbum("https://open.spotify.com/album/0", resolve)
+    song = SongData(title="Track 0", album=album)
+    assert isinstance(song.album, AlbumData)
+    assert song == SongData(title="Track 0", album=LazyAlbum(album.url, resolve))
+    assert len({song, song.replace()}) == 1
+    with pytest.raises(TypeError):
+        pickle.dumps(song)
+    assert not fetches
+
+    assert album.to_dict()["title"] == "Album 0"
+    assert album.replace(title="Other") == AlbumData(title="Other", artist="Artist 0")
+    assert album.artist == "Artist 0"
+    assert pickle.loads(pickle.dumps(song)).album == AlbumData(title="Album 0", artist="Artist 0")
+    assert len(fetches) == 1